@@ -1,31 +1,173 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from app.models.chat import ChatRequest
+import asyncio
+import time
+from contextlib import aclosing
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import observe_stage
+from app.core.providers import provider_registry
+from app.core.startup import startup_profile
+from app.core.stream_encoder import StreamEncoder
+from app.models.chat import BatchRequest, ChatRequest, Conversation, ConversationCreate
+from app.services.admission import AdmissionRejectedError, Ticket, admission
+from app.services.batch import batch_runner
 from app.services.chat_service import chat_service
+from app.services.conversation_store import ConversationNotFoundError, conversation_store
+from app.services.mcp_service import mcp_service
+from app.services.context_manager import context_manager
+from app.services.response_cache import response_cache
+from app.services.router import model_router
+from app.services.tool_cache import tool_cache
+from app.services.tool_selector import tool_selector
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+
+class _ChatStreamingResponse(StreamingResponse):
+    """
+    Streaming response that stops generating as soon as the client goes away.
+    
+    A watcher consumes `http.disconnect` while the stream runs. On disconnect
+    the streaming task is cancelled and the body generator closed, which
+    unwinds the whole chain: provider HTTP stream, agent loop and in-flight
+    MCP tool calls. The admission slot, if the response holds one, is
+    returned however the stream ends.
+    """
+    
+    def __init__(self, content, ticket: Optional[Ticket] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+        self.disconnected = False
+    
+    async def _send_body(self, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            # The server noticed the disconnect first (write to a closed socket)
+            self.disconnected = True
+    
+    async def _wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected = True
+                return
+    
+    async def __call__(self, scope, receive, send):
+        streaming = asyncio.ensure_future(self._send_body(send))
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait((streaming, watcher), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (streaming, watcher):
+                task.cancel()
+            await asyncio.gather(streaming, watcher, return_exceptions=True)
+            # Close the generator chain now even if it was parked at a yield
+            await self.body_iterator.aclose()
+            if self.ticket is not None:
+                self.ticket.release()
+        if streaming.done() and not streaming.cancelled() and streaming.exception() is not None:
+            raise streaming.exception()
+
+
+def _client_key(raw_request: Request) -> str:
+    """Fairness key for admission: API key if sent, else the client address."""
+    api_key = raw_request.headers.get("x-api-key") or raw_request.headers.get("authorization")
+    if api_key:
+        return api_key
+    return raw_request.client.host if raw_request.client else "anonymous"
+
+
+def _priority(raw_request: Request) -> str:
+    """
+    Admission priority from X-Priority. Anyone may lower theirs to 'low';
+    'high' (and the default 'normal') only count for trusted API keys
+    (ADMISSION_PRIORITY_API_KEYS), otherwise the request runs at 'normal'.
+    """
+    priority = raw_request.headers.get("x-priority", "normal").strip().lower()
+    if priority == "low":
+        return priority
+    if raw_request.headers.get("x-api-key") in settings.admission_priority_api_key_list:
+        return priority
+    return "normal"
 
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, raw_request: Request):
     """
     Chat endpoint with streaming support.
     
     Accepts chat messages and streams back the AI response.
     Supports MCP tool calling for file access and other capabilities.
+    
+    With a `conversation_id`, only the new message is sent; the stored
+    history is prepended and the exchange is appended once the stream completes.
     """
+    # Body read + validation, measured from when the middleware saw the request
+    received_at = getattr(raw_request.state, "received_at", None)
+    if received_at is not None:
+        observe_stage("request_parse", time.perf_counter() - received_at, model=request.model)
+    
+    # Load stored history before streaming starts so an unknown id is a clean 404
+    history = []
+    if request.conversation_id is not None:
+        try:
+            history = await conversation_store.history(request.conversation_id)
+        except ConversationNotFoundError as e:
+            raise HTTPException(status_code=404, detail="Conversation not found") from e
+    
+    # Wait for a generation slot on the model's preferred backend; reject fast
+    # instead of queueing without bound. Limits are keyed on the resolved
+    # backend (provider + model id), never on the raw requested name.
+    try:
+        backend = model_router.primary(request.model)
+        ticket = await admission.acquire(
+            backend.provider_name,
+            backend.model_id,
+            client=_client_key(raw_request),
+            priority=_priority(raw_request)
+        )
+    except AdmissionRejectedError as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.reason},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.exception("Error in chat endpoint")
+        raise HTTPException(status_code=500, detail=str(e)) from e
+    
     try:
         # Stream response
+        options = request.stream_options
+        encoder = StreamEncoder(
+            flush_interval=(
+                options.flush_interval_ms / 1000
+                if options and options.flush_interval_ms is not None else None
+            ),
+            flush_bytes=options.flush_bytes if options else None
+        )
+        
         async def generate():
-            async for chunk in chat_service.chat_stream(
+            stream = chat_service.chat_stream(
                 messages=request.messages,
-                model=request.model
-            ):
-                # Format as SSE (Server-Sent Events)
-                yield f"0:{chunk}\n"
+                model=request.model,
+                history=history,
+                conversation_id=request.conversation_id,
+                session_id=request.session_id,
+                ticket=ticket
+            )
+            # `0:<json string>` frames, coalesced, with keep-alives while idle
+            async with aclosing(encoder.encode(stream)) as frames:
+                async for frame in frames:
+                    yield frame
         
-        return StreamingResponse(
+        return _ChatStreamingResponse(
             generate(),
+            ticket,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -34,11 +176,103 @@ async def chat(request: ChatRequest):
         )
     
     except Exception as e:
-        print(f"❌ Error in chat endpoint: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        ticket.release()
+        logger.exception("Error in chat endpoint")
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchRequest):
+    """
+    Batch chat endpoint for offline and bulk workloads.
+    
+    Runs every request through the chat pipeline with bounded concurrency
+    and low admission priority; identical requests are generated once.
+    Streams back one `BatchResult` JSON line per request as each finishes
+    (not in request order). Requests whose ids are in `skip_ids` are not run,
+    so an interrupted batch can be resumed.
+    """
+    try:
+        batch_runner.check(request.requests)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    
+    async def generate():
+        results = batch_runner.run(
+            request.requests,
+            # A caller may ask for less fan-out than BATCH_CONCURRENCY, not more
+            concurrency=min(request.concurrency, batch_runner.concurrency) if request.concurrency else None,
+            skip_ids=request.skip_ids
+        )
+        async with aclosing(results) as stream:
+            async for result in stream:
+                yield result.model_dump_json(exclude_none=True) + "\n"
+    
+    # Each generation takes its own admission slot; a disconnect cancels the rest
+    return _ChatStreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@router.post("/conversations", response_model=Conversation, status_code=201)
+async def create_conversation(request: Optional[ConversationCreate] = None):
+    """Create a server-side conversation; send its id with each chat turn."""
+    if request is None:
+        request = ConversationCreate()
+    conversation_id = await conversation_store.create(request.title)
+    return Conversation(id=conversation_id)
+
+
+@router.get("/conversations/{conversation_id}", response_model=Conversation)
+async def get_conversation(conversation_id: int):
+    """Stored messages of a conversation, oldest first."""
+    try:
+        messages = await conversation_store.history(conversation_id)
+    except ConversationNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Conversation not found") from e
+    return Conversation(id=conversation_id, messages=messages)
 
 
 @router.get("/health")
 async def health():
     """Health check endpoint."""
     return {"status": "healthy", "service": "ai-chatbot-backend"}
+
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness endpoint.
+    
+    Reports each MCP server's startup state and latency, and how long each
+    startup phase took. Returns 503 while any server is still starting,
+    unless MCP_DEFER_WARMUP is set.
+    """
+    ready = mcp_service.ready or settings.mcp_defer_warmup
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "servers": mcp_service.get_server_states(),
+            "startup": startup_profile.report(),
+        }
+    )
+
+
+@router.get("/mcp/stats")
+async def mcp_stats():
+    """MCP session pool, cache, tool selection, context compaction, admission, routing and batch counters."""
+    return {
+        "pools": mcp_service.get_pool_stats(),
+        "tool_cache": tool_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "context": context_manager.stats(),
+        "tool_selection": tool_selector.stats(),
+        "conversations": conversation_store.stats(),
+        "admission": admission.stats(),
+        "router": model_router.stats(),
+        "providers": provider_registry.stats(),
+        "batch": batch_runner.stats(),
+    }
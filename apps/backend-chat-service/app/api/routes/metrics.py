@@ -0,0 +1,53 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.logger import dropped_records
+from app.core.metrics import metrics
+from app.services.mcp_service import mcp_service
+from app.services.response_cache import response_cache
+from app.services.tool_cache import tool_cache
+
+router = APIRouter()
+
+
+def _service_stats():
+    """Expose MCP pool and cache counters at scrape time."""
+    pools = mcp_service.get_pool_stats()
+    for key, type_, help in (
+        ("alive", "gauge", "Live MCP sessions per server"),
+        ("waiting", "gauge", "Callers waiting for an MCP session"),
+        ("leases", "counter", "MCP session leases"),
+        ("respawns", "counter", "MCP session respawns"),
+        ("rejections", "counter", "MCP lease rejections (pool exhausted)"),
+        ("avg_wait_ms", "gauge", "Average MCP lease wait in milliseconds"),
+    ):
+        yield (
+            f"mcp_pool_{key}",
+            type_,
+            help,
+            [({"server": name}, stats[key]) for name, stats in pools.items()],
+        )
+    
+    for cache_name, stats in (("tool", tool_cache.stats()), ("response", response_cache.stats())):
+        yield (
+            f"{cache_name}_cache_events_total",
+            "counter",
+            f"{cache_name.capitalize()} cache lookups by result",
+            [
+                ({"result": key}, stats[key])
+                for key in ("hits", "disk_hits", "shared_hits", "misses", "shared", "evictions", "expirations", "invalidations")
+                if key in stats
+            ],
+        )
+        yield (f"{cache_name}_cache_entries", "gauge", f"{cache_name.capitalize()} cache entries", [({}, stats["entries"])])
+    
+    yield ("log_records_dropped_total", "counter", "Log records dropped because the log queue was full", [({}, dropped_records())])
+
+
+metrics.register_collector(_service_stats)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of pipeline, pool and cache metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,4 @@
+import json
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
@@ -14,6 +15,53 @@ class Settings(BaseSettings):
     # API Keys
     google_api_key: Optional[str] = None
     
+    # Sampling temperature of the built-in providers (the response cache only
+    # stores responses generated at temperature 0)
+    llm_temperature: float = 0.7
+    
+    # Ollama HTTP client (shared, connection-pooled)
+    ollama_max_connections: int = 100
+    ollama_max_keepalive_connections: int = 20
+    ollama_keepalive_expiry: float = 30.0
+    ollama_connect_timeout: float = 5.0
+    ollama_read_timeout: float = 60.0
+    ollama_pool_timeout: float = 10.0
+    ollama_http2: bool = True
+    
+    # Ollama nodes: comma-separated base URLs (default: OLLAMA_BASE_URL). With
+    # several, each is polled for loaded/installed models and requests go to a
+    # node that has the model loaded; failing nodes are ejected with backoff
+    ollama_base_url: str = "http://localhost:11434"
+    ollama_base_urls: str = ""
+    ollama_poll_interval: float = 10.0
+    ollama_poll_timeout: float = 2.0
+    ollama_eject_backoff: float = 1.0
+    ollama_eject_backoff_max: float = 60.0
+    
+    # Ollama sessions: every turn of a conversation (conversation_id or
+    # session_id) goes to the node that served the last one, so it reuses
+    # the prompt cache there; the model stays loaded for
+    # OLLAMA_SESSION_KEEP_ALIVE after each such request (empty: Ollama default)
+    ollama_session_keep_alive: str = "30m"
+    ollama_session_ttl: float = 1800.0
+    ollama_max_sessions: int = 10000
+    
+    # Model routing. Backends are `provider:model` (bare names go to
+    # DEFAULT_PROVIDER); MODEL_ALIASES maps a model name to an ordered backend
+    # list, `alias=backend|backend,...`. Extra providers: `name=module:attribute`.
+    # Providers are imported on first use; PROVIDER_PRELOAD lists those to load
+    # at startup instead (`*` for all)
+    default_provider: str = "gemini"
+    llm_providers: str = ""
+    provider_preload: str = ""
+    model_aliases: str = ""
+    router_failure_threshold: int = 3
+    router_cooldown: float = 30.0
+    router_hedge_enabled: bool = False
+    router_hedge_percentile: float = 95.0
+    router_hedge_min_samples: int = 20
+    router_hedge_min_delay: float = 0.25
+    
     # Database
     database_url: Optional[str] = None
     
@@ -21,6 +69,109 @@ class Settings(BaseSettings):
     mcp_server_command: str = "npx"
     mcp_server_args: str = "-y,@modelcontextprotocol/server-filesystem,/Users/admin/work/ai-chatbot/test-data"
     
+    # Optional JSON list of MCP servers ({name, command, args, env}) replacing the defaults
+    mcp_servers: Optional[str] = None
+    
+    # MCP session pool (per server)
+    mcp_pool_size: int = 2
+    mcp_pool_max_waiters: int = 32
+    mcp_pool_acquire_timeout: float = 30.0
+    mcp_health_check_interval: float = 30.0
+    
+    # MCP startup
+    mcp_server_startup_timeout: float = 60.0
+    mcp_background_attach: bool = False
+    # Start MCP servers after the app is serving and don't hold /api/ready for
+    # them (tools appear as servers attach)
+    mcp_defer_warmup: bool = False
+    
+    # Tool selection: with more than TOOL_SELECTION_MIN_TOOLS tools, offer the
+    # model only the TOOL_SELECTION_TOP_K most relevant to the latest user
+    # message (BM25 over names and descriptions) plus the pinned ones
+    # (comma-separated fnmatch patterns on tool or server.tool names)
+    tool_selection_enabled: bool = True
+    tool_selection_top_k: int = 8
+    tool_selection_min_tools: int = 16
+    tool_selection_pinned: str = ""
+    
+    # Tool result cache (idempotent MCP tools only)
+    tool_cache_enabled: bool = True
+    tool_cache_max_bytes: int = 16 * 1024 * 1024
+    tool_cache_default_ttl: float = 60.0
+    tool_cache_allowlist: str = "filesystem.read_file,filesystem.read_text_file,filesystem.read_multiple_files,filesystem.list_directory,filesystem.directory_tree,filesystem.get_file_info,postgres.query"
+    tool_cache_ttls: str = "postgres.query=15"
+    
+    # Response cache (opt-in; full streamed responses)
+    response_cache_enabled: bool = False
+    response_cache_max_entries: int = 256
+    response_cache_ttl: float = 3600.0
+    response_cache_dir: Optional[str] = None
+    
+    # Agentic tool loop
+    max_tool_steps: int = 5
+    tool_call_timeout: float = 30.0
+    ollama_tools_enabled: bool = False
+    
+    # Admission control: `name=limit` concurrent generations per provider and
+    # per model pattern (full model id, e.g. ollama:llama3.2:*), plus a bounded wait queue.
+    # X-Priority: high/normal is only honoured for the listed API keys (X-API-Key)
+    admission_enabled: bool = True
+    provider_concurrency: str = "gemini=16,ollama=4"
+    model_concurrency: str = ""
+    admission_queue_size: int = 64
+    admission_client_queue_size: int = 8
+    admission_queue_timeout: float = 30.0
+    admission_priority_api_keys: str = ""
+    
+    # Batch chat (POST /api/chat/batch, batch.py job files): requests per API
+    # batch and generations one batch runs at once, at low admission priority
+    batch_max_requests: int = 1000
+    batch_concurrency: int = 8
+    
+    # Response stream framing: coalesce chunks into one frame per window
+    # (0 ms sends every chunk as it comes) and keep idle streams alive
+    stream_flush_interval_ms: int = 20
+    stream_flush_bytes: int = 1024
+    stream_keepalive_interval: float = 15.0
+    
+    # Server-side conversation history: memory, sqlite or postgres (uses DATABASE_URL)
+    conversation_store: str = "memory"
+    conversation_store_path: str = "conversations.db"
+    conversation_cache_size: int = 1024
+    conversation_db_pool_min: int = 1
+    conversation_db_pool_max: int = 10
+    
+    # Conversation context budgeting (strategy: none, sliding_window, drop_oldest, summarize_prefix)
+    # Off by default: trimming changes the prompt prefix every turn, which
+    # defeats provider prompt caches. Budgets are the models' context windows
+    context_strategy: str = "none"
+    context_default_budget: int = 8192
+    context_budgets: str = "gemini-*=1048576,ollama:*=4096"
+    context_reserve_tokens: int = 1024
+    context_window_messages: int = 20
+    context_summary_max_tokens: int = 512
+    context_summary_cache_size: int = 1024
+    
+    # Tracing: optional OTLP/JSON span export to a file and/or collector
+    trace_export_path: Optional[str] = None
+    trace_export_url: Optional[str] = None
+    
+    # Logging
+    log_level: str = "INFO"
+    log_format: str = "text"  # "text" or "json"
+    log_queue_size: int = 10000
+    log_token_sample_every: int = 100
+    
+    # Multi-worker deployment (gunicorn.conf.py, or uvicorn --workers with
+    # WORKERS set to match). With MCP_BROKER_SOCKET the workers share one set
+    # of MCP servers run by a broker process instead of spawning their own;
+    # SHARED_CACHE_PATH is an SQLite file the response cache shares across them
+    workers: int = 1
+    mcp_broker_socket: Optional[str] = None
+    mcp_broker_spawn: bool = True
+    mcp_broker_connect_timeout: float = 30.0
+    shared_cache_path: Optional[str] = None
+    
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
@@ -34,6 +185,91 @@ class Settings(BaseSettings):
         """Convert comma-separated MCP args to list."""
         return self.mcp_server_args.split(",")
     
+    @property
+    def tool_cache_allowlist_list(self) -> list[str]:
+        """Convert comma-separated cacheable tool patterns to list."""
+        return [name.strip() for name in self.tool_cache_allowlist.split(",") if name.strip()]
+    
+    @property
+    def tool_selection_pinned_list(self) -> list[str]:
+        """Convert comma-separated pinned tool patterns to list."""
+        return [name.strip() for name in self.tool_selection_pinned.split(",") if name.strip()]
+    
+    @property
+    def tool_cache_ttl_map(self) -> dict[str, float]:
+        """Convert comma-separated `pattern=seconds` TTL overrides to dict."""
+        ttls = {}
+        for item in self.tool_cache_ttls.split(","):
+            if "=" in item:
+                pattern, ttl = item.split("=", 1)
+                ttls[pattern.strip()] = float(ttl)
+        return ttls
+    
+    @staticmethod
+    def _parse_limits(value: str) -> dict[str, int]:
+        limits = {}
+        for item in value.split(","):
+            if "=" in item:
+                name, limit = item.rsplit("=", 1)
+                limits[name.strip()] = int(limit)
+        return limits
+    
+    @property
+    def provider_concurrency_map(self) -> dict[str, int]:
+        """Convert comma-separated `provider=limit` to dict."""
+        return self._parse_limits(self.provider_concurrency)
+    
+    @property
+    def model_concurrency_map(self) -> dict[str, int]:
+        """Convert comma-separated `model-pattern=limit` to dict."""
+        return self._parse_limits(self.model_concurrency)
+    
+    @property
+    def admission_priority_api_key_list(self) -> list[str]:
+        """Convert comma-separated trusted API keys to list."""
+        return [key.strip() for key in self.admission_priority_api_keys.split(",") if key.strip()]
+    
+    @property
+    def ollama_base_url_list(self) -> list[str]:
+        """Convert comma-separated Ollama URLs to list, falling back to OLLAMA_BASE_URL."""
+        urls = [url.strip() for url in self.ollama_base_urls.split(",") if url.strip()]
+        return urls or [self.ollama_base_url]
+    
+    @property
+    def llm_provider_map(self) -> dict[str, str]:
+        """Convert comma-separated `name=module:attribute` providers to dict."""
+        providers = {}
+        for item in self.llm_providers.split(","):
+            if "=" in item:
+                name, path = item.split("=", 1)
+                providers[name.strip()] = path.strip()
+        return providers
+    
+    @property
+    def provider_preload_list(self) -> list[str]:
+        """Convert comma-separated provider names to preload to list."""
+        return [name.strip() for name in self.provider_preload.split(",") if name.strip()]
+    
+    @property
+    def model_alias_map(self) -> dict[str, list[str]]:
+        """Convert comma-separated `alias=backend|backend` entries to dict."""
+        aliases = {}
+        for item in self.model_aliases.split(","):
+            if "=" in item:
+                alias, backends = item.split("=", 1)
+                aliases[alias.strip()] = [b.strip() for b in backends.split("|") if b.strip()]
+        return aliases
+    
+    @property
+    def context_budget_map(self) -> dict[str, int]:
+        """Convert comma-separated `model-pattern=tokens` budgets to dict."""
+        budgets = {}
+        for item in self.context_budgets.split(","):
+            if "=" in item:
+                pattern, budget = item.split("=", 1)
+                budgets[pattern.strip()] = int(budget)
+        return budgets
+    
     @property
     def allowed_origins_list(self) -> list[str]:
         """Convert comma-separated origins to list."""
@@ -41,6 +277,9 @@ class Settings(BaseSettings):
     
     def get_mcp_servers_config(self) -> list[dict]:
         """Get list of MCP servers to initialize."""
+        if self.mcp_servers:
+            return json.loads(self.mcp_servers)
+        
         servers = [
             {
                 "name": "filesystem",
@@ -1,16 +1,72 @@
-import google.generativeai as genai
-from typing import AsyncGenerator, Any
-import json
+import asyncio
+import time
+from functools import lru_cache
+from typing import AsyncGenerator, Any, Union
 
 from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import observe_stage, span
+from app.core.tool_catalog import tool_catalog
+from app.models.chat import ToolCall
+
+logger = get_logger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _genai():
+    """The Gemini SDK (takes about a second to import; see GeminiLLM._load_sdk)."""
+    import google.generativeai as genai
+    
+    return genai
+
+
+@lru_cache(maxsize=1)
+def _gemini_type_mapping() -> dict[str, Any]:
+    """Map JSON schema type names to the Gemini Type enum (imported once)."""
+    from google.ai.generativelanguage import Type
+    
+    return {
+        "object": Type.OBJECT,
+        "string": Type.STRING,
+        "number": Type.NUMBER,
+        "integer": Type.INTEGER,
+        "boolean": Type.BOOLEAN,
+        "array": Type.ARRAY,
+    }
 
 
 class GeminiLLM:
     """Gemini LLM integration with tool calling support."""
     
+    name = "gemini"
+    
     def __init__(self):
         self.model_cache = {}
         self._configured = False
+        self._sdk_loaded = False
+        self.generation_config = {
+            "temperature": settings.llm_temperature,
+            "top_p": 0.95,
+            "top_k": 40,
+            "max_output_tokens": 8192,
+        }
+    
+    async def start(self):
+        """Load the SDK ahead of the first request (called by the provider registry)."""
+        await self._load_sdk()
+    
+    async def _load_sdk(self):
+        """
+        Import the Gemini SDK off the event loop; requests may already be in
+        flight. Tool declarations need the SDK's types, so the catalog only
+        compiles them for Gemini from here on.
+        """
+        if self._sdk_loaded:
+            return
+        await asyncio.to_thread(lambda: (_genai(), _gemini_type_mapping()))
+        if not self._sdk_loaded:
+            self._sdk_loaded = True
+            tool_catalog.register("gemini", self._clean_schema, self._build_declaration)
     
     def _ensure_configured(self):
         """Lazy initialization of Gemini API."""
@@ -18,56 +74,40 @@ class GeminiLLM:
             from app.core.config import settings
             if not settings.google_api_key:
                 raise ValueError("GOOGLE_API_KEY not set. Cannot use Gemini models.")
-            genai.configure(api_key=settings.google_api_key)
+            _genai().configure(api_key=settings.google_api_key)
             self._configured = True
     
     def _get_model(self, model_name: str):
         """Get or create Gemini model instance."""
         self._ensure_configured()
         if model_name not in self.model_cache:
-            self.model_cache[model_name] = genai.GenerativeModel(model_name)
+            self.model_cache[model_name] = _genai().GenerativeModel(model_name)
         return self.model_cache[model_name]
     
     def _convert_tools_to_gemini_format(self, tools: list[dict[str, Any]]) -> list[dict]:
-        """Convert MCP tools to Gemini function calling format."""
-        gemini_tools = []
-        
-        for tool in tools:
-            # Get input schema and clean it
-            input_schema = tool.get("input_schema", {})
-            
-            # Remove fields that Gemini doesn't support
-            cleaned_schema = self._clean_schema(input_schema)
-            
-            gemini_tool = {
-                "name": tool["name"],
-                "description": tool["description"],
-                "parameters": cleaned_schema
-            }
-            gemini_tools.append(gemini_tool)
-        
-        return gemini_tools
+        """Convert MCP tools to Gemini function calling format (precompiled catalog)."""
+        return tool_catalog.compile("gemini", tools)
+    
+    @staticmethod
+    def _build_declaration(tool: dict[str, Any], parameters: dict[str, Any]) -> dict:
+        """Build a Gemini function declaration from an already-cleaned schema."""
+        return {
+            "name": tool["name"],
+            "description": tool["description"],
+            "parameters": parameters
+        }
     
     def _clean_schema(self, schema: dict[str, Any]) -> dict[str, Any]:
         """Remove fields from schema that Gemini doesn't support."""
-        from google.ai.generativelanguage import Type
+        type_mapping = _gemini_type_mapping()
+        object_type = type_mapping["object"]
         
         if not schema:
-            return {"type": Type.OBJECT, "properties": {}}
+            return {"type": object_type, "properties": {}}
         
         # Create a copy to avoid modifying original
         cleaned = {}
         
-        # Map string types to Gemini Type enum
-        type_mapping = {
-            "object": Type.OBJECT,
-            "string": Type.STRING,
-            "number": Type.NUMBER,
-            "integer": Type.INTEGER,
-            "boolean": Type.BOOLEAN,
-            "array": Type.ARRAY,
-        }
-        
         # Only include fields that Gemini supports
         supported_fields = ["type", "properties", "required", "description", "items", "enum"]
         for field in supported_fields:
@@ -75,13 +115,13 @@ class GeminiLLM:
                 if field == "type":
                     # Convert string type to enum
                     type_str = schema[field].lower() if isinstance(schema[field], str) else "object"
-                    cleaned[field] = type_mapping.get(type_str, Type.OBJECT)
+                    cleaned[field] = type_mapping.get(type_str, object_type)
                 else:
                     cleaned[field] = schema[field]
         
         # Ensure type is set (default to OBJECT if not specified)
         if "type" not in cleaned:
-            cleaned["type"] = Type.OBJECT
+            cleaned["type"] = object_type
         
         # Recursively clean nested properties
         if "properties" in cleaned and isinstance(cleaned["properties"], dict):
@@ -96,12 +136,58 @@ class GeminiLLM:
         
         return cleaned
     
+    @staticmethod
+    def _convert_messages(messages: list[dict[str, Any]]) -> list[dict]:
+        """
+        Convert chat messages to Gemini contents.
+        
+        Gemini expects: [{"role": "user" | "model", "parts": [...]}, ...]. Tool
+        calls become function_call parts on a model turn, and consecutive tool
+        results are grouped into one turn of function_response parts.
+        """
+        gemini_messages = []
+        for msg in messages:
+            if msg["role"] == "tool":
+                part = {
+                    "function_response": {
+                        "name": msg["name"],
+                        "response": {"result": msg["content"]}
+                    }
+                }
+                previous = gemini_messages[-1] if gemini_messages else None
+                if previous and previous.get("tool_results"):
+                    previous["parts"].append(part)
+                else:
+                    gemini_messages.append({"role": "user", "parts": [part], "tool_results": True})
+                continue
+            
+            parts = [msg["content"]] if msg.get("content") else []
+            for call in msg.get("tool_calls") or []:
+                parts.append({"function_call": {"name": call.name, "args": call.arguments}})
+            gemini_messages.append({
+                "role": "model" if msg["role"] == "assistant" else msg["role"],
+                "parts": parts
+            })
+        
+        for content in gemini_messages:
+            content.pop("tool_results", None)
+        return gemini_messages
+    
+    @staticmethod
+    def _to_plain(value: Any) -> Any:
+        """Convert proto map/list composites (function call args) to plain Python."""
+        if hasattr(value, "items"):
+            return {key: GeminiLLM._to_plain(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)) or type(value).__name__ == "RepeatedComposite":
+            return [GeminiLLM._to_plain(item) for item in value]
+        return value
+    
     async def generate_stream(
         self,
-        messages: list[dict[str, str]],
+        messages: list[dict[str, Any]],
         model_name: str,
         tools: list[dict[str, Any]] = None
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[Union[str, ToolCall], None]:
         """
         Generate streaming response from Gemini.
         
@@ -111,72 +197,72 @@ class GeminiLLM:
             tools: Optional list of tools for function calling
         
         Yields:
-            Chunks of generated text
+            Chunks of generated text, or ToolCall for each function call part
         """
+        await self._load_sdk()
         model = self._get_model(model_name)
         
         # Convert messages to Gemini format
-        # Gemini expects: [{"role": "user", "parts": ["text"]}, ...]
-        gemini_messages = []
-        for msg in messages:
-            gemini_messages.append({
-                "role": msg["role"],
-                "parts": [msg["content"]]
-            })
+        gemini_messages = self._convert_messages(messages)
         
         # Prepare generation config
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-        }
+        generation_config = self.generation_config
         
         # Add tools if provided
         gemini_tools = None
         if tools:
-            gemini_tools = self._convert_tools_to_gemini_format(tools)
+            with span("tool_catalog", self.name, model_name):
+                gemini_tools = self._convert_tools_to_gemini_format(tools)
         
         try:
-            # Debug: Print tool schemas
             if gemini_tools:
-                print(f"🔧 Sending {len(gemini_tools)} tools to Gemini:")
-                for tool in gemini_tools:
-                    print(f"  - {tool['name']}: {tool.get('parameters', {}).get('type', 'unknown')}")
+                logger.debug("Sending tools to Gemini", extra={"tools": len(gemini_tools)})
             
-            # Generate response
+            # Generate response via the SDK's async API so the event loop
+            # keeps serving other requests while tokens stream in (concurrent
+            # streams are bounded by admission control, PROVIDER_CONCURRENCY)
+            connect_started = time.perf_counter()
             if gemini_tools:
-                response = model.generate_content(
+                response = await model.generate_content_async(
                     gemini_messages,
                     generation_config=generation_config,
                     tools=gemini_tools,
                     stream=True
                 )
             else:
-                response = model.generate_content(
+                response = await model.generate_content_async(
                     gemini_messages,
                     generation_config=generation_config,
                     stream=True
                 )
+            observe_stage("provider_connect", time.perf_counter() - connect_started, self.name, model_name)
             
-            # Stream response chunks
-            for chunk in response:
-                if chunk.text:
-                    yield chunk.text
-                    
-        except Exception as e:
-            import traceback
-            print(f"❌ Error generating response: {e}")
-            print(f"📋 Full error details:")
-            traceback.print_exc()
-            
-            # Debug: Print the tool schemas that caused the error
-            if gemini_tools:
-                print(f"🔍 Tool schemas that caused error:")
-                import json
-                print(json.dumps(gemini_tools, indent=2))
-            
-            # User-friendly error message
+            # Stream response chunks. If the client disconnects, the
+            # CancelledError/GeneratorExit raised here aborts the RPC.
+            async for chunk in response:
+                parts = chunk.candidates[0].content.parts if chunk.candidates else []
+                for part in parts:
+                    function_call = getattr(part, "function_call", None)
+                    if function_call and function_call.name:
+                        yield ToolCall(
+                            name=function_call.name,
+                            arguments=self._to_plain(function_call.args) or {}
+                        )
+                    elif part.text:
+                        yield part.text
+                
+        except asyncio.CancelledError:
+            logger.info("Gemini stream cancelled", extra={"model": model_name})
+            raise
+        except Exception:
+            logger.exception(
+                "Error generating Gemini response",
+                extra={
+                    "model": model_name,
+                    # Names only; full schemas are available from the tool catalog
+                    "tools": [tool["name"] for tool in gemini_tools] if gemini_tools else None,
+                }
+            )
             raise
 
 
@@ -0,0 +1,137 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Optional
+
+from app.core.config import settings
+
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with `extra=` fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = [
+            f"{key}={value}"
+            for key, value in record.__dict__.items()
+            if key not in _RESERVED and not key.startswith("_")
+        ]
+        return f"{line} {' '.join(extras)}" if extras else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Non-blocking handler: records go onto a bounded queue drained by a
+    background thread. When the queue is full (e.g. the stdout pipe is
+    backed up) records are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Sampler:
+    """
+    Rate limiter for hot-path debug logs (e.g. per token).
+
+    `allow()` is true for every `every`-th call, and at most once per
+    `interval` seconds when an interval is given.
+    """
+
+    __slots__ = ("every", "interval", "_count", "_last")
+
+    def __init__(self, every: int = 100, interval: float = 0.0):
+        self.every = max(1, every)
+        self.interval = interval
+        self._count = 0
+        self._last = 0.0
+
+    def allow(self) -> bool:
+        self._count += 1
+        if self._count % self.every:
+            return False
+        if self.interval:
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return False
+            self._last = now
+        return True
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def setup_logging():
+    """Route the `app` logger through a queue to a stdout handler (idempotent)."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter() if settings.log_format == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.log_level.upper())
+    app_logger.addHandler(_queue_handler)
+    app_logger.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger("app").removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Get a logger under the `app` hierarchy."""
+    return logging.getLogger(name if name == "app" or name.startswith("app.") else f"app.{name}")
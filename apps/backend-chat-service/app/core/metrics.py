@@ -0,0 +1,412 @@
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+from app.core.logger import get_logger
+from app.core.tracing import record_span
+
+logger = get_logger(__name__)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collector returns (name, type, help, [(labels, value), ...]) tuples at scrape time
+Sample = tuple[dict[str, str], float]
+Collector = Callable[[], Iterable[tuple[str, str, str, list[Sample]]]]
+
+
+# `model` label values: models are only reported by name once they are known
+# to exist (configured aliases, backends that produced a token), and at most
+# this many; anything else a client sends is reported as "other"
+MAX_MODEL_LABELS = 256
+OTHER_MODEL = "other"
+_known_models: set[str] = set()
+
+
+def register_models(*models: str):
+    """Give models a `model` label value of their own (bounded by MAX_MODEL_LABELS)."""
+    for model in models:
+        if model not in _known_models and len(_known_models) < MAX_MODEL_LABELS:
+            _known_models.add(model)
+
+
+def model_label(model: str) -> str:
+    """The `model` label value for a (possibly client-supplied) model name."""
+    return model if not model or model in _known_models else OTHER_MODEL
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._model_index = self.labelnames.index("model") if "model" in self.labelnames else None
+
+    def labels(self, *values):
+        """Get the child for a label combination; cache it to keep hot paths allocation-free."""
+        key = tuple(str(value) for value in values)
+        index = self._model_index
+        if index is not None and key[index] and key[index] not in _known_models:
+            # Unbounded client input must not mint new series
+            key = (*key[:index], OTHER_MODEL, *key[index + 1:])
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_dict(self, key: tuple) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self._label_dict(key))} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, child in self._children.items():
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(bound)}
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal Prometheus text-format registry (no external dependency)."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Collector] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        """Register a callback that reports values (e.g. pool or cache stats) at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning("Metrics collector failed", extra={"error": str(e)})
+                continue
+            for name, type_, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type_}")
+                lines.extend(
+                    f"{name}{_format_labels(labels)} {_format_value(value)}"
+                    for labels, value in samples
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+
+# Chat pipeline metrics
+STAGE_SECONDS = metrics.histogram(
+    "chat_stage_duration_seconds",
+    "Duration of chat pipeline stages",
+    ("stage", "provider", "model"),
+)
+TTFT_SECONDS = metrics.histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from request receipt to the first streamed token",
+    ("provider", "model"),
+)
+TOKENS_PER_SECOND = metrics.histogram(
+    "chat_tokens_per_second",
+    "Streamed chunks per second of generation, per response",
+    ("provider", "model"),
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+TOKENS_TOTAL = metrics.counter(
+    "chat_tokens_total",
+    "Streamed chunks sent to clients",
+    ("provider", "model"),
+)
+STREAMS_TOTAL = metrics.counter(
+    "chat_streams_total",
+    "Completed chat streams by outcome",
+    ("provider", "model", "status"),
+)
+CONTEXT_TOKENS_SAVED = metrics.counter(
+    "chat_context_tokens_saved_total",
+    "Estimated prompt tokens removed by context compaction",
+    ("provider", "model", "strategy"),
+)
+TOOL_SELECTIONS = metrics.counter(
+    "chat_tool_selections_total",
+    "Requests by tool selection outcome (selected: top-k subset, fallback: no match so all tools, all: small catalog)",
+    ("provider", "model", "outcome"),
+)
+TOOL_TOKENS_SAVED = metrics.counter(
+    "chat_tool_tokens_saved_total",
+    "Estimated tool declaration tokens left out of prompts by tool selection",
+    ("provider", "model"),
+)
+CANCELLED_STREAMS = metrics.counter(
+    "chat_cancelled_streams_total",
+    "Generations aborted because the client went away",
+    ("provider", "model"),
+)
+CANCELLED_TOKENS_SAVED = metrics.counter(
+    "chat_cancelled_tokens_saved_total",
+    "Estimated chunks not generated thanks to cancellation (typical response length minus chunks sent)",
+    ("provider", "model"),
+)
+OLLAMA_EVAL_TOKENS = metrics.counter(
+    "ollama_eval_tokens_total",
+    "Tokens generated, from Ollama's final stats frame",
+    ("model",),
+)
+OLLAMA_PROMPT_EVAL_TOKENS = metrics.counter(
+    "ollama_prompt_eval_tokens_total",
+    "Prompt tokens evaluated (not served from Ollama's prompt cache), from the stats frame",
+    ("model",),
+)
+OLLAMA_EVAL_SECONDS = metrics.histogram(
+    "ollama_eval_duration_seconds",
+    "Generation time reported by Ollama, per response",
+    ("model",),
+)
+OLLAMA_PROMPT_EVAL_SECONDS = metrics.histogram(
+    "ollama_prompt_eval_duration_seconds",
+    "Prompt evaluation time reported by Ollama, per response",
+    ("model",),
+)
+OLLAMA_EVAL_TOKENS_PER_SECOND = metrics.histogram(
+    "ollama_eval_tokens_per_second",
+    "Generation speed reported by Ollama (eval_count / eval_duration), per response",
+    ("model",),
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+OLLAMA_NODE_UP = metrics.gauge(
+    "ollama_node_up",
+    "Whether an Ollama node is in rotation (0 while ejected)",
+    ("node",),
+)
+OLLAMA_NODE_OUTSTANDING = metrics.gauge(
+    "ollama_node_outstanding",
+    "In-flight requests per Ollama node",
+    ("node",),
+)
+OLLAMA_NODE_REQUESTS = metrics.counter(
+    "ollama_node_requests_total",
+    "Requests per Ollama node by where the model was (resident, installed, unknown, missing)",
+    ("node", "placement"),
+)
+OLLAMA_STREAM_FRAMES = metrics.counter(
+    "ollama_stream_frames_total",
+    "NDJSON frames read from Ollama by outcome (decoded, skipped without decoding, invalid)",
+    ("model", "outcome"),
+)
+OLLAMA_SESSION_ROUTES = metrics.counter(
+    "ollama_session_routes_total",
+    "Conversation turns by routing outcome (new session, sticky to its node, moved to another node)",
+    ("outcome",),
+)
+OLLAMA_PROMPT_TOKENS_REUSED = metrics.counter(
+    "ollama_prompt_tokens_reused_total",
+    "Estimated prompt tokens served from the node's cache for sticky conversations",
+    ("model",),
+)
+OLLAMA_PROMPT_EVAL_SECONDS_SAVED = metrics.counter(
+    "ollama_prompt_eval_seconds_saved_total",
+    "Estimated prompt evaluation time saved by reused prompt tokens",
+    ("model",),
+)
+STREAM_FRAMES = metrics.counter(
+    "chat_stream_frames_total",
+    "Frames written to chat streams (text frames carry one or more coalesced chunks)",
+    ("kind",),
+)
+ROUTER_BACKEND_ERRORS = metrics.counter(
+    "router_backend_errors_total",
+    "Backend failures seen by the model router (connect: before the first token)",
+    ("provider", "model", "stage"),
+)
+ROUTER_FAILOVERS = metrics.counter(
+    "router_failovers_total",
+    "Requests moved to the next backend after this one failed before its first token",
+    ("provider", "model"),
+)
+ROUTER_HEDGES = metrics.counter(
+    "router_hedges_total",
+    "Hedged requests: started, and whether the hedge (won) or the original (lost) answered first",
+    ("outcome",),
+)
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "admission_wait_seconds",
+    "Time requests waited for a generation slot",
+    ("provider", "model"),
+)
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    "admission_queue_depth",
+    "Requests waiting for a generation slot",
+    ("provider",),
+)
+ADMISSION_INFLIGHT = metrics.gauge(
+    "admission_inflight",
+    "Generations holding a slot",
+    ("provider",),
+)
+ADMISSION_REJECTIONS = metrics.counter(
+    "admission_rejections_total",
+    "Requests rejected by admission control",
+    ("provider", "reason"),
+)
+BATCH_REQUESTS = metrics.counter(
+    "batch_requests_total",
+    "Batch requests by outcome (ok, error; duplicate: served by an identical request; skipped: resumed past)",
+    ("status",),
+)
+TOOL_CALL_SECONDS = metrics.histogram(
+    "mcp_tool_call_duration_seconds",
+    "MCP tool call duration per server and tool",
+    ("server", "tool", "status"),
+)
+
+
+def observe_stage(stage: str, seconds: float, provider: str = "", model: str = "", attributes: Optional[dict] = None):
+    """Record a pipeline stage duration and, if tracing is exporting, emit a span."""
+    STAGE_SECONDS.labels(stage, provider, model).observe(seconds)
+    record_span(stage, seconds, {"provider": provider, "model": model, **(attributes or {})})
+
+
+@contextmanager
+def span(stage: str, provider: str = "", model: str = "", **attributes) -> Iterator[None]:
+    """Time a block as a pipeline stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, provider, model, attributes)
@@ -0,0 +1,98 @@
+import json
+from typing import Any, AsyncIterable, AsyncGenerator, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+
+def _json_loads(data: bytes) -> Any:
+    # json.loads(bytes) sniffs the encoding first; decoding explicitly is cheaper
+    return json.loads(data.decode("utf-8"))
+
+
+# Decode a line straight from bytes
+loads: Callable[[bytes], Any] = orjson.loads if orjson is not None else _json_loads
+
+# A frame that carries nothing for us has empty content, no tool calls and is
+# not the final stats frame (see NDJSONStreamParser._parse). Quotes inside JSON strings are always escaped, so
+# these byte patterns can only match the frame's own keys. Ollama (Go) emits
+# compact separators; the spaced forms cover Python-written fixtures and stubs.
+_CONTENT_KEY = b'"content":'
+_CONTENT_AT = len(_CONTENT_KEY)
+_NOT_DONE = (b'"done":false', b'"done": false')
+
+
+class NDJSONStreamParser:
+    """
+    Incremental NDJSON parser for Ollama's streaming responses.
+
+    Works on raw bytes: splits lines itself and decodes each line straight
+    from bytes (with orjson when installed), skipping frames that carry no
+    content without decoding them at all. Malformed lines are counted and
+    dropped, as before.
+    """
+
+    __slots__ = ("_loads", "_buffer", "decoded", "skipped", "invalid")
+
+    def __init__(self, decode: Optional[Callable[[bytes], Any]] = None):
+        self._loads = decode or loads
+        self._buffer = b""
+
+        # Counters
+        self.decoded = 0
+        self.skipped = 0
+        self.invalid = 0
+
+    def _parse(self, line: bytes) -> Optional[dict]:
+        if not line or line.isspace():
+            return None
+        # Fast path, inlined: one scan for frames with text; frames with empty
+        # content are skipped undecoded unless they carry tool calls or end the stream
+        index = line.find(_CONTENT_KEY)
+        if index >= 0:
+            value = line[index + _CONTENT_AT:index + _CONTENT_AT + 3]
+            if (
+                (value.startswith(b'""') or value == b' ""')
+                and (_NOT_DONE[0] in line or _NOT_DONE[1] in line)
+                and b'"tool_calls"' not in line
+            ):
+                self.skipped += 1
+                return None
+        try:
+            frame = self._loads(line)
+        except ValueError:  # json.JSONDecodeError and orjson.JSONDecodeError
+            self.invalid += 1
+            return None
+        self.decoded += 1
+        return frame
+
+    def feed(self, data: bytes) -> list[dict]:
+        """Frames completed by `data`; a trailing partial line is kept for the next call."""
+        if self._buffer:
+            data = self._buffer + data
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._buffer = data
+            return []
+        self._buffer = data[end + 1:]
+        # Ollama usually sends one frame per read: skip split() for that case
+        if data.find(b"\n") == end:
+            frame = self._parse(data[:end])
+            return [frame] if frame is not None else []
+        return [frame for frame in map(self._parse, data[:end].split(b"\n")) if frame is not None]
+
+    def flush(self) -> list[dict]:
+        """Parse whatever is left once the stream has ended (a final line without newline)."""
+        line, self._buffer = self._buffer, b""
+        frame = self._parse(line)
+        return [frame] if frame is not None else []
+
+    async def aiter(self, chunks: AsyncIterable[bytes]) -> AsyncGenerator[dict, None]:
+        """Yield decoded frames from a byte stream (e.g. `response.aiter_bytes()`)."""
+        async for data in chunks:
+            for frame in self.feed(data):
+                yield frame
+        for frame in self.flush():
+            yield frame
@@ -1,21 +1,169 @@
 import httpx
-from typing import AsyncGenerator, Any
-import json
-import os
+import logging
+import time
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Any, Optional, Union
+
+from app.core.config import settings
+from app.core.logger import Sampler, get_logger
+from app.core.metrics import (
+    OLLAMA_EVAL_SECONDS,
+    OLLAMA_EVAL_TOKENS,
+    OLLAMA_EVAL_TOKENS_PER_SECOND,
+    OLLAMA_PROMPT_EVAL_SECONDS,
+    OLLAMA_PROMPT_EVAL_TOKENS,
+    OLLAMA_STREAM_FRAMES,
+    observe_stage,
+    span,
+)
+from app.core.ndjson import NDJSONStreamParser
+from app.core.ollama_nodes import OllamaNodePool
+from app.core.ollama_sessions import OllamaSession, OllamaSessions
+from app.core.tool_catalog import tool_catalog
+from app.core.tracing import current_session
+from app.models.chat import ToolCall
+
+logger = get_logger(__name__)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
 
 class OllamaLLM:
-    """Ollama LLM integration with streaming support."""
+    """
+    Ollama LLM integration with streaming support.
+    
+    Requests that belong to a conversation stay on the node that served its
+    previous turn (see OllamaSessions), so Ollama reuses the prompt prefix it
+    already evaluated instead of re-reading the whole history.
+    """
+    
+    name = "ollama"
+    
+    def __init__(self, base_url: str = None, base_urls: Optional[list[str]] = None):
+        urls = base_urls or ([base_url] if base_url else settings.ollama_base_url_list)
+        self.nodes = OllamaNodePool(urls)
+        self.sessions = OllamaSessions()
+        self.base_url = self.nodes.urls[0]
+        self.client: Optional[httpx.AsyncClient] = None
+        self.generation_config = {
+            "temperature": settings.llm_temperature
+        }
+        self._token_sampler = Sampler(every=settings.log_token_sample_every)
+        tool_catalog.register("ollama", lambda schema: schema, self._build_declaration)
     
-    def __init__(self, base_url: str = None):
-        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    def _build_client(self) -> httpx.AsyncClient:
+        """Create a connection-pooled client with split connect/read timeouts."""
+        return httpx.AsyncClient(
+            http2=settings.ollama_http2 and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.ollama_max_connections,
+                max_keepalive_connections=settings.ollama_max_keepalive_connections,
+                keepalive_expiry=settings.ollama_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.ollama_connect_timeout,
+                read=settings.ollama_read_timeout,
+                write=settings.ollama_connect_timeout,
+                pool=settings.ollama_pool_timeout,
+            ),
+        )
+    
+    async def start(self):
+        """Create the app-scoped HTTP client (called from the FastAPI lifespan)."""
+        if self.client is None:
+            self.client = self._build_client()
+        self.nodes.start(self.client)
+    
+    async def close(self):
+        """Stop node polling and close the shared HTTP client and its pooled connections."""
+        await self.nodes.close()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+    
+    @asynccontextmanager
+    async def _get_client(self) -> AsyncIterator[httpx.AsyncClient]:
+        """Yield the shared client, or a short-lived one outside the app lifespan."""
+        if self.client is not None:
+            yield self.client
+        else:
+            async with self._build_client() as client:
+                yield client
+    
+    @asynccontextmanager
+    async def _open_stream(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict[str, Any],
+        model_name: str,
+        session: Optional[OllamaSession] = None
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        POST /api/chat on the best node for the model (the session's previous
+        node if it is still up), moving on to the next node if one fails
+        before responding, or answers 5xx or 404 (model not on that node);
+        nothing has been streamed yet, so retrying is safe. The last node's
+        error response is passed through. A node whose connection breaks
+        mid-stream is ejected too. The node is released when the stream closes.
+        """
+        prefer = self.sessions.preferred_node(session, model_name) if session is not None else None
+        candidates = self.nodes.candidates(model_name, prefer)
+        last_error: Optional[Exception] = None
+        for index, node in enumerate(candidates):
+            self.nodes.acquire(node, model_name)
+            try:
+                response = await client.send(
+                    client.build_request("POST", f"{node.url}/api/chat", json=payload),
+                    stream=True
+                )
+            except httpx.TransportError as e:
+                self.nodes.release(node, model_name, ok=False)
+                self.nodes.eject(node, e)
+                last_error = e
+                continue
+            
+            if response.status_code == 404 or response.status_code >= 500:
+                self.nodes.reject(node, model_name, response.status_code)
+                if index < len(candidates) - 1:
+                    logger.warning(
+                        "Ollama node failed, trying the next one",
+                        extra={"url": node.url, "model": model_name, "status": response.status_code}
+                    )
+                    await response.aclose()
+                    self.nodes.release(node, model_name, ok=False)
+                    continue
+            
+            if session is not None:
+                self.sessions.route(session, node.url, model_name)
+            ok = False
+            try:
+                logger.debug("Calling Ollama", extra={"url": node.url, "model": model_name})
+                yield response
+                ok = True
+            except httpx.TransportError as e:
+                # A read timeout mid-stream is a slow model, not a dead node
+                if not isinstance(e, httpx.TimeoutException):
+                    self.nodes.eject(node, e)
+                raise
+            finally:
+                await response.aclose()
+                self.nodes.release(node, model_name, ok)
+            return
+        raise last_error
     
     async def generate_stream(
         self,
-        messages: list[dict[str, str]],
+        messages: list[dict[str, Any]],
         model_name: str,
         tools: list[dict[str, Any]] = None
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[Union[str, ToolCall], None]:
         """
         Generate streaming response from Ollama.
         
@@ -25,86 +173,150 @@ class OllamaLLM:
             tools: Optional list of tools (Ollama supports function calling)
         
         Yields:
-            Chunks of generated text
+            Chunks of generated text, or ToolCall for each requested tool call
         """
         # Convert messages to Ollama format
         ollama_messages = []
         for msg in messages:
-            ollama_messages.append({
+            ollama_message = {
                 "role": msg["role"],
                 "content": msg["content"]
-            })
+            }
+            if msg["role"] == "tool":
+                ollama_message["tool_name"] = msg["name"]
+            elif msg.get("tool_calls"):
+                ollama_message["tool_calls"] = [
+                    {"function": {"name": call.name, "arguments": call.arguments}}
+                    for call in msg["tool_calls"]
+                ]
+            ollama_messages.append(ollama_message)
         
-        # Prepare request payload
+        # Prepare request payload. Everything ahead of the messages stays the
+        # same across turns, so a conversation's prompt prefix is stable
         payload = {
             "model": model_name,
             "messages": ollama_messages,
             "stream": True,
-            "options": {
-                "temperature": 0.7
-            }
+            "options": self.generation_config
         }
         
+        session_key = current_session()
+        session = self.sessions.get(session_key) if session_key else None
+        keep_alive = settings.ollama_session_keep_alive
+        if session is not None and keep_alive:
+            # Ollama takes a duration string ("30m") or a number of seconds
+            payload["keep_alive"] = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+        
         # Add tools if provided (Ollama supports function calling)
         if tools:
-            payload["tools"] = self._convert_tools_to_ollama_format(tools)
-            print(f"🔧 Added {len(tools)} tools to Ollama payload")
-        else:
-            print(f"🔧 No tools provided to Ollama")
+            with span("tool_catalog", self.name, model_name):
+                payload["tools"] = self._convert_tools_to_ollama_format(tools)
+            logger.debug("Added tools to Ollama payload", extra={"tools": len(tools)})
+        
+        # Checked once per request so the per-token path stays a bool test
+        debug_tokens = logger.isEnabledFor(logging.DEBUG)
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                print(f"🔍 Calling Ollama at {self.base_url}/api/chat with model {model_name}")
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/api/chat",
-                    json=payload
-                ) as response:
+            async with self._get_client() as client:
+                connect_started = time.perf_counter()
+                async with self._open_stream(client, payload, model_name, session) as response:
                     response.raise_for_status()
-                    print(f"✅ Ollama responded with status {response.status_code}")
+                    observe_stage("provider_connect", time.perf_counter() - connect_started, self.name, model_name)
+                    logger.debug("Ollama responded", extra={"status": response.status_code})
                     
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            try:
-                                chunk_data = json.loads(line)
-                                if "message" in chunk_data:
-                                    content = chunk_data["message"].get("content", "")
+                    # Raw bytes in, frames out: no per-line str, empty frames never decoded
+                    parser = NDJSONStreamParser()
+                    try:
+                        async with aclosing(parser.aiter(response.aiter_bytes())) as frames:
+                            async for chunk_data in frames:
+                                message = chunk_data.get("message")
+                                if message:
+                                    content = message.get("content")
                                     if content:
-                                        print(f"📝 Yielding: {repr(content)}")
+                                        if debug_tokens and self._token_sampler.allow():
+                                            logger.debug("Ollama token (sampled)", extra={"content": content})
                                         yield content
-                            except json.JSONDecodeError:
-                                continue
+                                    for call in message.get("tool_calls") or ():
+                                        function = call.get("function", {})
+                                        yield ToolCall(
+                                            name=function["name"],
+                                            arguments=function.get("arguments") or {}
+                                        )
+                                if chunk_data.get("done"):
+                                    savings = None
+                                    if session is not None:
+                                        savings = self.sessions.record(session, model_name, ollama_messages, chunk_data)
+                                    self._record_stats(model_name, chunk_data, savings)
+                    finally:
+                        self._record_frames(model_name, parser)
                                 
-        except httpx.ConnectError as e:
-            print(f"❌ Error connecting to Ollama at {self.base_url}: {e}")
-            raise Exception(f"Could not connect to Ollama at {self.base_url}. Make sure Ollama is running.")
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            urls = ", ".join(self.nodes.urls)
+            logger.error("Error connecting to Ollama", extra={"url": urls, "error": str(e)})
+            raise Exception(f"Could not connect to Ollama at {urls}. Make sure Ollama is running.") from e
         except httpx.HTTPStatusError as e:
-            print(f"❌ HTTP {e.response.status_code} error from Ollama: {e}")
-            print(f"   Response: {e.response.text}")
-            raise Exception(f"Ollama returned HTTP {e.response.status_code}. The model may not be installed.")
+            logger.error(
+                "HTTP error status from Ollama",
+                extra={"status": e.response.status_code, "error": str(e)}
+            )
+            raise Exception(f"Ollama returned HTTP {e.response.status_code}. The model may not be installed.") from e
         except httpx.HTTPError as e:
-            print(f"❌ HTTP error from Ollama: {e}")
-            raise Exception("Ollama returned an error. Please try again.")
+            logger.error("HTTP error from Ollama", extra={"error": str(e)})
+            raise Exception("Ollama returned an error. Please try again.") from e
         except Exception as e:
-            print(f"❌ Error generating response: {e}")
+            logger.error("Error generating Ollama response", extra={"error": str(e)})
             raise
     
+    @staticmethod
+    def _record_stats(model_name: str, stats: dict[str, Any], savings: Optional[dict] = None):
+        """Export the final frame's counters (durations are in nanoseconds)."""
+        eval_count = stats.get("eval_count") or 0
+        eval_seconds = (stats.get("eval_duration") or 0) / 1e9
+        OLLAMA_EVAL_TOKENS.labels(model_name).inc(eval_count)
+        OLLAMA_PROMPT_EVAL_TOKENS.labels(model_name).inc(stats.get("prompt_eval_count") or 0)
+        if eval_seconds > 0:
+            OLLAMA_EVAL_SECONDS.labels(model_name).observe(eval_seconds)
+            OLLAMA_EVAL_TOKENS_PER_SECOND.labels(model_name).observe(eval_count / eval_seconds)
+        if stats.get("prompt_eval_duration"):
+            OLLAMA_PROMPT_EVAL_SECONDS.labels(model_name).observe(stats["prompt_eval_duration"] / 1e9)
+        logger.debug(
+            "Ollama stats",
+            extra={
+                "model": model_name,
+                "eval_count": eval_count,
+                "eval_duration": stats.get("eval_duration"),
+                "prompt_eval_count": stats.get("prompt_eval_count"),
+                "prompt_eval_duration": stats.get("prompt_eval_duration"),
+                **(savings or {}),
+            }
+        )
+    
+    @staticmethod
+    def _record_frames(model_name: str, parser: NDJSONStreamParser):
+        """Frame counters once per stream rather than per frame."""
+        for outcome in ("decoded", "skipped", "invalid"):
+            count = getattr(parser, outcome)
+            if count:
+                OLLAMA_STREAM_FRAMES.labels(model_name, outcome).inc(count)
+    
+    def stats(self) -> dict:
+        return {"nodes": self.nodes.stats(), "sessions": self.sessions.stats()}
+    
     def _convert_tools_to_ollama_format(self, tools: list[dict[str, Any]]) -> list[dict]:
-        """Convert MCP tools to Ollama function calling format."""
-        ollama_tools = []
-        
-        for tool in tools:
-            ollama_tool = {
-                "type": "function",
-                "function": {
-                    "name": tool["name"],
-                    "description": tool["description"],
-                    "parameters": tool.get("input_schema", {})
-                }
+        """Convert MCP tools to Ollama function calling format (precompiled catalog)."""
+        return tool_catalog.compile("ollama", tools)
+    
+    @staticmethod
+    def _build_declaration(tool: dict[str, Any], parameters: dict[str, Any]) -> dict:
+        """Build an Ollama function declaration."""
+        return {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool["description"],
+                "parameters": parameters
             }
-            ollama_tools.append(ollama_tool)
-        
-        return ollama_tools
+        }
 
 
 # Global Ollama instance
@@ -0,0 +1,218 @@
+import asyncio
+import itertools
+import time
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import OLLAMA_NODE_OUTSTANDING, OLLAMA_NODE_REQUESTS, OLLAMA_NODE_UP
+
+logger = get_logger(__name__)
+
+
+# Placement tiers, best first
+PLACEMENTS = ("resident", "installed", "unknown", "missing")
+
+
+def canonical_model(name: str) -> str:
+    """Ollama's own spelling: an untagged name means ':latest'."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaNode:
+    """One Ollama host and what it last reported."""
+
+    __slots__ = (
+        "url", "resident", "installed", "outstanding", "healthy",
+        "failures", "retry_at", "polled", "requests",
+    )
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        # Models loaded in memory (/api/ps) and pulled on disk (/api/tags)
+        self.resident: set[str] = set()
+        self.installed: set[str] = set()
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.retry_at = 0.0
+        self.polled = False
+
+        # Counters
+        self.requests = 0
+
+    def placement(self, model: str) -> str:
+        if model in self.resident:
+            return "resident"
+        if not self.polled:
+            return "unknown"
+        return "installed" if model in self.installed else "missing"
+
+
+class OllamaNodePool:
+    """
+    Ollama hosts behind one provider.
+
+    Every node is polled for its loaded (/api/ps) and installed (/api/tags)
+    models. A request goes to a node that already has the model in memory if
+    any, else one that has it installed, so cold loads are avoided when
+    possible; among equals the node with the fewest outstanding requests wins.
+    Nodes that fail to connect or to answer a poll are ejected and retried
+    with exponential backoff; ejected nodes are only used when nothing else is
+    left. A request can name a preferred node to stay on (see OllamaSessions).
+    With a single node nothing is polled.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        poll_interval: Optional[float] = None,
+        poll_timeout: Optional[float] = None,
+        backoff: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+    ):
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.nodes = [OllamaNode(url) for url in dict.fromkeys(urls)]
+        self.poll_interval = settings.ollama_poll_interval if poll_interval is None else poll_interval
+        self.poll_timeout = settings.ollama_poll_timeout if poll_timeout is None else poll_timeout
+        self.backoff = settings.ollama_eject_backoff if backoff is None else backoff
+        self.backoff_max = settings.ollama_eject_backoff_max if backoff_max is None else backoff_max
+        # Tie-break between equally good nodes
+        self._turn = itertools.count()
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def urls(self) -> list[str]:
+        return [node.url for node in self.nodes]
+
+    def start(self, client: httpx.AsyncClient):
+        """Start background polling (multi-node only) on the given client."""
+        if len(self.nodes) > 1 and self._poller is None:
+            self._poller = asyncio.create_task(self._poll_loop(client))
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+    async def _poll_loop(self, client: httpx.AsyncClient):
+        while True:
+            await self.refresh(client)
+            # Wake up early for an ejected node whose backoff ends sooner
+            now = time.monotonic()
+            retry = [node.retry_at - now for node in self.nodes if not node.healthy]
+            await asyncio.sleep(max(min([self.poll_interval, *retry]), 0.05))
+
+    async def refresh(self, client: httpx.AsyncClient):
+        """Poll every node that is healthy or due for a retry."""
+        now = time.monotonic()
+        due = [node for node in self.nodes if node.healthy or now >= node.retry_at]
+        await asyncio.gather(*(self._poll(client, node) for node in due))
+
+    async def _poll(self, client: httpx.AsyncClient, node: OllamaNode):
+        try:
+            ps, tags = await asyncio.gather(
+                client.get(f"{node.url}/api/ps", timeout=self.poll_timeout),
+                client.get(f"{node.url}/api/tags", timeout=self.poll_timeout),
+            )
+            ps.raise_for_status()
+            tags.raise_for_status()
+            resident = {canonical_model(m.get("model") or m["name"]) for m in ps.json().get("models") or []}
+            installed = {canonical_model(m.get("model") or m["name"]) for m in tags.json().get("models") or []}
+        except Exception as e:
+            self.eject(node, e)
+            return
+        node.resident = resident
+        node.installed = installed | resident
+        node.polled = True
+        self._reinstate(node)
+
+    def eject(self, node: OllamaNode, error: BaseException):
+        """Take a node out of rotation; it is retried after an exponentially growing delay."""
+        delay = min(self.backoff * 2 ** node.failures, self.backoff_max)
+        node.failures += 1
+        node.retry_at = time.monotonic() + delay
+        if node.healthy:
+            logger.warning(
+                "Ollama node ejected",
+                extra={"node": node.url, "retry_in_s": delay, "error": str(error) or type(error).__name__}
+            )
+        node.healthy = False
+        OLLAMA_NODE_UP.labels(node.url).set(0)
+
+    def reject(self, node: OllamaNode, model: str, status_code: int):
+        """
+        A node answered a chat request with an error status: 404 means it
+        doesn't have the model (until the next poll says otherwise), 5xx that
+        the node itself is failing, so it is ejected.
+        """
+        if status_code == 404:
+            model = canonical_model(model)
+            node.resident.discard(model)
+            node.installed.discard(model)
+            return
+        self.eject(node, RuntimeError(f"HTTP {status_code} from /api/chat"))
+
+    def _reinstate(self, node: OllamaNode):
+        if not node.healthy:
+            logger.info("Ollama node back in rotation", extra={"node": node.url})
+        node.healthy = True
+        node.failures = 0
+        OLLAMA_NODE_UP.labels(node.url).set(1)
+
+    def candidates(self, model: str, prefer: Optional[str] = None) -> list[OllamaNode]:
+        """
+        Nodes to try for `model`, best first (ejected nodes last, as a last resort).
+
+        A healthy `prefer` node (a conversation's previous node, which holds
+        its prompt cache) comes first unless it reports not having the model.
+        """
+        if len(self.nodes) == 1:
+            return self.nodes
+        model = canonical_model(model)
+        turn = next(self._turn)
+        count = len(self.nodes)
+
+        def rank(item: tuple[int, OllamaNode]) -> tuple:
+            index, node = item
+            placement = node.placement(model)
+            return (
+                not node.healthy,
+                not (node.url == prefer and placement != "missing"),
+                PLACEMENTS.index(placement),
+                node.outstanding,
+                (index - turn) % count,
+            )
+
+        return [node for _, node in sorted(enumerate(self.nodes), key=rank)]
+
+    def acquire(self, node: OllamaNode, model: str):
+        node.outstanding += 1
+        node.requests += 1
+        OLLAMA_NODE_OUTSTANDING.labels(node.url).set(node.outstanding)
+        OLLAMA_NODE_REQUESTS.labels(node.url, node.placement(canonical_model(model))).inc()
+
+    def release(self, node: OllamaNode, model: str, ok: bool):
+        node.outstanding -= 1
+        OLLAMA_NODE_OUTSTANDING.labels(node.url).set(node.outstanding)
+        if ok:
+            # Ollama keeps the model loaded after serving it; don't wait for the next poll
+            node.resident.add(canonical_model(model))
+            if not node.healthy:
+                self._reinstate(node)
+
+    def stats(self) -> dict:
+        return {
+            node.url: {
+                "healthy": node.healthy,
+                "outstanding": node.outstanding,
+                "requests": node.requests,
+                "resident": sorted(node.resident),
+                "installed": len(node.installed),
+            }
+            for node in self.nodes
+        }
@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import OLLAMA_PROMPT_EVAL_SECONDS_SAVED, OLLAMA_PROMPT_TOKENS_REUSED, OLLAMA_SESSION_ROUTES
+
+logger = get_logger(__name__)
+
+
+# Per-message template overhead in tokens, as in the context manager's estimate
+MESSAGE_OVERHEAD = 4
+
+# Prompt evaluations shorter than this say more about per-request overhead than speed
+MIN_RATE_SAMPLE_TOKENS = 64
+
+
+def _estimate_tokens(messages: list[dict[str, Any]]) -> int:
+    """Cheap token estimate (~4 characters per token) of chat messages."""
+    return sum(len(msg.get("content") or "") // 4 + 1 + MESSAGE_OVERHEAD for msg in messages)
+
+
+class OllamaSession:
+    """One conversation: where its last turn ran and what that node has cached for it."""
+
+    __slots__ = ("key", "node", "model", "sent", "context_tokens", "last_used", "turns", "reused_tokens")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.node: Optional[str] = None
+        self.model: Optional[str] = None
+        # Messages in the last request, and tokens the node holds for it (prompt + reply)
+        self.sent = 0
+        self.context_tokens = 0
+        self.last_used = time.monotonic()
+
+        # Counters
+        self.turns = 0
+        self.reused_tokens = 0
+
+
+class OllamaSessions:
+    """
+    Conversations pinned to the Ollama node that served them last.
+
+    Ollama skips evaluating the part of a prompt that matches what the model
+    instance last processed, and each turn of a conversation resends the
+    whole history, so a conversation that stays on one node with an
+    unchanged prefix only pays for its new messages. Sessions are keyed by
+    conversation (`conversation_id` or the request's `session_id`); idle ones
+    expire after `ttl` and the least recently used beyond `max_sessions` are
+    dropped.
+
+    Savings are estimated from each response's stats frame: the tokens the
+    node already held for the session (last prompt plus reply), less what
+    it had to evaluate beyond the new messages, at the model's observed
+    prompt evaluation speed.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_sessions: Optional[int] = None):
+        self.ttl = settings.ollama_session_ttl if ttl is None else ttl
+        self.max_sessions = settings.ollama_max_sessions if max_sessions is None else max_sessions
+        self._sessions: OrderedDict[str, OllamaSession] = OrderedDict()
+        # model -> smoothed prompt evaluation seconds per token
+        self._seconds_per_token: dict[str, float] = {}
+
+        # Counters
+        self.routes = {"new": 0, "sticky": 0, "moved": 0}
+        self.reused_tokens = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key: str) -> OllamaSession:
+        """The session for `key`, created on first use."""
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is not None and now - session.last_used > self.ttl:
+            session = None
+        if session is None:
+            session = self._sessions[key] = OllamaSession(key)
+        self._sessions.move_to_end(key)
+        session.last_used = now
+        self._evict(now)
+        return session
+
+    def _evict(self, now: float):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        # Oldest first: stop at the first one still fresh
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    @staticmethod
+    def preferred_node(session: OllamaSession, model: str) -> Optional[str]:
+        """The node holding the session's cache for `model`, if any."""
+        return session.node if session.model == model else None
+
+    def route(self, session: OllamaSession, node: str, model: str):
+        """Record the node a session's request went to."""
+        if session.node is None or session.model != model:
+            outcome = "new"
+        else:
+            outcome = "sticky" if session.node == node else "moved"
+        if outcome != "sticky":
+            # Nothing cached for this session on that node (or for that model)
+            session.sent = session.context_tokens = 0
+        session.node, session.model = node, model
+        self.routes[outcome] += 1
+        OLLAMA_SESSION_ROUTES.labels(outcome).inc()
+
+    def record(self, session: OllamaSession, model: str, messages: list[dict[str, Any]], stats: dict[str, Any]) -> dict:
+        """
+        Account a finished response from its stats frame.
+
+        Args:
+            session: Session the request belonged to
+            model: Model that served it
+            messages: Messages sent in the request
+            stats: Ollama's final frame (`prompt_eval_count`, `eval_count`, durations in ns)
+
+        Returns:
+            Prompt tokens reused from the node's cache and estimated seconds saved
+        """
+        evaluated = stats.get("prompt_eval_count") or 0
+        duration = (stats.get("prompt_eval_duration") or 0) / 1e9
+        rate = self._seconds_per_token.get(model)
+        if evaluated >= MIN_RATE_SAMPLE_TOKENS and duration > 0:
+            sample = duration / evaluated
+            rate = self._seconds_per_token[model] = sample if rate is None else 0.8 * rate + 0.2 * sample
+
+        reused = 0
+        if session.context_tokens and len(messages) > session.sent:
+            new = messages[session.sent:]
+            # The previous reply is already in the node's cache
+            if new[0].get("role") == "assistant":
+                new = new[1:]
+            reused = min(max(session.context_tokens + _estimate_tokens(new) - evaluated, 0), session.context_tokens)
+        saved = reused * rate if rate else 0.0
+
+        session.sent = len(messages)
+        session.context_tokens = evaluated + reused + (stats.get("eval_count") or 0)
+        session.turns += 1
+        session.reused_tokens += reused
+        if reused:
+            self.reused_tokens += reused
+            self.saved_seconds += saved
+            OLLAMA_PROMPT_TOKENS_REUSED.labels(model).inc(reused)
+            OLLAMA_PROMPT_EVAL_SECONDS_SAVED.labels(model).inc(saved)
+        return {"reused_tokens": reused, "saved_ms": round(saved * 1000, 1)}
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "routes": dict(self.routes),
+            "reused_tokens": self.reused_tokens,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
@@ -0,0 +1,120 @@
+import asyncio
+import importlib
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Built-in providers as `module:attribute` of their global instance
+BUILTIN_PROVIDERS = {
+    "gemini": "app.core.llm:gemini_llm",
+    "ollama": "app.core.ollama:ollama_llm",
+}
+
+
+class ProviderRegistry:
+    """
+    LLM providers by name.
+
+    A provider is any object with `name`, `generation_config` and
+    `generate_stream(messages, model_name, tools)`; optional async `start()` /
+    `close()` hooks are called from the app lifespan. Providers are declared
+    as `module:attribute` paths (built-ins plus LLM_PROVIDERS) and imported on
+    first use, or registered directly as instances. Only PROVIDER_PRELOAD is
+    loaded at startup, so an SDK nobody uses is never imported; a provider
+    loaded later has its `start()` hook run in the background.
+    """
+
+    def __init__(self, paths: Optional[dict[str, str]] = None, preload: Optional[list[str]] = None):
+        self._paths = {**BUILTIN_PROVIDERS, **settings.llm_provider_map} if paths is None else dict(paths)
+        self._preload = settings.provider_preload_list if preload is None else list(preload)
+        self._providers: dict[str, Any] = {}
+        self._started: set[str] = set()
+        self._running = False
+        self._start_tasks: set[asyncio.Task] = set()
+
+    def register(self, name: str, provider: Any):
+        """Register (or replace) a provider instance under `name`."""
+        self._providers[name] = provider
+
+    def names(self) -> list[str]:
+        return list(dict.fromkeys([*self._paths, *self._providers]))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._providers or name in self._paths
+
+    def loaded(self) -> list[str]:
+        """Names of the providers imported so far."""
+        return list(self._providers)
+
+    def get(self, name: str) -> Any:
+        """
+        The provider registered as `name`, importing it on first use.
+
+        Raises:
+            KeyError: If no provider has that name
+        """
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+        path = self._paths.get(name)
+        if path is None:
+            raise KeyError(f"Unknown LLM provider {name!r}; known: {', '.join(self.names())}")
+        module_name, _, attribute = path.partition(":")
+        provider = getattr(importlib.import_module(module_name), attribute)
+        self._providers[name] = provider
+        logger.info("Loaded LLM provider", extra={"provider": name})
+        if self._running:
+            task = asyncio.create_task(self._start_later(name, provider))
+            self._start_tasks.add(task)
+            task.add_done_callback(self._start_tasks.discard)
+        return provider
+
+    async def _start(self, name: str, provider: Any):
+        if name not in self._started and hasattr(provider, "start"):
+            await provider.start()
+        self._started.add(name)
+
+    async def _start_later(self, name: str, provider: Any):
+        try:
+            await self._start(name, provider)
+        except Exception as e:
+            logger.warning("Provider start failed", extra={"provider": name, "error": str(e)})
+
+    async def start(self):
+        """Load the PROVIDER_PRELOAD providers (`*` for all) and run `start()` on every loaded one."""
+        names = self.names() if "*" in self._preload else [name for name in self._preload if name in self]
+        for name in names:
+            self.get(name)
+        for name, provider in list(self._providers.items()):
+            await self._start(name, provider)
+        self._running = True
+
+    def stats(self) -> dict:
+        """`stats()` of every loaded provider that has one."""
+        return {
+            name: provider.stats()
+            for name, provider in self._providers.items()
+            if hasattr(provider, "stats")
+        }
+
+    async def close(self):
+        """Run `close()` on started providers."""
+        self._running = False
+        if self._start_tasks:
+            await asyncio.gather(*self._start_tasks, return_exceptions=True)
+        for name in list(self._started):
+            provider = self._providers.get(name)
+            if provider is not None and hasattr(provider, "close"):
+                try:
+                    await provider.close()
+                except Exception as e:
+                    logger.warning("Provider close failed", extra={"provider": name, "error": str(e)})
+        self._started.clear()
+
+
+# Global provider registry instance
+provider_registry = ProviderRegistry()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SharedCache:
+    """
+    Key/value entries with an expiry time in one SQLite file.
+
+    Every process that opens the same file sees the same entries (WAL mode,
+    so readers don't block the writer), which lets worker processes share a
+    cache without an outside service. Each process opens its own connection
+    on first use; queries run on a worker thread. Expired entries are purged
+    every `purge_every` writes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str, namespace: str, purge_every: int = 500):
+        self.path = path
+        self.namespace = namespace
+        self.purge_every = purge_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        # One connection per process, used from worker threads one at a time
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork (gunicorn preload)
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at >= ?",
+                (self.namespace, key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _put(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, expires_at, value),
+            )
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+
+    async def get(self, key: str) -> Optional[str]:
+        """The value stored under `key`, unless missing or expired."""
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning("Shared cache read failed", extra={"path": self.path, "error": str(e)})
+            return None
+
+    async def put(self, key: str, value: str, expires_at: float):
+        """Store `value` until `expires_at` (epoch seconds)."""
+        try:
+            await asyncio.to_thread(self._put, key, value, expires_at)
+        except sqlite3.Error as e:
+            logger.warning("Shared cache write failed", extra={"path": self.path, "error": str(e)})
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process started, interpreter start-up included (Linux; None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            fields = f.read().rpartition(")")[2].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def import_profile(module: str = "main", top: int = 15) -> dict:
+    """
+    Import `module` in a fresh interpreter under `-X importtime`.
+
+    Args:
+        module: Module to import
+        top: How many packages and modules to list
+
+    Returns:
+        Total import time, self time summed per top-level package (per module
+        for this app's own `app.*` modules), and the slowest modules by
+        cumulative time, all in milliseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: dict[str, float] = defaultdict(float)
+    modules: list[tuple[str, float]] = []
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name.strip()
+        cumulative = int(cumulative_us) / 1000
+        package = name if name.startswith("app.") else name.split(".")[0]
+        packages[package] += int(self_us) / 1000
+        modules.append((name, cumulative))
+        if name == module:
+            total = cumulative
+
+    def ranked(items) -> dict[str, float]:
+        return {name: round(ms, 1) for name, ms in sorted(items, key=lambda item: -item[1])[:top]}
+
+    return {
+        "total_ms": round(total, 1),
+        "packages_self_ms": ranked(packages.items()),
+        "modules_cumulative_ms": ranked(modules),
+    }
+
+
+class StartupProfile:
+    """
+    How long each lifespan startup phase took, and how long the process took
+    to become ready.
+
+    The lifespan wraps each phase in `phase()` and calls `ready()` at the end;
+    `/api/ready` and `python main.py --profile-startup` report the numbers.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed startup phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def ready(self):
+        """Record that startup finished and log the breakdown."""
+        uptime = process_uptime()
+        self.ready_ms = round(uptime * 1000, 1) if uptime is not None else None
+        logger.info("Startup finished", extra={"phases_ms": self.phases, "ready_ms": self.ready_ms})
+
+    def report(self) -> dict:
+        return {
+            "phases_ms": dict(self.phases),
+            "lifespan_ms": round(sum(self.phases.values()), 1),
+            # Since process start: interpreter, imports and lifespan
+            "ready_ms": self.ready_ms,
+        }
+
+
+# Global startup profile instance
+startup_profile = StartupProfile()
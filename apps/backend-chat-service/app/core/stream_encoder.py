@@ -0,0 +1,130 @@
+import asyncio
+import json
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.metrics import STREAM_FRAMES
+
+# Comment line: ignored by the client's `0:` parser, keeps proxies from timing out
+KEEPALIVE_FRAME = ": keep-alive\n"
+
+_DONE = object()
+
+
+def encode_text(text: str) -> str:
+    """Frame a text part as `0:<json string>\\n`; JSON escaping keeps newlines out of the framing."""
+    return f"0:{json.dumps(text, ensure_ascii=False)}\n"
+
+
+class StreamEncoder:
+    """
+    Turns a stream of text chunks into wire frames.
+
+    Chunks are coalesced: the first one is sent immediately (time-to-first-
+    token is unaffected), after that chunks are buffered and flushed as one
+    frame every `flush_interval` seconds or once `flush_bytes` characters are
+    pending, whichever comes first. With `flush_interval` 0 every chunk is its
+    own frame. While the source is quiet (e.g. during a tool call) a
+    keep-alive comment is sent every `keepalive_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        flush_bytes: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        max_pending: int = 256,
+    ):
+        self.flush_interval = (
+            settings.stream_flush_interval_ms / 1000 if flush_interval is None else flush_interval
+        )
+        self.flush_bytes = settings.stream_flush_bytes if flush_bytes is None else flush_bytes
+        self.keepalive_interval = (
+            settings.stream_keepalive_interval if keepalive_interval is None else keepalive_interval
+        )
+        self.max_pending = max_pending
+
+    @staticmethod
+    async def _pump(source: AsyncIterator[str], queue: asyncio.Queue):
+        """Move chunks from the source to the queue; the bounded queue keeps backpressure."""
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_DONE)
+        finally:
+            await source.aclose()
+
+    async def encode(self, source: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        """
+        Yield frames for `source`.
+
+        The source is read by a helper task so waiting for the next chunk can
+        time out (to flush or send a keep-alive) without cancelling the source
+        itself. Closing this generator cancels the helper and closes the source.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        pump = asyncio.ensure_future(self._pump(source, queue))
+
+        buffer: list[str] = []
+        pending = 0
+        first = True
+        last_flush = last_send = loop.time()
+        try:
+            while True:
+                if queue.empty():
+                    if buffer:
+                        deadline = last_flush + self.flush_interval
+                    elif self.keepalive_interval > 0:
+                        deadline = last_send + self.keepalive_interval
+                    else:
+                        deadline = None
+                    try:
+                        async with asyncio.timeout_at(deadline):
+                            item = await queue.get()
+                    except TimeoutError:
+                        now = loop.time()
+                        if buffer:
+                            STREAM_FRAMES.labels("text").inc()
+                            yield encode_text("".join(buffer))
+                            buffer.clear()
+                            pending = 0
+                            last_flush = now
+                        else:
+                            STREAM_FRAMES.labels("keepalive").inc()
+                            yield KEEPALIVE_FRAME
+                        last_send = now
+                        continue
+                else:
+                    item = queue.get_nowait()
+
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                buffer.append(item)
+                pending += len(item)
+                now = loop.time()
+                if (
+                    first
+                    or self.flush_interval <= 0
+                    or pending >= self.flush_bytes
+                    or now - last_flush >= self.flush_interval
+                ):
+                    STREAM_FRAMES.labels("text").inc()
+                    yield encode_text("".join(buffer))
+                    buffer.clear()
+                    pending = 0
+                    first = False
+                    last_flush = last_send = now
+
+            if buffer:
+                STREAM_FRAMES.labels("text").inc()
+                yield encode_text("".join(buffer))
+        finally:
+            pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from typing import Any, Callable, Optional, Sequence
+
+
+SchemaConverter = Callable[[dict[str, Any]], Any]
+DeclarationBuilder = Callable[[dict[str, Any], Any], dict]
+
+
+def content_hash(obj: Any) -> str:
+    """Stable hash of a JSON-like object (key order independent)."""
+    encoded = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class ToolCatalog:
+    """
+    Provider-specific tool declarations, compiled once per MCP tool list.
+
+    Each provider registers a schema converter and a declaration builder.
+    Converted schemas are cached by the content hash of the input schema, so
+    identical schemas (common across servers) are converted and stored once.
+    The compiled list for the current tool set is rebuilt only when the
+    tool list actually changes.
+    """
+
+    def __init__(self):
+        self._providers: dict[str, tuple[SchemaConverter, DeclarationBuilder]] = {}
+        self._tools: Sequence[dict[str, Any]] = ()
+        self._schema_hashes: dict[int, str] = {}  # id(tool) -> input schema hash
+        self._schemas: dict[str, dict[str, Any]] = {}  # provider -> schema hash -> converted
+        self._compiled: dict[str, list[dict]] = {}  # provider -> declarations
+        self.version: Optional[str] = None
+
+    def register(self, provider: str, convert_schema: SchemaConverter, build: DeclarationBuilder):
+        """Register a provider's schema converter and declaration builder."""
+        self._providers[provider] = (convert_schema, build)
+        self._schemas.setdefault(provider, {})
+        self._compiled.pop(provider, None)
+
+    def update(self, tools: Sequence[dict[str, Any]]) -> bool:
+        """
+        Replace the tool set and precompile it for every registered provider.
+
+        Returns:
+            True if the tool list changed and the catalog was rebuilt
+        """
+        schema_hashes = {id(tool): content_hash(tool.get("input_schema") or {}) for tool in tools}
+        version = content_hash([
+            [tool["name"], tool.get("description"), schema_hashes[id(tool)]]
+            for tool in tools
+        ])
+
+        self._tools = tools
+        self._schema_hashes = schema_hashes
+        if version == self.version:
+            return False
+
+        self.version = version
+        self._compiled.clear()
+
+        # Drop converted schemas no tool refers to anymore
+        live = set(schema_hashes.values())
+        for cache in self._schemas.values():
+            for key in [key for key in cache if key not in live]:
+                del cache[key]
+
+        for provider in self._providers:
+            self._compiled[provider] = [self._declare(provider, tool) for tool in tools]
+        return True
+
+    def _schema_hash(self, tool: dict[str, Any]) -> str:
+        key = self._schema_hashes.get(id(tool))
+        if key is None:
+            key = content_hash(tool.get("input_schema") or {})
+        return key
+
+    def _declare(self, provider: str, tool: dict[str, Any]) -> dict:
+        convert_schema, build = self._providers[provider]
+        cache = self._schemas[provider]
+        key = self._schema_hash(tool)
+        if key not in cache:
+            cache[key] = convert_schema(tool.get("input_schema") or {})
+        return build(tool, cache[key])
+
+    def compile(self, provider: str, tools: Sequence[dict[str, Any]]) -> list[dict]:
+        """
+        Get provider declarations for `tools`.
+
+        The current catalog is returned as-is; any other list (e.g. a subset)
+        is assembled from the shared per-schema cache.
+        """
+        if tools is self._tools:
+            compiled = self._compiled.get(provider)
+            if compiled is None:
+                compiled = self._compiled[provider] = [self._declare(provider, tool) for tool in tools]
+            return compiled
+        return [self._declare(provider, tool) for tool in tools]
+
+
+# Global tool catalog instance
+tool_catalog = ToolCatalog()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_request_started: ContextVar[Optional[float]] = ContextVar("request_started", default=None)
+_session: ContextVar[Optional[str]] = ContextVar("session", default=None)
+
+
+def start_trace() -> str:
+    """Begin a trace for the current request context."""
+    trace_id = os.urandom(16).hex()
+    _trace_id.set(trace_id)
+    _request_started.set(time.perf_counter())
+    return trace_id
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def request_started() -> Optional[float]:
+    """perf_counter() timestamp at which the current request was received."""
+    return _request_started.get()
+
+
+def set_session(key: Optional[str]):
+    """Tag the current request context with the conversation it belongs to."""
+    _session.set(key)
+
+
+def current_session() -> Optional[str]:
+    """Conversation key of the current request, for providers that route by conversation."""
+    return _session.get()
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanExporter:
+    """
+    Batches finished spans and writes them in OTLP/JSON shape.
+
+    Spans go to a JSON-lines file (TRACE_EXPORT_PATH) and/or are POSTed to an
+    OTLP/HTTP collector (TRACE_EXPORT_URL, e.g. http://localhost:4318/v1/traces).
+    Export runs in a background task; when the queue is full spans are
+    dropped instead of slowing requests down.
+    """
+
+    def __init__(self, path: Optional[str] = None, url: Optional[str] = None, max_queue: int = 10000):
+        self.path = path
+        self.url = url
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.url)
+
+    def export(self, span: dict):
+        if self._queue is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait(span)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _payload(self, spans: list[dict]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": "ai-chatbot-backend"}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": spans}],
+            }]
+        }
+
+    def _write_file(self, payload: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(payload) + "\n")
+
+    async def _flush(self, spans: list[dict]):
+        payload = self._payload(spans)
+        try:
+            if self.path:
+                await asyncio.to_thread(self._write_file, payload)
+            if self.url:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    await client.post(self.url, json=payload)
+        except Exception as e:
+            logger.warning("Span export failed", extra={"error": str(e)})
+
+    async def _run(self):
+        while True:
+            spans = [await self._queue.get()]
+            # Batch whatever else is already queued
+            while len(spans) < 512 and not self._queue.empty():
+                spans.append(self._queue.get_nowait())
+            await self._flush(spans)
+            await asyncio.sleep(1.0)
+
+    async def close(self):
+        """Flush pending spans and stop the export task."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        spans = []
+        while not self._queue.empty():
+            spans.append(self._queue.get_nowait())
+        if spans:
+            await self._flush(spans)
+        self._task = None
+        self._queue = None
+
+
+def record_span(name: str, duration: float, attributes: dict[str, Any]):
+    """Emit a finished span ending now; a no-op unless an exporter is configured."""
+    if not span_exporter.enabled:
+        return
+    end = time.time_ns()
+    span_exporter.export({
+        "traceId": _trace_id.get() or os.urandom(16).hex(),
+        "spanId": os.urandom(8).hex(),
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(end - int(duration * 1e9)),
+        "endTimeUnixNano": str(end),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in attributes.items() if value not in (None, "")
+        ],
+    })
+
+
+class TracingMiddleware:
+    """ASGI middleware that starts a trace and stamps the receive time for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            start_trace()
+            scope.setdefault("state", {})["received_at"] = request_started()
+        await self.app(scope, receive, send)
+
+
+# Global span exporter instance
+span_exporter = SpanExporter(settings.trace_export_path, settings.trace_export_url)
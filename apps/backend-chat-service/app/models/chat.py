@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import Any, Optional
+from pydantic import BaseModel, Field
 
 
 class Message(BaseModel):
@@ -7,13 +8,77 @@ class Message(BaseModel):
     content: str
 
 
+class StreamOptions(BaseModel):
+    """Per-request overrides for response framing (defaults come from settings)."""
+    flush_interval_ms: Optional[int] = Field(default=None, ge=0, le=1000)
+    flush_bytes: Optional[int] = Field(default=None, ge=1)
+
+
 class ChatRequest(BaseModel):
-    """Request model for chat endpoint."""
+    """
+    Request model for chat endpoint.
+    
+    Without `conversation_id`, `messages` is the full history. With it,
+    `messages` holds only the new message(s); the history is loaded server-side.
+    Clients that keep the history themselves can pass a stable `session_id`
+    so every turn of the conversation goes to the same model instance.
+    """
     messages: list[Message]
     model: str = "gemini-2.0-flash-exp"
+    conversation_id: Optional[int] = None
+    session_id: Optional[str] = Field(default=None, max_length=128)
+    stream_options: Optional[StreamOptions] = None
+
+
+class BatchChatRequest(ChatRequest):
+    """One request of a batch; `id` ties it to its result (defaults to its position)."""
+    id: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    """
+    Request model for the batch endpoint.
+    
+    To resume a batch whose results were partly received, resend it with the
+    ids that already succeeded in `skip_ids`. `concurrency` is capped at
+    BATCH_CONCURRENCY.
+    """
+    requests: list[BatchChatRequest] = Field(min_length=1)
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    skip_ids: list[str] = []
+
+
+class BatchResult(BaseModel):
+    """Outcome of one batch request, sent as one NDJSON line."""
+    id: str
+    status: str  # 'ok' or 'error'
+    model: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+    # Id of the identical request whose generation this result reuses
+    duplicate_of: Optional[str] = None
+    elapsed_ms: float = 0.0
 
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
     message: str
     model: str
+
+
+class ConversationCreate(BaseModel):
+    """Request model for creating a server-side conversation."""
+    title: Optional[str] = None
+
+
+class Conversation(BaseModel):
+    """Server-side conversation with its stored messages."""
+    id: int
+    messages: list[Message] = []
+
+
+class ToolCall(BaseModel):
+    """Function call requested by the model during streaming."""
+    name: str
+    arguments: dict[str, Any] = {}
+    id: Optional[str] = None
@@ -0,0 +1,300 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from fnmatch import fnmatchcase
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import (
+    ADMISSION_INFLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT_SECONDS,
+)
+
+logger = get_logger(__name__)
+
+
+PRIORITIES = ("high", "normal", "low")
+
+# Per-model limit lookups remembered (model names come from clients)
+MODEL_LIMIT_CACHE_SIZE = 1024
+
+
+class AdmissionRejectedError(RuntimeError):
+    """A request could not be admitted; carries the HTTP status and a Retry-After hint."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted generation slot. `release()` is idempotent."""
+
+    __slots__ = ("provider", "model", "client", "priority", "acquired_at", "_scheduler")
+
+    def __init__(
+        self,
+        scheduler: "AdmissionScheduler",
+        provider: str,
+        model: str,
+        client: str = "anonymous",
+        priority: str = "normal",
+    ):
+        self._scheduler = scheduler
+        self.provider = provider
+        self.model = model
+        self.client = client
+        self.priority = priority
+        self.acquired_at = time.perf_counter()
+
+    def transfer(self) -> "Ticket":
+        """Move the slot to a new ticket for a new owner; this one no longer holds it."""
+        ticket = Ticket(self._scheduler, self.provider, self.model, self.client, self.priority)
+        ticket.acquired_at = self.acquired_at
+        self._scheduler = None
+        return ticket
+
+    def covers(self, provider: str, model: str) -> bool:
+        """Whether a generation on this provider and model is within this slot."""
+        return provider == self.provider and model == self.model
+
+    def release(self):
+        scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler._release(self)
+
+
+class _Waiter:
+    __slots__ = ("provider", "model", "client", "priority", "future", "enqueued_at")
+
+    def __init__(self, provider: str, model: str, client: str, priority: int):
+        self.provider = provider
+        self.model = model
+        self.client = client
+        self.priority = priority
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionScheduler:
+    """
+    Admission control in front of the LLM providers.
+
+    Each generation needs a slot under its provider's limit and, if one is
+    configured, its model's limit. When no slot is free the request waits in
+    a bounded queue: higher priorities are served first, and within a
+    priority clients take turns (round-robin, FIFO per client) so one busy
+    client cannot starve the others. When the queue, or the client's share
+    of it, is full the request is rejected immediately (503 / 429) with a
+    Retry-After estimate instead of piling up until the HTTP client times out.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        provider_limits: Optional[dict[str, int]] = None,
+        model_limits: Optional[dict[str, int]] = None,
+        queue_size: Optional[int] = None,
+        client_queue_size: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.enabled = settings.admission_enabled if enabled is None else enabled
+        self.provider_limits = settings.provider_concurrency_map if provider_limits is None else provider_limits
+        self.model_limits = settings.model_concurrency_map if model_limits is None else model_limits
+        self.queue_size = settings.admission_queue_size if queue_size is None else queue_size
+        self.client_queue_size = (
+            settings.admission_client_queue_size if client_queue_size is None else client_queue_size
+        )
+        self.queue_timeout = settings.admission_queue_timeout if queue_timeout is None else queue_timeout
+
+        self._active_providers: dict[str, int] = {}
+        self._active_models: dict[str, int] = {}
+        # One client -> FIFO map per priority; dict order is the round-robin order
+        self._queues: list[OrderedDict[str, deque[_Waiter]]] = [OrderedDict() for _ in PRIORITIES]
+        self._waiting = 0
+        self._waiting_clients: dict[str, int] = {}
+        self._waiting_providers: dict[str, int] = {}
+        # Smoothed slot hold time per provider, for Retry-After
+        self._hold_seconds: dict[str, float] = {}
+        self._model_limit_cache: dict[str, Optional[int]] = {}
+
+        # Counters
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _model_limit(self, model: str) -> Optional[int]:
+        if model in self._model_limit_cache:
+            return self._model_limit_cache[model]
+        limit = next(
+            (limit for pattern, limit in self.model_limits.items() if fnmatchcase(model, pattern)),
+            None,
+        )
+        if len(self._model_limit_cache) < MODEL_LIMIT_CACHE_SIZE:
+            self._model_limit_cache[model] = limit
+        return limit
+
+    def _has_capacity(self, provider: str, model: str) -> bool:
+        provider_limit = self.provider_limits.get(provider)
+        if provider_limit is not None and self._active_providers.get(provider, 0) >= provider_limit:
+            return False
+        model_limit = self._model_limit(model)
+        return model_limit is None or self._active_models.get(model, 0) < model_limit
+
+    def _grant(self, provider: str, model: str, client: str, priority: str) -> Ticket:
+        self._active_providers[provider] = self._active_providers.get(provider, 0) + 1
+        self._active_models[model] = self._active_models.get(model, 0) + 1
+        ADMISSION_INFLIGHT.labels(provider).set(self._active_providers[provider])
+        self.admitted += 1
+        return Ticket(self, provider, model, client, priority)
+
+    def _retry_after(self, provider: str) -> int:
+        """Seconds until a slot is likely free: queue ahead x average hold time / slots."""
+        limit = self.provider_limits.get(provider) or 1
+        hold = self._hold_seconds.get(provider, 5.0)
+        ahead = self._waiting_providers.get(provider, 0) + 1
+        return min(max(math.ceil(ahead * hold / limit), 1), 60)
+
+    def _reject(self, status_code: int, reason: str, provider: str) -> AdmissionRejectedError:
+        self.rejected += 1
+        ADMISSION_REJECTIONS.labels(provider, reason).inc()
+        logger.debug("Request rejected by admission control", extra={"provider": provider, "reason": reason})
+        return AdmissionRejectedError(status_code, reason, self._retry_after(provider))
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str,
+        client: str = "anonymous",
+        priority: str = "normal",
+    ) -> Ticket:
+        """
+        Wait for a generation slot.
+
+        Args:
+            provider: Provider name (e.g. 'gemini', 'ollama')
+            model: Full model identifier (Backend.model_id), matched against per-model limits
+            client: Fairness key (API key or client address)
+            priority: 'high', 'normal' or 'low'
+
+        Raises:
+            AdmissionRejectedError: 429 when the client's queue share is used up,
+                503 when the queue is full or the wait times out
+        """
+        if priority not in PRIORITIES:
+            priority = "normal"
+        if not self.enabled:
+            return Ticket(None, provider, model, client, priority)
+
+        # Fast path: free slot and nobody already waiting for this provider
+        if not self._waiting_providers.get(provider) and self._has_capacity(provider, model):
+            ADMISSION_WAIT_SECONDS.labels(provider, model).observe(0.0)
+            return self._grant(provider, model, client, priority)
+
+        if self._waiting >= self.queue_size:
+            raise self._reject(503, "queue_full", provider)
+        if self._waiting_clients.get(client, 0) >= self.client_queue_size:
+            raise self._reject(429, "client_queue_full", provider)
+
+        waiter = _Waiter(provider, model, client, PRIORITIES.index(priority))
+        self._enqueue(waiter)
+        self.queued += 1
+        # Slots may be free for this model even though others wait on theirs
+        self._dispatch()
+        try:
+            ticket = await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._dequeue(waiter):
+                self.timeouts += 1
+                raise self._reject(503, "queue_timeout", provider) from None
+            # Granted just as the timeout fired
+            ticket = waiter.future.result()
+        except asyncio.CancelledError:
+            if not self._dequeue(waiter) and waiter.future.done():
+                waiter.future.result().release()
+            raise
+        ADMISSION_WAIT_SECONDS.labels(provider, model).observe(time.perf_counter() - waiter.enqueued_at)
+        return ticket
+
+    def _enqueue(self, waiter: _Waiter):
+        self._queues[waiter.priority].setdefault(waiter.client, deque()).append(waiter)
+        self._waiting += 1
+        self._waiting_clients[waiter.client] = self._waiting_clients.get(waiter.client, 0) + 1
+        self._waiting_providers[waiter.provider] = self._waiting_providers.get(waiter.provider, 0) + 1
+        ADMISSION_QUEUE_DEPTH.labels(waiter.provider).set(self._waiting_providers[waiter.provider])
+
+    def _dequeue(self, waiter: _Waiter) -> bool:
+        """Remove a waiter that is still queued; False if it was already granted."""
+        queue = self._queues[waiter.priority].get(waiter.client)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.priority][waiter.client]
+        self._forget(waiter)
+        return True
+
+    def _forget(self, waiter: _Waiter):
+        self._waiting -= 1
+        self._waiting_clients[waiter.client] -= 1
+        if not self._waiting_clients[waiter.client]:
+            del self._waiting_clients[waiter.client]
+        self._waiting_providers[waiter.provider] -= 1
+        ADMISSION_QUEUE_DEPTH.labels(waiter.provider).set(self._waiting_providers[waiter.provider])
+
+    def _release(self, ticket: Ticket):
+        provider, model = ticket.provider, ticket.model
+        self._active_providers[provider] -= 1
+        self._active_models[model] -= 1
+        if not self._active_models[model]:
+            del self._active_models[model]
+        ADMISSION_INFLIGHT.labels(provider).set(self._active_providers[provider])
+        held = time.perf_counter() - ticket.acquired_at
+        previous = self._hold_seconds.get(provider)
+        self._hold_seconds[provider] = held if previous is None else 0.8 * previous + 0.2 * held
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiters: by priority, then round-robin across clients."""
+        granted = True
+        while granted and self._waiting:
+            granted = False
+            for queues in self._queues:
+                for client in list(queues):
+                    queue = queues[client]
+                    waiter = queue[0]
+                    if not self._has_capacity(waiter.provider, waiter.model):
+                        continue
+                    queue.popleft()
+                    if queue:
+                        # Served: go to the back of the round-robin order
+                        queues.move_to_end(client)
+                    else:
+                        del queues[client]
+                    self._forget(waiter)
+                    waiter.future.set_result(
+                        self._grant(waiter.provider, waiter.model, waiter.client, PRIORITIES[waiter.priority])
+                    )
+                    granted = True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "active": dict(self._active_providers),
+            "waiting": dict(self._waiting_providers),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+# Global admission scheduler instance
+admission = AdmissionScheduler()
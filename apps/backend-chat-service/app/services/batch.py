@@ -0,0 +1,324 @@
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncGenerator, Iterable, Optional
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import BATCH_REQUESTS
+from app.models.chat import BatchChatRequest, BatchResult
+from app.services.admission import AdmissionRejectedError, admission
+from app.services.chat_service import chat_service
+from app.services.conversation_store import ConversationNotFoundError, conversation_store
+from app.services.router import Backend, model_router
+
+logger = get_logger(__name__)
+
+
+class _Job:
+    """One generation of a batch, shared by every request identical to the first."""
+
+    __slots__ = ("request", "ids", "backend")
+
+    def __init__(self, request: BatchChatRequest, request_id: str, backend: Backend):
+        self.request = request
+        self.ids = [request_id]
+        # Preferred backend: the admission slot (and the interleaving) is per provider
+        self.backend = backend
+
+
+class BatchRunner:
+    """
+    Runs batches of independent chat requests.
+
+    Requests go through the same ChatService as `POST /api/chat` (routing,
+    context budgets, response cache, tool loop) and take admission slots at
+    low priority, so interactive traffic is served first. Identical requests
+    (same model and messages, no conversation) are generated once. Jobs are
+    interleaved across providers so a slow provider does not hold every
+    worker, and results are yielded as they finish rather than in order.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, max_requests: Optional[int] = None):
+        self.concurrency = settings.batch_concurrency if concurrency is None else concurrency
+        self.max_requests = settings.batch_max_requests if max_requests is None else max_requests
+
+        # Counters
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+    @staticmethod
+    def request_ids(requests: list[BatchChatRequest]) -> list[str]:
+        """
+        Each request's id: its own, else its position in the batch.
+
+        Raises:
+            ValueError: If two requests share an id
+        """
+        ids = [request.id if request.id is not None else str(index) for index, request in enumerate(requests)]
+        seen = set()
+        for request_id in ids:
+            if request_id in seen:
+                raise ValueError(f"Duplicate request id {request_id!r}")
+            seen.add(request_id)
+        return ids
+
+    def check(self, requests: list[BatchChatRequest]):
+        """
+        Validate an API batch before its response starts.
+
+        Raises:
+            ValueError: If the batch is larger than BATCH_MAX_REQUESTS or two
+                requests share an id
+        """
+        if len(requests) > self.max_requests:
+            raise ValueError(f"Batch of {len(requests)} requests exceeds the limit of {self.max_requests}")
+        self.request_ids(requests)
+
+    @staticmethod
+    def _dedupe_key(request: BatchChatRequest) -> Optional[str]:
+        # Conversation turns read and append stored history: never shared
+        if request.conversation_id is not None:
+            return None
+        messages = [[message.role, message.content] for message in request.messages]
+        return json.dumps([request.model, messages], separators=(",", ":"))
+
+    def _plan(self, requests: list[BatchChatRequest], ids: list[str], skip_ids: Iterable[str]) -> list[_Job]:
+        """Deduplicate the pending requests and order the jobs round-robin across providers."""
+        skip = set(skip_ids)
+        jobs: dict[object, _Job] = {}
+        for request, request_id in zip(requests, ids):
+            if request_id in skip:
+                self.skipped += 1
+                BATCH_REQUESTS.labels("skipped").inc()
+                continue
+            key = self._dedupe_key(request)
+            job = jobs.get(key) if key is not None else None
+            if job is not None:
+                job.ids.append(request_id)
+                continue
+            backend = model_router.primary(request.model)
+            jobs[key if key is not None else object()] = _Job(request, request_id, backend)
+
+        by_provider: dict[str, list[_Job]] = {}
+        for job in jobs.values():
+            by_provider.setdefault(job.backend.provider_name, []).append(job)
+        queues = list(by_provider.values())
+        ordered = []
+        for index in range(max((len(queue) for queue in queues), default=0)):
+            ordered.extend(queue[index] for queue in queues if index < len(queue))
+        return ordered
+
+    async def _acquire(self, job: _Job):
+        """An admission slot at low priority; a rejection is waited out, not failed."""
+        while True:
+            try:
+                return await admission.acquire(
+                    job.backend.provider_name,
+                    job.backend.model_id,
+                    client="batch",
+                    priority="low"
+                )
+            except AdmissionRejectedError as e:
+                logger.debug("Batch request waiting for admission", extra={"reason": e.reason})
+                await asyncio.sleep(e.retry_after)
+
+    async def _generate(self, job: _Job) -> str:
+        request = job.request
+        history = []
+        if request.conversation_id is not None:
+            history = await conversation_store.history(request.conversation_id)
+        ticket = await self._acquire(job)
+        try:
+            stream = chat_service.chat_stream(
+                messages=request.messages,
+                model=request.model,
+                history=history,
+                conversation_id=request.conversation_id,
+                session_id=request.session_id,
+                ticket=ticket
+            )
+            async with aclosing(stream) as chunks:
+                return "".join([chunk async for chunk in chunks])
+        finally:
+            ticket.release()
+
+    async def _run_job(self, job: _Job) -> list[BatchResult]:
+        started = time.perf_counter()
+        content = error = None
+        try:
+            content = await self._generate(job)
+        except ConversationNotFoundError:
+            error = "Conversation not found"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.warning("Batch request failed", extra={"id": job.ids[0], "model": job.request.model, "error": error})
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        status = "ok" if error is None else "error"
+
+        results = []
+        for index, request_id in enumerate(job.ids):
+            results.append(BatchResult(
+                id=request_id,
+                status=status,
+                model=job.request.model,
+                content=content,
+                error=error,
+                duplicate_of=job.ids[0] if index else None,
+                elapsed_ms=elapsed_ms,
+            ))
+        if error is None:
+            self.completed += len(job.ids)
+        else:
+            self.failed += len(job.ids)
+        self.duplicates += len(job.ids) - 1
+        BATCH_REQUESTS.labels(status).inc(len(job.ids))
+        if len(job.ids) > 1:
+            BATCH_REQUESTS.labels("duplicate").inc(len(job.ids) - 1)
+        return results
+
+    async def run(
+        self,
+        requests: list[BatchChatRequest],
+        concurrency: Optional[int] = None,
+        skip_ids: Iterable[str] = (),
+    ) -> AsyncGenerator[BatchResult, None]:
+        """
+        Run a batch, yielding each request's result as it finishes.
+
+        Args:
+            requests: The batch
+            concurrency: Generations to run at once (default BATCH_CONCURRENCY)
+            skip_ids: Ids already completed by an earlier, interrupted run
+
+        Yields:
+            One result per request not skipped; duplicates share their
+            original's generation and are yielded with it
+
+        Raises:
+            ValueError: If two requests share an id
+        """
+        ids = self.request_ids(requests)
+        jobs = self._plan(requests, ids, skip_ids)
+        self.batches += 1
+        logger.info(
+            "Batch started",
+            extra={"requests": len(requests), "jobs": len(jobs), "skipped": len(requests) - sum(len(j.ids) for j in jobs)}
+        )
+
+        pending = iter(jobs)
+        running: set[asyncio.Task] = set()
+        limit = concurrency or self.concurrency
+        try:
+            while True:
+                for job in pending:
+                    running.add(asyncio.ensure_future(self._run_job(job)))
+                    if len(running) >= limit:
+                        break
+                if not running:
+                    return
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in task.result():
+                        yield result
+        finally:
+            # Closed early (client gone): stop the generations still running
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def run_file(self, input_path: str, output_path: str, concurrency: Optional[int] = None) -> dict:
+        """
+        Job mode: run a JSONL file of chat requests, appending results as JSONL.
+
+        Results are flushed as they finish, so an interrupted job leaves a
+        valid partial output. Running again with the same files resumes it:
+        requests with an `ok` result are skipped, failed ones are retried and
+        their new result appended.
+
+        Args:
+            input_path: One BatchChatRequest JSON object per line
+            output_path: Results file, created or appended to
+            concurrency: Generations to run at once (default BATCH_CONCURRENCY)
+
+        Returns:
+            Counts of the requests run, failed and skipped
+
+        Raises:
+            ValueError: If an input line is not a valid request
+        """
+        # File I/O runs in a thread: the event loop is busy streaming generations
+        requests = await asyncio.to_thread(self._read_requests, input_path)
+        output = Path(output_path)
+        done, needs_newline = await asyncio.to_thread(self._read_results, output)
+
+        counts = {"ok": 0, "error": 0, "skipped": sum(1 for request in requests if request.id in done)}
+        f = await asyncio.to_thread(output.open, "a", encoding="utf-8")
+        try:
+            if needs_newline:
+                await asyncio.to_thread(self._append, f, "")
+            async with aclosing(self.run(requests, concurrency=concurrency, skip_ids=done)) as results:
+                async for result in results:
+                    await asyncio.to_thread(self._append, f, result.model_dump_json(exclude_none=True))
+                    counts[result.status] += 1
+        finally:
+            await asyncio.to_thread(f.close)
+        return counts
+
+    @staticmethod
+    def _read_requests(input_path: str) -> list[BatchChatRequest]:
+        requests = []
+        with open(input_path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    request = BatchChatRequest.model_validate_json(line)
+                except ValidationError as e:
+                    raise ValueError(f"{input_path}:{number}: invalid request: {e}") from None
+                if request.id is None:
+                    request.id = str(len(requests))
+                requests.append(request)
+        return requests
+
+    @staticmethod
+    def _read_results(output: Path) -> tuple[set[str], bool]:
+        """Ids with an `ok` result in an earlier run's output, and whether it needs a newline first."""
+        if not output.exists():
+            return set(), False
+        data = output.read_bytes()
+        done = set()
+        for line in data.splitlines():
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and result.get("status") == "ok":
+                done.add(result.get("id"))
+        # A run killed mid-write can leave a truncated last line
+        return done, bool(data) and not data.endswith(b"\n")
+
+    @staticmethod
+    def _append(f, line: str):
+        f.write(line + "\n")
+        f.flush()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "completed": self.completed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+        }
+
+
+# Global batch runner instance
+batch_runner = BatchRunner()
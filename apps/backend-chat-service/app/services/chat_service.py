@@ -1,32 +1,119 @@
-from typing import AsyncGenerator
-from app.core.llm import gemini_llm
-from app.core.ollama import ollama_llm
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from functools import partial
+from typing import Any, AsyncGenerator, Optional
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import (
+    CANCELLED_STREAMS,
+    CANCELLED_TOKENS_SAVED,
+    CONTEXT_TOKENS_SAVED,
+    STREAMS_TOTAL,
+    TOKENS_PER_SECOND,
+    TOKENS_TOTAL,
+    TOOL_SELECTIONS,
+    TOOL_TOKENS_SAVED,
+    TTFT_SECONDS,
+    observe_stage,
+)
+from app.core.tracing import request_started, set_session
+from app.core.tool_catalog import tool_catalog
+from app.services.admission import Ticket, admission
+from app.services.context_manager import context_manager
+from app.services.conversation_store import conversation_store
 from app.services.mcp_service import mcp_service
-from app.models.chat import Message
+from app.services.response_cache import response_cache
+from app.services.router import Backend, model_router
+from app.services.tool_selector import tool_selector
+from app.models.chat import Message, ToolCall
+
+logger = get_logger(__name__)
 
 
 class ChatService:
     """Service for orchestrating chat with MCP tools and LLM."""
     
+    def __init__(self):
+        # (provider, model) -> smoothed chunks per completed response, to
+        # estimate what a cancelled generation would have produced
+        self._typical_tokens: dict[tuple[str, str], float] = {}
+    
     def _get_llm_provider(self, model: str):
-        """Determine which LLM provider to use based on model name."""
-        if model.startswith("ollama:"):
-            return ollama_llm, model.replace("ollama:", "")
-        else:
-            # Default to Gemini
-            return gemini_llm, model
+        """Provider and provider-side model name of the model's preferred backend."""
+        backend = model_router.primary(model)
+        return backend.provider, backend.model
+    
+    @staticmethod
+    def _tools_for(backend: Backend, tools):
+        """
+        Tools to offer a backend. Ollama tool calling is opt-in
+        (OLLAMA_TOOLS_ENABLED); many local models don't handle tool schemas well.
+        """
+        if backend.provider_name == "ollama" and not settings.ollama_tools_enabled:
+            return None
+        return tools or None
+    
+    @staticmethod
+    def _format_tool_result(content: Any) -> str:
+        """Flatten MCP tool result content into text for the model."""
+        if isinstance(content, list):
+            parts = []
+            for item in content:
+                text = getattr(item, "text", None)
+                parts.append(text if text is not None else str(item))
+            return "\n".join(parts)
+        return content if isinstance(content, str) else json.dumps(content, default=str)
+    
+    async def _run_tool(self, call: ToolCall) -> dict[str, Any]:
+        """Execute one tool call with a timeout and return a tool result message."""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                mcp_service.execute_tool(call.name, call.arguments),
+                timeout=settings.tool_call_timeout
+            )
+            content = self._format_tool_result(result)
+        except asyncio.TimeoutError:
+            content = f"Error: tool {call.name} timed out after {settings.tool_call_timeout}s"
+        except Exception as e:
+            # Feed the error back so the model can recover
+            content = f"Error: {e}"
+        
+        elapsed = time.perf_counter() - started
+        logger.debug("Tool call finished", extra={"tool": call.name, "ms": round(elapsed * 1000, 1)})
+        return {"role": "tool", "name": call.name, "content": content}
     
     async def chat_stream(
         self,
         messages: list[Message],
-        model: str
+        model: str,
+        history: Optional[list[dict[str, Any]]] = None,
+        conversation_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        ticket: Optional[Ticket] = None
     ) -> AsyncGenerator[str, None]:
         """
         Process chat messages and stream response.
         
+        When RESPONSE_CACHE_ENABLED is set and the provider samples at
+        temperature 0, identical requests (same model, messages, generation
+        config and tool catalog) replay a cached response or share one
+        in-flight generation.
+        
         Args:
-            messages: List of chat messages
+            messages: List of chat messages (only the new ones when a conversation is given)
             model: Model identifier (e.g., 'gemini-2.0-flash-exp' or 'ollama:llama3.2:3b')
+            history: Stored messages that precede `messages`
+            conversation_id: Server-side conversation; the new messages and the
+                reply are appended to it once the stream completes
+            session_id: Client-chosen conversation key (when the client keeps
+                the history), used like conversation_id for sticky routing
+            ticket: Admission slot the caller holds for the model's primary
+                backend. The generation takes it over (a shared response-cache
+                generation can outlive this request); if this request only
+                replays or joins one, the slot is returned at its first chunk
         
         Yields:
             Chunks of generated text
@@ -38,27 +125,300 @@ class ChatService:
         # Get available tools from MCP
         tools = mcp_service.get_tools()
         
+        # Lets providers keep the conversation on one model instance (prompt cache)
+        if conversation_id is not None:
+            set_session(f"conversation:{conversation_id}")
+        elif session_id:
+            set_session(f"session:{session_id}")
+        
         # Convert messages to dict format
-        message_dicts = [
+        new_messages = [
             {"role": msg.role, "content": msg.content}
             for msg in messages
         ]
+        message_dicts = [*history, *new_messages] if history else new_messages
+        
+        # Metrics and the cache key use the preferred backend; the router may
+        # still fail over (or hedge) to another one of the model's backends
+        primary = model_router.primary(model)
+        llm_provider, actual_model = primary.provider, primary.model
+        if self._tools_for(primary, tools):
+            tools = self._select_tools(tools, message_dicts, llm_provider.name, actual_model)
+        use_tools = self._tools_for(primary, tools)
+        logger.info("Chat request", extra={"model": model, "tools": len(use_tools) if use_tools else 0})
+        
+        generate = partial(self._generate, model, message_dicts, tools, conversation_id, ticket)
+        
+        if response_cache.enabled and response_cache.is_deterministic(llm_provider.generation_config):
+            key = response_cache.make_key(
+                model,
+                message_dicts,
+                llm_provider.generation_config,
+                tool_catalog.version if use_tools else None
+            )
+            source = response_cache.stream(key, generate)
+        else:
+            source = generate()
+        
+        # aclosing() everywhere a stream is consumed: when the client goes away
+        # the close has to reach the provider now, not whenever GC runs
+        reply = [] if conversation_id is not None else None
+        async with aclosing(self._instrument(source, llm_provider.name, actual_model)) as stream:
+            async for chunk in stream:
+                if ticket is not None:
+                    # No-op if our own generation took the slot over
+                    ticket.release()
+                if reply is not None:
+                    reply.append(chunk)
+                yield chunk
+        
+        if reply is None:
+            return
+        # Only completed exchanges are stored; a failed or abandoned turn can simply be resent
+        await conversation_store.append(
+            conversation_id,
+            [*new_messages, {"role": "assistant", "content": "".join(reply)}]
+        )
+    
+    @staticmethod
+    def _select_tools(tools, message_dicts: list[dict[str, Any]], provider: str, model: str):
+        """Narrow a large tool catalog to the tools relevant to the request (see ToolSelector)."""
+        started = time.perf_counter()
+        tools, report = tool_selector.select(tools, message_dicts)
+        observe_stage("tool_select", time.perf_counter() - started, provider, model, report)
+        TOOL_SELECTIONS.labels(provider, model, report["outcome"]).inc()
+        if report["tokens_saved"]:
+            TOOL_TOKENS_SAVED.labels(provider, model).inc(report["tokens_saved"])
+        return tools
+    
+    async def _instrument(
+        self,
+        source: AsyncGenerator[str, None],
+        provider: str,
+        model: str
+    ) -> AsyncGenerator[str, None]:
+        """
+        Record time-to-first-token, tokens/sec and stream completion.
+        
+        Only a counter and a timestamp check run per chunk; metrics are
+        recorded once the stream finishes. A stream closed early by the
+        client counts as cancelled, with the chunks it would typically have
+        gone on to generate recorded as saved.
+        """
+        started = request_started() or time.perf_counter()
+        generation_started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        status = "error"
+        try:
+            async with aclosing(source):
+                async for chunk in source:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        TTFT_SECONDS.labels(provider, model).observe(first_token_at - started)
+                    tokens += 1
+                    yield chunk
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            finished = time.perf_counter()
+            key = (provider, model)
+            if status == "ok":
+                typical = self._typical_tokens.get(key)
+                self._typical_tokens[key] = tokens if typical is None else 0.9 * typical + 0.1 * tokens
+            elif status == "cancelled":
+                CANCELLED_STREAMS.labels(provider, model).inc()
+                saved = self._typical_tokens.get(key, 0.0) - tokens
+                if saved > 0:
+                    CANCELLED_TOKENS_SAVED.labels(provider, model).inc(saved)
+            TOKENS_TOTAL.labels(provider, model).inc(tokens)
+            STREAMS_TOTAL.labels(provider, model, status).inc()
+            if tokens > 1 and finished > first_token_at:
+                TOKENS_PER_SECOND.labels(provider, model).observe((tokens - 1) / (finished - first_token_at))
+            observe_stage(
+                "stream",
+                finished - generation_started,
+                provider,
+                model,
+                {"tokens": tokens, "status": status}
+            )
+    
+    async def _summarize(self, backend: Backend, prompt: str) -> str:
+        """
+        Collect a tool-free completion for a context summary prompt.
+        
+        Runs while the backend's first step is being opened, under the same
+        admission slot, and is health-tracked like any other model call.
+        """
+        parts = []
+        stream = model_router.track(backend, backend.provider.generate_stream(
+            messages=[{"role": "user", "content": prompt}],
+            model_name=backend.model,
+            tools=None
+        ))
+        async with aclosing(stream):
+            async for chunk in stream:
+                if isinstance(chunk, str):
+                    parts.append(chunk)
+        return "".join(parts)
+    
+    async def _compact(
+        self,
+        backend: Backend,
+        message_dicts: list[dict[str, Any]],
+        use_tools,
+        conversation_id: Optional[int] = None
+    ) -> list[dict[str, Any]]:
+        """Fit the conversation into the backend's token budget and record the savings."""
+        llm_provider, model, actual_model = backend.provider, backend.model_id, backend.model
+        started = time.perf_counter()
+        message_dicts, report = await context_manager.compact(
+            message_dicts,
+            model,
+            summarize=partial(self._summarize, backend),
+            tools=use_tools,
+            conversation_id=conversation_id
+        )
+        observe_stage(
+            "context",
+            time.perf_counter() - started,
+            llm_provider.name,
+            actual_model,
+            {
+                "strategy": report["strategy"],
+                "tokens_before": report["tokens_before"],
+                "tokens_after": report["tokens_after"],
+                "summary": report["summary"],
+            }
+        )
+        if report["tokens_saved"]:
+            CONTEXT_TOKENS_SAVED.labels(llm_provider.name, actual_model, report["strategy"]).inc(report["tokens_saved"])
+            logger.info("Compacted conversation", extra={"model": model, **report})
+        return message_dicts
+    
+    async def _generate(
+        self,
+        model: str,
+        message_dicts: list[dict[str, Any]],
+        tools,
+        conversation_id: Optional[int] = None,
+        ticket: Optional[Ticket] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Run the agentic loop on one of the model's backends.
+        
+        The first model call goes through the router, which picks the
+        backend and fails over (or hedges) until one produces output; later
+        tool-loop steps stay on that backend. Per backend, the conversation
+        is first fitted into its token budget (see ContextManager). When the
+        model requests tool calls, all calls from that turn are executed
+        concurrently through MCP, their results are appended to the
+        conversation, and the model is called again, up to MAX_TOOL_STEPS turns.
+        
+        `ticket` covers the primary backend; any other backend the router
+        tries first waits for a slot under its own provider and model limits.
+        The generation owns its slots and returns them when it ends.
+        """
+        # Taken over from the request: a shared generation outlives the
+        # request that started it and must stay counted until it ends
+        ticket = ticket.transfer() if ticket is not None else None
+        prepared: dict[Backend, tuple[list[dict[str, Any]], Any]] = {}
+        tickets: dict[Backend, Ticket] = {}
+        
+        async def open_first_step(backend: Backend):
+            if ticket is not None and not ticket.covers(backend.provider_name, backend.model_id):
+                tickets[backend] = await admission.acquire(
+                    backend.provider_name,
+                    backend.model_id,
+                    client=ticket.client,
+                    priority=ticket.priority
+                )
+            use_tools = self._tools_for(backend, tools)
+            messages = await self._compact(backend, message_dicts, use_tools, conversation_id)
+            prepared[backend] = (messages, use_tools)
+            return backend.provider.generate_stream(
+                messages=messages,
+                model_name=backend.model,
+                tools=use_tools if settings.max_tool_steps > 1 else None
+            )
         
-        # Get the appropriate LLM provider
-        llm_provider, actual_model = self._get_llm_provider(model)
-        
-        # TEMPORARY: Disable tools for Ollama until tool calling is properly tested
-        # Ollama's tool calling format may be causing issues
-        use_tools = tools if not model.startswith("ollama:") else None
-        print(f"🔧 Model: {model}, Using tools: {use_tools is not None}")
-        
-        # Generate streaming response with tools
-        async for chunk in llm_provider.generate_stream(
-            messages=message_dicts,
-            model_name=actual_model,
-            tools=use_tools
-        ):
-            yield chunk
+        backend = None
+        try:
+            for step in range(1, settings.max_tool_steps + 1):
+                step_started = time.perf_counter()
+                
+                text_parts = []
+                tool_calls: list[ToolCall] = []
+                
+                if backend is None:
+                    backend, stream = await model_router.open(model, open_first_step)
+                    message_dicts, use_tools = prepared[backend]
+                    # Keep only the slot of the backend that answered
+                    for other in [other for other in tickets if other != backend]:
+                        tickets.pop(other).release()
+                    if ticket is not None and backend in tickets:
+                        ticket.release()
+                    llm_provider, actual_model = backend.provider, backend.model
+                else:
+                    # On the last step withhold tools so the model has to answer
+                    stream = model_router.track(backend, llm_provider.generate_stream(
+                        messages=message_dicts,
+                        model_name=actual_model,
+                        tools=use_tools if step < settings.max_tool_steps else None
+                    ))
+                
+                # Generate streaming response with tools
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if isinstance(chunk, ToolCall):
+                            tool_calls.append(chunk)
+                        else:
+                            text_parts.append(chunk)
+                            yield chunk
+                
+                model_elapsed = time.perf_counter() - step_started
+                observe_stage("model_step", model_elapsed, llm_provider.name, actual_model, {"step": step})
+                if not tool_calls:
+                    logger.debug(
+                        "Agent step done",
+                        extra={"step": step, "model_ms": round(model_elapsed * 1000, 1)}
+                    )
+                    return
+                
+                # Run independent calls from this turn concurrently
+                tools_started = time.perf_counter()
+                results = await asyncio.gather(*(self._run_tool(call) for call in tool_calls))
+                # The answer now depends on tool results, which may change
+                response_cache.skip_store()
+                tools_elapsed = time.perf_counter() - tools_started
+                observe_stage(
+                    "tool_step",
+                    tools_elapsed,
+                    llm_provider.name,
+                    actual_model,
+                    {"step": step, "tool_calls": len(tool_calls)}
+                )
+                logger.debug(
+                    "Agent step ran tools",
+                    extra={
+                        "step": step,
+                        "model_ms": round(model_elapsed * 1000, 1),
+                        "tool_calls": len(tool_calls),
+                        "tools_ms": round(tools_elapsed * 1000, 1),
+                    }
+                )
+                
+                message_dicts = message_dicts + [
+                    {"role": "assistant", "content": "".join(text_parts), "tool_calls": tool_calls},
+                    *results,
+                ]
+        finally:
+            if ticket is not None:
+                ticket.release()
+            for extra in tickets.values():
+                extra.release()
 
 
 # Global chat service instance
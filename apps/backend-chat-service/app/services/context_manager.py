@@ -0,0 +1,320 @@
+import hashlib
+import json
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+STRATEGIES = ("none", "sliding_window", "drop_oldest", "summarize_prefix")
+
+# Per-message framing overhead (role markers, separators) in tokens
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for your own future reference. Keep facts, "
+    "names, numbers, decisions and open questions; drop pleasantries. "
+    "Answer with the summary only, in at most {max_words} words.\n\n{transcript}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English and code).
+
+    `len()` is O(1) on str, so estimating a whole conversation costs one
+    addition per message; it is deliberately conservative rather than exact.
+    """
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: dict[str, Any]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def tool_tokens(tool: dict[str, Any]) -> int:
+    """Estimated tokens of one tool declaration (name, description, input schema)."""
+    return (
+        estimate_tokens(tool["name"])
+        + estimate_tokens(tool.get("description") or "")
+        + estimate_tokens(json.dumps(tool.get("input_schema") or {}, separators=(",", ":")))
+    )
+
+
+class ContextManager:
+    """
+    Keeps the conversation sent to a provider within a per-model token budget.
+
+    Runs once per request before the first provider call. Strategies:
+
+    - ``drop_oldest``: drop the oldest turns until the rest fits.
+    - ``sliding_window``: keep the last CONTEXT_WINDOW_MESSAGES messages, then
+      drop older ones if that still does not fit.
+    - ``summarize_prefix``: replace the oldest turns with a model-written
+      summary. Summaries are cached per conversation and extended
+      incrementally, so a growing chat re-summarizes only occasionally.
+    - ``none``: send everything.
+
+    The most recent message is always kept, and the kept tail starts at a
+    user turn so providers that require user-first histories accept it.
+    """
+
+    def __init__(
+        self,
+        strategy: Optional[str] = None,
+        default_budget: Optional[int] = None,
+        budgets: Optional[dict[str, int]] = None,
+        reserve_tokens: Optional[int] = None,
+        window_messages: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+        summary_cache_size: Optional[int] = None,
+    ):
+        self.strategy = settings.context_strategy if strategy is None else strategy
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy {self.strategy!r}; expected one of {STRATEGIES}")
+        self.default_budget = settings.context_default_budget if default_budget is None else default_budget
+        self.budgets = settings.context_budget_map if budgets is None else budgets
+        self.reserve_tokens = settings.context_reserve_tokens if reserve_tokens is None else reserve_tokens
+        self.window_messages = settings.context_window_messages if window_messages is None else window_messages
+        self.summary_max_tokens = (
+            settings.context_summary_max_tokens if summary_max_tokens is None else summary_max_tokens
+        )
+        self.summary_cache_size = (
+            settings.context_summary_cache_size if summary_cache_size is None else summary_cache_size
+        )
+
+        # conversation key -> (messages covered, digest of covered messages, summary)
+        self._summaries: OrderedDict[str, tuple[int, str, str]] = OrderedDict()
+        # tool name -> (tool, estimate); requests send varying subsets of the
+        # catalog, so estimates are kept per tool (recomputed if the tool changes)
+        self._tool_tokens: dict[str, tuple[dict[str, Any], int]] = {}
+
+        # Counters
+        self.requests_compacted = 0
+        self.tokens_saved = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+        self.summary_failures = 0
+
+    def budget_for(self, model: str) -> int:
+        """Token budget for a model id (e.g. 'gemini-2.0-flash-exp' or 'ollama:llama3.2:3b')."""
+        for pattern, budget in self.budgets.items():
+            if fnmatchcase(model, pattern):
+                return budget
+        return self.default_budget
+
+    def tools_tokens(self, tools) -> int:
+        """Estimated tokens taken by tool declarations, memoized per tool."""
+        total = 0
+        for tool in tools or ():
+            cached = self._tool_tokens.get(tool["name"])
+            if cached is None or cached[0] is not tool:
+                cached = self._tool_tokens[tool["name"]] = (tool, tool_tokens(tool))
+            total += cached[1]
+        return total
+
+    @staticmethod
+    def _digest(messages: list[dict[str, Any]]) -> str:
+        hasher = hashlib.sha256()
+        for msg in messages:
+            hasher.update(msg["role"].encode())
+            hasher.update(b"\0")
+            hasher.update(msg["content"].encode())
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def conversation_key(model: str, messages: list[dict[str, Any]], conversation_id: Optional[int] = None) -> str:
+        """Identify a conversation by model and its stored id, or else its opening message."""
+        if conversation_id is not None:
+            return f"{model}\0#{conversation_id}"
+        first = messages[0] if messages else {"role": "", "content": ""}
+        return hashlib.sha256(f"{model}\0{first['role']}\0{first['content']}".encode()).hexdigest()
+
+    @staticmethod
+    def _snap_to_user(body: list[dict[str, Any]], cut: int) -> int:
+        """Move a cut forward to the next user turn, never past the last message."""
+        last = len(body) - 1
+        while cut < last and body[cut]["role"] != "user":
+            cut += 1
+        return min(cut, last)
+
+    @staticmethod
+    def _fit_cut(sizes: list[int], budget: int, start: int = 0) -> int:
+        """Smallest cut >= start such that sizes[cut:] fits the budget (keeps at least one)."""
+        total = sum(sizes[start:])
+        cut = start
+        while total > budget and cut < len(sizes) - 1:
+            total -= sizes[cut]
+            cut += 1
+        return cut
+
+    async def compact(
+        self,
+        messages: list[dict[str, Any]],
+        model: str,
+        summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+        tools=None,
+        conversation_id: Optional[int] = None,
+    ) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+        """
+        Fit a conversation into the model's budget.
+
+        Args:
+            messages: Conversation as role/content dicts, oldest first
+            model: Model identifier used to look up the budget
+            summarize: Async callable turning a prompt into summary text
+                (required for summarize_prefix; falls back to drop_oldest without it)
+            tools: Tool declarations that will be sent alongside, counted against the budget
+            conversation_id: Server-side conversation id, used as the summary cache key
+
+        Returns:
+            The messages to send and a report with tokens before/after/saved
+        """
+        # System messages at the head are instructions, not history: never compacted
+        head_len = 0
+        while head_len < len(messages) and messages[head_len]["role"] == "system":
+            head_len += 1
+        head, body = messages[:head_len], messages[head_len:]
+
+        sizes = [message_tokens(msg) for msg in body]
+        head_tokens = sum(message_tokens(msg) for msg in head)
+        tokens_before = head_tokens + sum(sizes)
+        budget = max(
+            self.budget_for(model) - self.reserve_tokens - self.tools_tokens(tools) - head_tokens,
+            0,
+        )
+        report = {
+            "strategy": self.strategy,
+            "budget": budget,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_before,
+            "tokens_saved": 0,
+            "dropped_messages": 0,
+            "summary": None,
+        }
+        if self.strategy == "none" or len(body) < 2:
+            return messages, report
+
+        strategy = self.strategy
+        if strategy == "summarize_prefix" and summarize is None:
+            strategy = "drop_oldest"
+
+        start = 0
+        if strategy == "sliding_window" and self.window_messages > 0:
+            start = max(len(body) - self.window_messages, 0)
+
+        if strategy == "summarize_prefix" and tokens_before - head_tokens > budget:
+            key = self.conversation_key(model, body, conversation_id)
+            compacted = await self._summarize_prefix(body, sizes, budget, key, model, summarize, report)
+            if compacted is not None:
+                return self._finish(head + compacted, head_tokens, report)
+            # Summarizing failed: still enforce the budget
+            strategy = "drop_oldest"
+
+        cut = self._snap_to_user(body, self._fit_cut(sizes, budget, start))
+        if cut == 0:
+            return messages, report
+        report["dropped_messages"] = cut
+        return self._finish(head + body[cut:], head_tokens, report)
+
+    def _finish(self, messages: list[dict[str, Any]], head_tokens: int, report: dict) -> tuple[list, dict]:
+        report["tokens_after"] = sum(message_tokens(msg) for msg in messages)
+        report["tokens_saved"] = max(report["tokens_before"] - report["tokens_after"], 0)
+        if report["tokens_saved"]:
+            self.requests_compacted += 1
+            self.tokens_saved += report["tokens_saved"]
+        return messages, report
+
+    async def _summarize_prefix(
+        self,
+        body: list[dict[str, Any]],
+        sizes: list[int],
+        budget: int,
+        key: str,
+        model: str,
+        summarize: Callable[[str], Awaitable[str]],
+        report: dict,
+    ) -> Optional[list[dict[str, Any]]]:
+        """Replace the oldest turns with a (cached, incrementally extended) summary."""
+        keep_budget = max(budget - self.summary_max_tokens - MESSAGE_OVERHEAD, 0)
+
+        cached = self._summaries.get(key)
+        covered, summary = 0, ""
+        if cached is not None:
+            cached_covered, digest, cached_summary = cached
+            if cached_covered < len(body) and self._digest(body[:cached_covered]) == digest:
+                covered, summary = cached_covered, cached_summary
+                self._summaries.move_to_end(key)
+                # Reuse as-is while the un-summarized tail still fits
+                if sum(sizes[covered:]) <= keep_budget:
+                    self.summary_hits += 1
+                    report["summary"] = "hit"
+                    report["dropped_messages"] = covered
+                    return self._with_summary(summary, body[covered:])
+
+        # Summarize further than strictly needed (keep half the room for the tail)
+        # so the next several turns can reuse this summary without another call
+        cut = self._snap_to_user(body, self._fit_cut(sizes, keep_budget // 2, covered))
+        if cut <= covered:
+            return None
+
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in body[covered:cut])
+        if summary:
+            transcript = f"{SUMMARY_PREFIX}{summary}\n\n{transcript}"
+        prompt = SUMMARY_PROMPT.format(
+            max_words=max(self.summary_max_tokens * 3 // 4, 16),
+            transcript=transcript,
+        )
+
+        self.summary_misses += 1
+        try:
+            new_summary = (await summarize(prompt)).strip()
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning("Conversation summary failed", extra={"model": model, "error": str(e)})
+            return None
+        if not new_summary:
+            self.summary_failures += 1
+            return None
+        # Hold the summary to its share of the budget even if the model ran long
+        new_summary = new_summary[: self.summary_max_tokens * 4]
+
+        self._summaries[key] = (cut, self._digest(body[:cut]), new_summary)
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.summary_cache_size:
+            self._summaries.popitem(last=False)
+
+        report["summary"] = "computed"
+        report["dropped_messages"] = cut
+        return self._with_summary(new_summary, body[cut:])
+
+    @staticmethod
+    def _with_summary(summary: str, tail: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        text = f"{SUMMARY_PREFIX}{summary}"
+        if tail and tail[0]["role"] == "user":
+            # Fold into the first user turn to keep user/assistant alternation
+            first = {**tail[0], "content": f"{text}\n\n{tail[0]['content']}"}
+            return [first, *tail[1:]]
+        return [{"role": "user", "content": text}, *tail]
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "requests_compacted": self.requests_compacted,
+            "tokens_saved": self.tokens_saved,
+            "summaries": len(self._summaries),
+            "summary_hits": self.summary_hits,
+            "summary_misses": self.summary_misses,
+            "summary_failures": self.summary_failures,
+        }
+
+
+# Global context manager instance
+context_manager = ContextManager()
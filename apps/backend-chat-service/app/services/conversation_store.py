@@ -0,0 +1,386 @@
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConversationNotFoundError(LookupError):
+    """Raised when a conversation id does not exist in the store."""
+
+
+class MemoryConversationBackend:
+    """Process-local backend (the default; also handy for tests and benchmarks)."""
+
+    name = "memory"
+    # Visible to other worker processes
+    shared = False
+
+    def __init__(self):
+        self._conversations: dict[int, list[dict[str, Any]]] = {}
+        self._next_id = 1
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def create(self, title: Optional[str] = None) -> int:
+        conversation_id = self._next_id
+        self._next_id += 1
+        self._conversations[conversation_id] = []
+        return conversation_id
+
+    async def load(self, conversation_id: int) -> list[dict[str, Any]]:
+        try:
+            return list(self._conversations[conversation_id])
+        except KeyError:
+            raise ConversationNotFoundError(conversation_id) from None
+
+    async def load_since(self, conversation_id: int, offset: int) -> list[dict[str, Any]]:
+        return (await self.load(conversation_id))[offset:]
+
+    async def append(self, conversation_id: int, messages: list[dict[str, Any]]):
+        if conversation_id not in self._conversations:
+            raise ConversationNotFoundError(conversation_id)
+        self._conversations[conversation_id].extend(messages)
+
+
+class SQLiteConversationBackend:
+    """SQLite file backend; queries run on a worker thread so the event loop never blocks."""
+
+    name = "sqlite"
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection, one writer at a time
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def start(self):
+        if self._conn is None:
+            self._conn = await asyncio.to_thread(self._connect)
+
+    async def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.to_thread(conn.close)
+
+    def _create(self, title: Optional[str]) -> int:
+        return self._conn.execute("INSERT INTO conversations (title) VALUES (?)", (title,)).lastrowid
+
+    def _load(self, conversation_id: int) -> Optional[list[dict[str, Any]]]:
+        rows = self._conn.execute(
+            """
+            SELECT m.role, m.content FROM conversations c
+            LEFT JOIN messages m ON m.conversation_id = c.id
+            WHERE c.id = ? ORDER BY m.id
+            """,
+            (conversation_id,),
+        ).fetchall()
+        if not rows:
+            return None
+        return [{"role": role, "content": content} for role, content in rows if role is not None]
+
+    def _load_since(self, conversation_id: int, offset: int) -> list[dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY id LIMIT -1 OFFSET ?",
+            (conversation_id, offset),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def _append(self, conversation_id: int, messages: list[dict[str, Any]]) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            updated = conn.execute(
+                "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (conversation_id,),
+            ).rowcount
+            if updated:
+                conn.executemany(
+                    "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                    [(conversation_id, msg["role"], msg["content"]) for msg in messages],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return bool(updated)
+
+    async def create(self, title: Optional[str] = None) -> int:
+        return await self._run(self._create, title)
+
+    async def load(self, conversation_id: int) -> list[dict[str, Any]]:
+        messages = await self._run(self._load, conversation_id)
+        if messages is None:
+            raise ConversationNotFoundError(conversation_id)
+        return messages
+
+    async def load_since(self, conversation_id: int, offset: int) -> list[dict[str, Any]]:
+        return await self._run(self._load_since, conversation_id, offset)
+
+    async def append(self, conversation_id: int, messages: list[dict[str, Any]]):
+        if not await self._run(self._append, conversation_id, messages):
+            raise ConversationNotFoundError(conversation_id)
+
+
+class PostgresConversationBackend:
+    """
+    Postgres backend on an asyncpg connection pool.
+
+    Uses the `conversations` and `messages` tables from init.sql; the
+    conversation columns are added idempotently on start so databases created
+    before they existed keep working.
+    """
+
+    name = "postgres"
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(200),
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id SERIAL PRIMARY KEY,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        ALTER TABLE messages ADD COLUMN IF NOT EXISTS
+            conversation_id INTEGER REFERENCES conversations(id) ON DELETE CASCADE;
+        ALTER TABLE messages ADD COLUMN IF NOT EXISTS role VARCHAR(20) NOT NULL DEFAULT 'user';
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id);
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+
+    async def start(self):
+        if self._pool is not None:
+            return
+        try:
+            import asyncpg
+        except ImportError:
+            raise RuntimeError(
+                "CONVERSATION_STORE=postgres needs the asyncpg package (pip install asyncpg)"
+            ) from None
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        async with self._pool.acquire() as conn:
+            await conn.execute(self.SCHEMA)
+
+    async def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    async def create(self, title: Optional[str] = None) -> int:
+        return await self._pool.fetchval(
+            "INSERT INTO conversations (title) VALUES ($1) RETURNING id", title
+        )
+
+    async def load(self, conversation_id: int) -> list[dict[str, Any]]:
+        rows = await self._pool.fetch(
+            """
+            SELECT m.role, m.content FROM conversations c
+            LEFT JOIN messages m ON m.conversation_id = c.id
+            WHERE c.id = $1 ORDER BY m.id
+            """,
+            conversation_id,
+        )
+        if not rows:
+            raise ConversationNotFoundError(conversation_id)
+        return [{"role": row["role"], "content": row["content"]} for row in rows if row["role"] is not None]
+
+    async def load_since(self, conversation_id: int, offset: int) -> list[dict[str, Any]]:
+        rows = await self._pool.fetch(
+            "SELECT role, content FROM messages WHERE conversation_id = $1 ORDER BY id OFFSET $2",
+            conversation_id,
+            offset,
+        )
+        return [{"role": row["role"], "content": row["content"]} for row in rows]
+
+    async def append(self, conversation_id: int, messages: list[dict[str, Any]]):
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                updated = await conn.execute(
+                    "UPDATE conversations SET updated_at = NOW() WHERE id = $1", conversation_id
+                )
+                if updated == "UPDATE 0":
+                    raise ConversationNotFoundError(conversation_id)
+                await conn.executemany(
+                    "INSERT INTO messages (conversation_id, role, content) VALUES ($1, $2, $3)",
+                    [(conversation_id, msg["role"], msg["content"]) for msg in messages],
+                )
+
+
+def _build_backend(kind: str):
+    if kind == "memory":
+        return MemoryConversationBackend()
+    if kind == "sqlite":
+        return SQLiteConversationBackend(settings.conversation_store_path)
+    if kind == "postgres":
+        if not settings.database_url:
+            raise RuntimeError("CONVERSATION_STORE=postgres needs DATABASE_URL")
+        return PostgresConversationBackend(
+            settings.database_url,
+            min_size=settings.conversation_db_pool_min,
+            max_size=settings.conversation_db_pool_max,
+        )
+    raise ValueError(f"Unknown conversation store {kind!r}; expected memory, sqlite or postgres")
+
+
+class ConversationStore:
+    """
+    Server-side conversation history with a write-through cache.
+
+    Clients send a conversation id plus only the new message(s); the history
+    is loaded here instead of being resent and re-validated on every turn.
+    Hot conversations are kept in an in-memory LRU; appends go to the backend
+    first and then to the cache, so the cache never holds unsaved messages.
+
+    With several worker processes (WORKERS > 1) another worker may have
+    appended to a cached conversation, so a cache hit also fetches any
+    messages stored past the cached ones (one indexed query, usually empty)
+    and appends leave the cache to that catch-up instead of extending it.
+    """
+
+    def __init__(self, backend=None, cache_size: Optional[int] = None, revalidate: Optional[bool] = None):
+        self._backend = backend
+        self.cache_size = settings.conversation_cache_size if cache_size is None else cache_size
+        self._revalidate = revalidate
+
+        # conversation id -> messages, most recently used last
+        self._cache: OrderedDict[int, list[dict[str, Any]]] = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.catch_ups = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _build_backend(settings.conversation_store)
+        return self._backend
+
+    @property
+    def revalidate(self) -> bool:
+        if self._revalidate is None:
+            self._revalidate = settings.workers > 1 and self.backend.shared
+        return self._revalidate
+
+    async def start(self):
+        await self.backend.start()
+        if settings.workers > 1 and not self.backend.shared:
+            logger.warning(
+                "Conversation store is per process; use CONVERSATION_STORE=sqlite or postgres with several workers",
+                extra={"backend": self.backend.name, "workers": settings.workers}
+            )
+        logger.info("Conversation store ready", extra={"backend": self.backend.name})
+
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
+        self._cache.clear()
+
+    def _remember(self, conversation_id: int, messages: list[dict[str, Any]]):
+        self._cache[conversation_id] = messages
+        self._cache.move_to_end(conversation_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def create(self, title: Optional[str] = None) -> int:
+        conversation_id = await self.backend.create(title)
+        self._remember(conversation_id, [])
+        return conversation_id
+
+    async def history(self, conversation_id: int) -> list[dict[str, Any]]:
+        """
+        Messages of a conversation, oldest first.
+
+        The returned list is shared with the cache: treat it as read-only.
+
+        Raises:
+            ConversationNotFoundError: If the conversation does not exist
+        """
+        messages = self._cache.get(conversation_id)
+        if messages is not None:
+            self._cache.move_to_end(conversation_id)
+            self.hits += 1
+            if self.revalidate:
+                newer = await self.backend.load_since(conversation_id, len(messages))
+                if newer:
+                    self.catch_ups += 1
+                    messages = messages + newer
+                    self._remember(conversation_id, messages)
+            return messages
+        self.misses += 1
+        messages = await self.backend.load(conversation_id)
+        self._remember(conversation_id, messages)
+        return messages
+
+    async def append(self, conversation_id: int, messages: list[dict[str, Any]]):
+        """Persist messages, then update the cached history."""
+        messages = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+        await self.backend.append(conversation_id, messages)
+        self.appends += 1
+        cached = self._cache.get(conversation_id)
+        # Shared store: other workers may have appended too, the next read catches up in order
+        if cached is not None and not self.revalidate:
+            # Replace rather than extend: readers may still hold the old list
+            self._remember(conversation_id, cached + messages)
+
+    def stats(self) -> dict:
+        return {
+            "backend": settings.conversation_store if self._backend is None else self._backend.name,
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "appends": self.appends,
+            "catch_ups": self.catch_ups,
+        }
+
+
+# Global conversation store instance
+conversation_store = ConversationStore()
@@ -0,0 +1,423 @@
+"""
+MCP broker: one set of MCP servers shared by every worker process.
+
+The broker process runs the regular MCPService (session pools, tool cache)
+and serves it on a Unix socket. Workers use RemoteMCPService, which has the
+same interface as MCPService, so the chat pipeline does not know the
+difference. Messages are JSON lines:
+
+- worker -> broker: `{"id": 1, "op": "call", "tool": ..., "arguments": {...}}`,
+  `{"id": 1, "op": "cancel"}`
+- broker -> worker: `{"id": 1, "result": [...]}` or `{"id": 1, "error": "..."}`,
+  and `{"event": "status", "tools": [...], "states": {...}, "ready": ..., "pools": {...}}`
+  on connect, whenever tools or server states change, and every few seconds
+
+Run it standalone (e.g. next to `uvicorn --workers N`) with
+`python -m app.services.mcp_broker`; gunicorn.conf.py starts it itself.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+from mcp import types
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import TOOL_CALL_SECONDS
+from app.core.tool_catalog import tool_catalog
+
+logger = get_logger(__name__)
+
+
+# Tool results (file contents) can be large; a line must fit in the stream buffer
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# MCP tool result content, to send it over the socket and rebuild it on the other side
+_CONTENT = TypeAdapter(types.CallToolResult.model_fields["content"].annotation)
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+class MCPBrokerError(RuntimeError):
+    """A tool call failed in the broker, or the broker is unreachable."""
+
+
+class MCPBroker:
+    """Serves an MCPService to worker processes on a Unix socket."""
+
+    def __init__(self, service, socket_path: str, status_interval: float = 5.0):
+        self.service = service
+        self.socket_path = socket_path
+        self.status_interval = status_interval
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._status_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.connections = 0
+        self.calls = 0
+
+    async def start(self):
+        # A socket file left by a broker that was killed would make bind fail
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path, limit=MAX_MESSAGE_BYTES)
+        os.chmod(self.socket_path, 0o600)
+        self.service.on_change(self._broadcast_status)
+        self._status_task = asyncio.create_task(self._status_loop())
+        logger.info("MCP broker listening", extra={"socket": self.socket_path})
+
+    async def close(self):
+        if self._status_task is not None:
+            self._status_task.cancel()
+            self._status_task = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _status(self) -> dict:
+        return {
+            "event": "status",
+            "tools": list(self.service.get_tools()),
+            "states": self.service.get_server_states(),
+            "ready": self.service.ready,
+            "pools": self.service.get_pool_stats(),
+        }
+
+    def _broadcast_status(self):
+        if not self._writers:
+            return
+        message = _encode(self._status())
+        for writer in list(self._writers):
+            writer.write(message)
+
+    async def _status_loop(self):
+        # Pool counters change with every call; refresh the workers' copies now and then
+        while True:
+            await asyncio.sleep(self.status_interval)
+            self._broadcast_status()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        calls: dict[int, asyncio.Task] = {}
+        try:
+            writer.write(_encode(self._status()))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                message = json.loads(line)
+                request_id = message["id"]
+                if message["op"] == "call":
+                    self.calls += 1
+                    task = asyncio.create_task(self._call(writer, request_id, message["tool"], message.get("arguments")))
+                    calls[request_id] = task
+                    task.add_done_callback(lambda _, request_id=request_id: calls.pop(request_id, None))
+                elif message["op"] == "cancel":
+                    task = calls.get(request_id)
+                    if task is not None:
+                        task.cancel()
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning("MCP broker connection dropped", extra={"error": str(e) or type(e).__name__})
+        finally:
+            # The worker went away: nobody is waiting for its calls any more
+            for task in calls.values():
+                task.cancel()
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _call(self, writer: asyncio.StreamWriter, request_id: int, tool: str, arguments: Optional[dict]):
+        try:
+            result = await self.service.execute_tool(tool, arguments or {})
+            response = {"id": request_id, "result": _CONTENT.dump_python(result, mode="json", by_alias=True, exclude_none=True)}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            response = {"id": request_id, "error": str(e) or type(e).__name__}
+        if writer.is_closing():
+            return
+        try:
+            writer.write(_encode(response))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class RemoteMCPService:
+    """
+    Worker-side stand-in for MCPService that runs tools in the MCP broker.
+
+    The tool list and server states are pushed by the broker. A cancelled
+    call (client disconnect, tool timeout) is cancelled in the broker too.
+    If the broker goes away, calls fail until it is back; the connection is
+    re-established in the background.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: Optional[float] = None):
+        self.socket_path = socket_path
+        self.connect_timeout = settings.mcp_broker_connect_timeout if connect_timeout is None else connect_timeout
+        self._initialized = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._status: Optional[asyncio.Future] = None
+
+        # Last status pushed by the broker
+        self._tools: tuple[dict[str, Any], ...] = ()
+        self._index: dict[str, dict[str, Any]] = {}
+        self._states: dict[str, dict[str, Any]] = {}
+        self._pools: dict[str, dict] = {}
+        self._ready = False
+
+        # Counters
+        self.reconnects = 0
+
+    async def initialize(self):
+        """
+        Connect to the broker, waiting up to MCP_BROKER_CONNECT_TIMEOUT for it to come up.
+
+        If it doesn't, the service starts without tools and keeps trying in
+        the background (requests don't each wait for the broker again).
+
+        Raises:
+            MCPBrokerError: If the broker could not be reached in time
+        """
+        if self._initialized:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._initialized:
+                return
+            try:
+                await self._connect(time.monotonic() + self.connect_timeout)
+            except (MCPBrokerError, asyncio.TimeoutError) as e:
+                self._initialized = True
+                self._reconnect_task = asyncio.create_task(self._reconnect())
+                raise MCPBrokerError(str(e) or "MCP broker did not send its status") from None
+            self._initialized = True
+            logger.info("Connected to MCP broker", extra={"socket": self.socket_path, "tools": len(self._tools)})
+
+    async def _connect(self, deadline: float):
+        delay = 0.05
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_MESSAGE_BYTES)
+                break
+            except OSError as e:
+                if time.monotonic() + delay > deadline:
+                    raise MCPBrokerError(f"MCP broker not reachable at {self.socket_path}: {e}") from None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        self._writer = writer
+        self._status = asyncio.get_running_loop().create_future()
+        self._reader_task = asyncio.create_task(self._read(reader))
+        # The broker sends its status first thing
+        try:
+            await asyncio.wait_for(asyncio.shield(self._status), max(deadline - time.monotonic(), 1.0))
+        except BaseException:
+            # Don't leave this attempt's reader and socket behind
+            reader_task, self._reader_task = self._reader_task, None
+            reader_task.cancel()
+            await asyncio.gather(reader_task, return_exceptions=True)
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            raise
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("event") == "status":
+                    self._apply_status(message)
+                    continue
+                future = self._pending.pop(message["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(MCPBrokerError(message["error"]))
+                else:
+                    future.set_result(_CONTENT.validate_python(message["result"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Connection lost or a frame we can't use (bad JSON, missing id)
+            logger.warning("MCP broker connection failed", extra={"error": str(e) or type(e).__name__})
+        finally:
+            # However the reader ends, pending calls must fail rather than hang
+            self._disconnected()
+
+    def _apply_status(self, message: dict):
+        tools = message.get("tools") or []
+        if tools != list(self._tools):
+            # Keep the same tuple while the tools are unchanged: it is the catalog's cache identity
+            self._tools = tuple(tools)
+            self._index = {tool["name"]: tool for tool in self._tools}
+            tool_catalog.update(self._tools)
+        self._states = message.get("states") or {}
+        self._pools = message.get("pools") or {}
+        self._ready = bool(message.get("ready"))
+        if self._status is not None and not self._status.done():
+            self._status.set_result(None)
+
+    def _disconnected(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(MCPBrokerError("MCP broker connection lost"))
+        self._pending.clear()
+        if self._initialized and self._reconnect_task is None:
+            logger.warning("Lost MCP broker connection; reconnecting", extra={"socket": self.socket_path})
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            while True:
+                try:
+                    await self._connect(time.monotonic() + self.connect_timeout)
+                    self.reconnects += 1
+                    logger.info("Reconnected to MCP broker", extra={"socket": self.socket_path})
+                    return
+                except (MCPBrokerError, asyncio.TimeoutError):
+                    continue
+        finally:
+            self._reconnect_task = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get_server_states(self) -> dict[str, dict[str, Any]]:
+        return self._states
+
+    def get_pool_stats(self) -> dict[str, dict]:
+        """The broker's pool counters, as of its last status (a few seconds old at most)."""
+        return self._pools
+
+    def get_tools(self) -> tuple[dict[str, Any], ...]:
+        return self._tools
+
+    async def execute_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
+        """Execute a tool in the broker."""
+        if not self._initialized:
+            await self.initialize()
+        tool = self._index.get(tool_name)
+        if tool is None:
+            raise ValueError(f"Tool {tool_name} not found in any server")
+        writer = self._writer
+        if writer is None:
+            raise MCPBrokerError("MCP broker not connected")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        started = time.perf_counter()
+        status = "error"
+        try:
+            writer.write(_encode({"id": request_id, "op": "call", "tool": tool_name, "arguments": arguments}))
+            result = await future
+            status = "ok"
+            return result
+        except asyncio.CancelledError:
+            status = "cancelled"
+            if not writer.is_closing():
+                writer.write(_encode({"id": request_id, "op": "cancel"}))
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            TOOL_CALL_SECONDS.labels(tool["server"], tool["mcp_name"], status).observe(time.perf_counter() - started)
+
+    async def close(self):
+        self._initialized = False
+        for task in (self._reconnect_task, self._reader_task):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._reconnect_task, self._reader_task) if task is not None),
+            return_exceptions=True
+        )
+        self._reconnect_task = self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._tools = ()
+        self._index.clear()
+        self._states = {}
+        self._pools = {}
+        tool_catalog.update(self._tools)
+
+
+def spawn_broker(socket_path: str, env: Optional[dict[str, str]] = None) -> subprocess.Popen:
+    """Start a broker process (used by gunicorn.conf.py on the arbiter)."""
+    return subprocess.Popen([sys.executable, "-m", "app.services.mcp_broker", "--socket", socket_path], env=env)
+
+
+def stop_broker(process: subprocess.Popen, timeout: float = 10.0):
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def serve(socket_path: str):
+    """Run the MCP servers and serve them on `socket_path` until SIGTERM/SIGINT."""
+    from app.services.mcp_service import MCPService
+
+    service = MCPService()
+    broker = MCPBroker(service, socket_path)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    # Listen first: workers connect (and see `ready: false`) while servers start
+    await broker.start()
+    try:
+        try:
+            await service.initialize()
+        except Exception as e:
+            logger.warning("MCP service initialization failed; serving without tools", extra={"error": str(e)})
+        await stop.wait()
+    finally:
+        await broker.close()
+        await service.close()
+
+
+if __name__ == "__main__":
+    from app.core.logger import setup_logging, shutdown_logging
+
+    parser = argparse.ArgumentParser(description="Serve the configured MCP servers to worker processes")
+    parser.add_argument("--socket", default=settings.mcp_broker_socket or "/tmp/ai-chatbot-mcp.sock")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(serve(args.socket))
+    finally:
+        shutdown_logging()
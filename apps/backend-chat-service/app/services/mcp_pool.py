@@ -0,0 +1,334 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import anyio
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+MessageHandler = Callable[[Any], Awaitable[None]]
+
+
+class MCPPoolExhaustedError(RuntimeError):
+    """Raised when a session pool has too many callers waiting for a lease."""
+
+
+class _RequestTracker:
+    """Client -> server stream that remembers the id of the last request sent."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.last_request_id: Optional[types.RequestId] = None
+
+    async def send(self, message):
+        root = message.message.root
+        if isinstance(root, types.JSONRPCRequest):
+            self.last_request_id = root.id
+        await self._stream.send(message)
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+
+class PooledSession:
+    """
+    A single long-lived MCP stdio session.
+
+    The stdio transport and ClientSession are entered and exited inside a
+    dedicated task, so the child process can be started from one task (e.g.
+    a request that triggers a respawn) and stopped from another (lifespan
+    shutdown) without crossing anyio cancel scopes. The server's output is
+    relayed to the session through that task, so it also ends (and the
+    session stops being `alive`) as soon as the child process exits.
+    """
+
+    def __init__(
+        self,
+        server_name: str,
+        params: StdioServerParameters,
+        message_handler: Optional[MessageHandler] = None,
+    ):
+        self.server_name = server_name
+        self.params = params
+        self.message_handler = message_handler
+        self.session: Optional[ClientSession] = None
+        self._requests: Optional[_RequestTracker] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._stop = asyncio.Event()
+
+    @property
+    def alive(self) -> bool:
+        """Whether the child process and session are still running."""
+        return (
+            self.session is not None
+            and self._task is not None
+            and not self._task.done()
+        )
+
+    async def start(self):
+        """Spawn the server process and wait for the session handshake."""
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"mcp-{self.server_name}")
+        await self._ready
+
+    async def _run(self):
+        relay: Optional[asyncio.Task] = None
+        try:
+            async with stdio_client(self.params) as (read, write):
+                relay_write, relay_read = anyio.create_memory_object_stream(0)
+                relay = asyncio.create_task(self._relay(read, relay_write))
+                self._requests = _RequestTracker(write)
+                async with ClientSession(relay_read, self._requests, message_handler=self.message_handler) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set_result(None)
+                    await self._stop.wait()
+                    if relay.done():
+                        logger.warning("MCP server process exited", extra={"server": self.server_name})
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.warning("MCP session died", extra={"server": self.server_name, "error": str(e)})
+        finally:
+            self.session = None
+            self._requests = None
+            if relay is not None:
+                relay.cancel()
+            self._abort_start()
+
+    def _abort_start(self):
+        """Cancelled or exited before the handshake: don't leave start() waiting."""
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(
+                ConnectionError(f"MCP server {self.server_name} stopped before the session was ready")
+            )
+
+    async def _relay(self, source, sink):
+        """Forward server messages to the session; the server closing stdout ends the session."""
+        try:
+            async with sink:
+                async for message in source:
+                    await sink.send(message)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            # The session went away first (normal shutdown)
+            return
+        self.session = None
+        self._stop.set()
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> types.CallToolResult:
+        """
+        Call a tool; if the caller is cancelled (e.g. the client went away)
+        while the server works on it, tell the server to stop.
+        """
+        requests = self._requests
+        before = requests.last_request_id
+        try:
+            return await self.session.call_tool(name, arguments)
+        except asyncio.CancelledError:
+            if requests.last_request_id != before:
+                await self._cancel_request(requests.last_request_id)
+            raise
+
+    async def _cancel_request(self, request_id: types.RequestId):
+        """Send notifications/cancelled for an abandoned request (best effort)."""
+        notification = types.ClientNotification(
+            types.CancelledNotification(
+                params=types.CancelledNotificationParams(requestId=request_id, reason="client disconnected")
+            )
+        )
+        try:
+            await asyncio.wait_for(self.session.send_notification(notification), timeout=1.0)
+        except Exception as e:
+            logger.debug("Failed to send MCP cancellation", extra={"server": self.server_name, "error": str(e)})
+
+    async def ping(self) -> bool:
+        """Check that the server still answers requests."""
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=5.0)
+            return True
+        except Exception:
+            return False
+
+    async def stop(self, timeout: float = 5.0):
+        """Shut the session down and reap the child process."""
+        if self._task is None:
+            return
+        self._stop.set()
+        if self._ready is not None and not self._ready.done():
+            # Still starting up: nothing to shut down gracefully
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            self._task.cancel()
+        # A task cancelled before it first ran never reaches its finally
+        self._abort_start()
+        self._task = None
+        self.session = None
+
+
+class MCPSessionPool:
+    """Pool of warm MCP sessions for one configured server."""
+
+    def __init__(
+        self,
+        server_name: str,
+        params: StdioServerParameters,
+        size: int = 2,
+        max_waiters: int = 32,
+        acquire_timeout: float = 30.0,
+        message_handler: Optional[MessageHandler] = None,
+    ):
+        self.server_name = server_name
+        self.params = params
+        self.message_handler = message_handler
+        self.size = max(1, size)
+        self.max_waiters = max_waiters
+        self.acquire_timeout = acquire_timeout
+
+        self._slots: list[PooledSession] = []
+        self._idle: asyncio.Queue[PooledSession] = asyncio.Queue()
+        self._waiting = 0
+
+        # Counters
+        self.leases = 0
+        self.respawns = 0
+        self.rejections = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def start(self):
+        """Spawn all sessions concurrently; fails if none come up."""
+        slots = [
+            PooledSession(self.server_name, self.params, self.message_handler)
+            for _ in range(self.size)
+        ]
+        # Track slots before starting so close() can reap them if startup is cancelled
+        self._slots.extend(slots)
+        results = await asyncio.gather(*(slot.start() for slot in slots), return_exceptions=True)
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if len(errors) == len(slots):
+            raise errors[0]
+
+        # Slots that failed to start are kept and respawned lazily on lease
+        for slot in slots:
+            self._idle.put_nowait(slot)
+
+    async def _respawn(self, slot: PooledSession):
+        await slot.stop(timeout=1.0)
+        try:
+            # A lease waits for the respawn too, so bound it like the queue wait
+            await asyncio.wait_for(slot.start(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            await slot.stop(timeout=1.0)
+            raise
+        self.respawns += 1
+        logger.info("Respawned MCP session", extra={"server": self.server_name})
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[ClientSession]:
+        """
+        Lease a warm session for the duration of the block.
+
+        Raises:
+            MCPPoolExhaustedError: If too many callers are already waiting
+            asyncio.TimeoutError: If no session frees up (or a dead one
+                can't be respawned) within acquire_timeout
+        """
+        async with self._lease_slot() as slot:
+            yield slot.session
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> types.CallToolResult:
+        """
+        Call a tool on a leased session. Cancelling the call also cancels it
+        on the server (notifications/cancelled).
+
+        Raises:
+            MCPPoolExhaustedError: If too many callers are already waiting
+            asyncio.TimeoutError: If no session frees up within acquire_timeout
+        """
+        async with self._lease_slot() as slot:
+            return await slot.call_tool(name, arguments)
+
+    @asynccontextmanager
+    async def _lease_slot(self) -> AsyncIterator[PooledSession]:
+        """Lease a warm session slot, respawning it first if it died (see lease())."""
+        if self._idle.empty() and self._waiting >= self.max_waiters:
+            self.rejections += 1
+            raise MCPPoolExhaustedError(
+                f"MCP pool for {self.server_name} is exhausted ({self._waiting} waiting)"
+            )
+
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.leases += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+        try:
+            if not slot.alive:
+                await self._respawn(slot)
+            yield slot
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def health_check(self):
+        """Ping idle sessions and respawn any whose child process has died."""
+        for _ in range(self._idle.qsize()):
+            slot = self._idle.get_nowait()
+            try:
+                if not await slot.ping():
+                    await self._respawn(slot)
+            except Exception as e:
+                logger.warning(
+                    "MCP health check respawn failed",
+                    extra={"server": self.server_name, "error": str(e)}
+                )
+            finally:
+                self._idle.put_nowait(slot)
+
+    def stats(self) -> dict:
+        """Pool size, wait-time and respawn counters."""
+        return {
+            "size": self.size,
+            "alive": sum(1 for slot in self._slots if slot.alive),
+            "idle": self._idle.qsize(),
+            "waiting": self._waiting,
+            "leases": self.leases,
+            "respawns": self.respawns,
+            "rejections": self.rejections,
+            "avg_wait_ms": (self.total_wait_time / self.leases * 1000) if self.leases else 0.0,
+            "max_wait_ms": self.max_wait_time * 1000,
+        }
+
+    async def close(self):
+        """Stop every session in the pool."""
+        await asyncio.gather(*(slot.stop() for slot in self._slots), return_exceptions=True)
+        self._slots.clear()
+        self._idle = asyncio.Queue()
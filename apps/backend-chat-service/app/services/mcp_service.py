@@ -1,139 +1,319 @@
 import asyncio
-import json
-from typing import Any, Optional
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import importlib
+import time
+from typing import Any, Callable, Optional
 
 from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import TOOL_CALL_SECONDS
+from app.core.tool_catalog import tool_catalog
+from app.services.tool_cache import tool_cache
+from app.services.tool_registry import ToolRegistry
+
+logger = get_logger(__name__)
 
 
 class MCPService:
-    """Service for managing multiple MCP client connections and tool execution."""
+    """
+    Service for managing multiple MCP client connections and tool execution.
+    
+    The MCP SDK is imported when servers attach rather than with this module,
+    which keeps it off the app's cold start.
+    """
     
     def __init__(self):
-        self.servers: dict[str, dict] = {}  # server_name -> {session, tools, process}
-        self.tools: list[dict[str, Any]] = []
+        self.servers: dict[str, dict] = {}  # server_name -> {config, pool}
+        self.registry = ToolRegistry()
         self._initialized = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._attach_task: Optional[asyncio.Task] = None
+        self._cleanup_tasks: set[asyncio.Task] = set()
+        # server_name -> {state, startup_ms, error}
+        self.server_states: dict[str, dict[str, Any]] = {}
+        self._listeners: list[Callable[[], None]] = []
+    
+    def on_change(self, callback: Callable[[], None]):
+        """Call `callback` whenever the tool list or a server's startup state changes."""
+        self._listeners.append(callback)
+    
+    def _changed(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("MCP change listener failed", extra={"error": str(e)})
     
     async def initialize(self):
-        """Initialize connections to all configured MCP servers."""
+        """
+        Initialize connections to all configured MCP servers.
+        
+        Servers start concurrently, each bounded by MCP_SERVER_STARTUP_TIMEOUT.
+        With MCP_BACKGROUND_ATTACH (or MCP_DEFER_WARMUP) enabled this returns
+        immediately and servers attach in the background as they become ready.
+        """
         if self._initialized:
             return
         
         try:
             servers_config = settings.get_mcp_servers_config()
-            print(f"🔧 Initializing {len(servers_config)} MCP server(s)...")
+            logger.info("Initializing MCP servers", extra={"servers": len(servers_config)})
             
             for server_config in servers_config:
-                await self._initialize_server(server_config)
+                self.server_states[server_config["name"]] = {
+                    "state": "pending",
+                    "startup_ms": None,
+                    "error": None,
+                }
             
             self._initialized = True
-            print(f"✅ MCP Service initialized with {len(self.tools)} total tools from {len(self.servers)} server(s)")
+            if servers_config and settings.mcp_health_check_interval > 0:
+                self._health_task = asyncio.create_task(self._health_loop())
+            
+            if settings.mcp_background_attach or settings.mcp_defer_warmup:
+                self._attach_task = asyncio.create_task(self._attach_servers(servers_config))
+                logger.info("Attaching MCP servers in the background")
+            else:
+                await self._attach_servers(servers_config)
                     
         except Exception as e:
-            print(f"❌ Failed to initialize MCP service: {e}")
+            self._initialized = False
+            logger.error("Failed to initialize MCP service", extra={"error": str(e)})
             raise
     
+    async def _attach_servers(self, servers_config: list[dict]):
+        """Start all servers concurrently with per-server deadlines."""
+        if servers_config:
+            # Import the SDK off the event loop; requests may already be in flight
+            await asyncio.to_thread(importlib.import_module, "app.services.mcp_pool")
+        await asyncio.gather(
+            *(self._initialize_server(config) for config in servers_config)
+        )
+        logger.info(
+            "MCP service initialized",
+            extra={"tools": len(self.registry), "servers": len(self.servers)}
+        )
+    
+    @property
+    def ready(self) -> bool:
+        """Whether every configured server has finished starting (or given up)."""
+        return all(
+            state["state"] not in ("pending", "starting")
+            for state in self.server_states.values()
+        )
+    
+    def get_server_states(self) -> dict[str, dict[str, Any]]:
+        """Get startup state and latency for every configured server."""
+        return self.server_states
+    
     async def _initialize_server(self, config: dict):
-        """Initialize a single MCP server."""
+        """Initialize a single MCP server within its startup deadline."""
         server_name = config["name"]
+        state = self.server_states.setdefault(server_name, {})
+        state.update(state="starting", startup_ms=None, error=None)
+        started = time.perf_counter()
         
         try:
-            # Create server parameters
-            server_params = StdioServerParameters(
-                command=config["command"],
-                args=config["args"],
-                env=config.get("env")
+            await asyncio.wait_for(
+                self._start_server(config),
+                timeout=config.get("startup_timeout", settings.mcp_server_startup_timeout)
             )
-            
-            # Note: This is a simplified version. In production, you'd want to
-            # keep the connection alive, not use context managers
-            print(f"  📡 Connecting to {server_name} MCP server...")
-            
-            # For now, we'll initialize and get tools, but note that
-            # the session will close after this block
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    # Initialize the session
-                    await session.initialize()
-                    
-                    # List available tools
-                    tools_result = await session.list_tools()
-                    server_tools = [
-                        {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "input_schema": tool.inputSchema,
-                            "server": server_name  # Track which server owns this tool
-                        }
-                        for tool in tools_result.tools
-                    ]
-                    
-                    # Store server info (session will be recreated on demand)
-                    self.servers[server_name] = {
-                        "config": config,
-                        "tools": server_tools,
-                        "session": None  # Will be created on-demand
-                    }
-                    
-                    # Add to global tools list
-                    self.tools.extend(server_tools)
-                    
-                    print(f"  ✅ {server_name}: {len(server_tools)} tools available")
-                    
+            state["state"] = "ready"
+        except asyncio.TimeoutError:
+            state.update(state="timeout", error="startup timed out")
+            logger.warning("MCP server did not start in time", extra={"server": server_name})
         except Exception as e:
-            print(f"  ⚠️  Failed to initialize {server_name} server: {e}")
+            state.update(state="failed", error=str(e))
+            logger.warning("Failed to initialize MCP server", extra={"server": server_name, "error": str(e)})
             # Continue with other servers
+        finally:
+            state["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._changed()
+    
+    async def _start_server(self, config: dict):
+        """Spawn a server's session pool, list its tools and register them."""
+        from mcp import StdioServerParameters
+        from app.services.mcp_pool import MCPSessionPool
+        
+        server_name = config["name"]
+        
+        # Create server parameters
+        server_params = StdioServerParameters(
+            command=config["command"],
+            args=config["args"],
+            env=config.get("env")
+        )
+        
+        logger.info("Connecting to MCP server", extra={"server": server_name})
+        
+        # Keep a pool of warm sessions alive for tool execution
+        pool = MCPSessionPool(
+            server_name,
+            server_params,
+            size=settings.mcp_pool_size,
+            max_waiters=settings.mcp_pool_max_waiters,
+            acquire_timeout=settings.mcp_pool_acquire_timeout,
+            message_handler=self._make_message_handler(server_name),
+        )
+        
+        try:
+            await pool.start()
+            
+            # List available tools
+            async with pool.lease() as session:
+                tools_result = await session.list_tools()
+        except asyncio.CancelledError:
+            # Startup deadline hit: reap the children without holding up the caller
+            task = asyncio.create_task(pool.close())
+            self._cleanup_tasks.add(task)
+            task.add_done_callback(self._cleanup_tasks.discard)
+            raise
+        except Exception:
+            await pool.close()
+            raise
+        
+        self.servers[server_name] = {
+            "config": config,
+            "pool": pool
+        }
+        self.registry.set_server_tools(server_name, tools_result.tools)
+        
+        # Precompile provider tool declarations for the new tool list
+        tool_catalog.update(self.registry.snapshot())
+        
+        logger.info(
+            "MCP server ready",
+            extra={"server": server_name, "tools": len(tools_result.tools), "sessions": pool.size}
+        )
+    
+    def _make_message_handler(self, server_name: str):
+        """Build a session message handler that reacts to tools/list_changed."""
+        from mcp import types
+        
+        async def handle(message):
+            if isinstance(message, types.ServerNotification) and isinstance(
+                message.root, types.ToolListChangedNotification
+            ):
+                self._schedule_refresh(server_name)
+        
+        return handle
+    
+    def _schedule_refresh(self, server_name: str):
+        """Refresh a server's tools in the background (coalescing bursts)."""
+        pending = self._refresh_tasks.get(server_name)
+        if pending and not pending.done():
+            return
+        self._refresh_tasks[server_name] = asyncio.create_task(self.refresh_server_tools(server_name))
+    
+    async def refresh_server_tools(self, server_name: str):
+        """Re-list one server's tools and update the registry incrementally."""
+        server_info = self.servers.get(server_name)
+        if not server_info:
+            return
+        
+        try:
+            async with server_info["pool"].lease() as session:
+                tools_result = await session.list_tools()
+        except Exception as e:
+            logger.warning("Failed to refresh MCP tools", extra={"server": server_name, "error": str(e)})
+            return
+        
+        if self.registry.set_server_tools(server_name, tools_result.tools):
+            tool_catalog.update(self.registry.snapshot())
+            self._changed()
+            logger.info("MCP tool list changed", extra={"server": server_name, "tools": len(tools_result.tools)})
+    
+    async def _health_loop(self):
+        """Periodically ping pooled sessions and respawn crashed servers."""
+        while True:
+            await asyncio.sleep(settings.mcp_health_check_interval)
+            for server_info in list(self.servers.values()):
+                await server_info["pool"].health_check()
     
     async def execute_tool(self, tool_name: str, arguments: dict[str, Any]) -> Any:
         """Execute a tool via the appropriate MCP server."""
         if not self._initialized:
             await self.initialize()
         
-        # Find which server owns this tool
-        server_name = None
-        for tool in self.tools:
-            if tool["name"] == tool_name:
-                server_name = tool["server"]
-                break
-        
-        if not server_name:
+        tool = self.registry.resolve(tool_name)
+        if not tool:
             raise ValueError(f"Tool {tool_name} not found in any server")
         
+        server_name = tool["server"]
         server_info = self.servers.get(server_name)
         if not server_info:
             raise ValueError(f"Server {server_name} not initialized")
         
+        async def call():
+            # Cancelled (client went away): the pool cancels the call on the server too
+            result = await server_info["pool"].call_tool(tool["mcp_name"], arguments)
+            return result.content
+        
+        started = time.perf_counter()
+        status = "error"
         try:
-            # Create a new session for this execution
-            config = server_info["config"]
-            server_params = StdioServerParameters(
-                command=config["command"],
-                args=config["args"],
-                env=config.get("env")
-            )
-            
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(tool_name, arguments)
-                    return result.content
-                    
+            result = await tool_cache.get_or_execute(server_name, tool["mcp_name"], arguments, call)
+            status = "ok"
+            return result
+        
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
         except Exception as e:
-            print(f"❌ Error executing tool {tool_name} on {server_name}: {e}")
+            logger.error(
+                "Error executing tool",
+                extra={"tool": tool_name, "server": server_name, "error": str(e)}
+            )
             raise
+        finally:
+            TOOL_CALL_SECONDS.labels(server_name, tool["mcp_name"], status).observe(
+                time.perf_counter() - started
+            )
+    
+    def get_pool_stats(self) -> dict[str, dict]:
+        """Get session pool counters for every connected server."""
+        return {
+            name: server_info["pool"].stats()
+            for name, server_info in self.servers.items()
+        }
     
-    def get_tools(self) -> list[dict[str, Any]]:
-        """Get list of all available tools from all servers."""
-        return self.tools
+    def get_tools(self) -> tuple[dict[str, Any], ...]:
+        """Get an immutable snapshot of all available tools from all servers."""
+        return self.registry.snapshot()
     
     async def close(self):
         """Close all MCP connections."""
+        if self._attach_task:
+            self._attach_task.cancel()
+            # Wait for it to unwind; only its own outcome is swallowed, not our cancellation
+            await asyncio.gather(self._attach_task, return_exceptions=True)
+            self._attach_task = None
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        for task in self._refresh_tasks.values():
+            task.cancel()
+        self._refresh_tasks.clear()
+        if self._cleanup_tasks:
+            await asyncio.gather(*self._cleanup_tasks, return_exceptions=True)
+        
+        await asyncio.gather(
+            *(server_info["pool"].close() for server_info in self.servers.values()),
+            return_exceptions=True
+        )
         self.servers.clear()
-        self.tools.clear()
+        self.registry.clear()
+        self.server_states.clear()
+        tool_cache.clear()
+        tool_catalog.update(self.registry.snapshot())
         self._initialized = False
-        print("✅ MCP Service closed")
+        logger.info("MCP service closed")
 
 
-# Global MCP service instance
-mcp_service = MCPService()
+# Global MCP service instance; with MCP_BROKER_SOCKET set (multi-worker
+# deployments) tools run in the shared broker process instead
+if settings.mcp_broker_socket:
+    from app.services.mcp_broker import RemoteMCPService
+    mcp_service = RemoteMCPService(settings.mcp_broker_socket)
+else:
+    mcp_service = MCPService()
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.shared_cache import SharedCache
+
+logger = get_logger(__name__)
+
+
+class SharedGenerationCancelledError(RuntimeError):
+    """Raised to subscribers of a shared generation that was cancelled."""
+
+
+class _Broadcast:
+    """Fans one in-flight generation out to every subscriber, replaying from the start."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        # Cleared by generation code whose response mustn't be stored
+        self.store = True
+        self.task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def _notify(self):
+        wake, self._wake = self._wake, asyncio.Event()
+        wake.set()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        index = 0
+        while True:
+            wake = self._wake
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await wake.wait()
+
+
+# The broadcast being produced by the current task
+_producing: ContextVar[Optional[_Broadcast]] = ContextVar("response_cache_producing", default=None)
+
+
+class ResponseCache:
+    """
+    Opt-in cache of complete streamed chat responses.
+
+    Responses are stored as their original chunk sequence so a replay is
+    framed exactly like a live stream. Entries live in an in-memory LRU and,
+    if RESPONSE_CACHE_DIR is set, in one JSON file per key on disk; with
+    SHARED_CACHE_PATH they are also stored in an SQLite file shared by all
+    worker processes. Concurrent identical requests (within a process)
+    subscribe to a single in-flight generation.
+
+    Only deterministic responses are worth replaying: requests sampled at a
+    temperature above 0 bypass the cache, and a generation that ran tools
+    (its answer depends on their results) calls `skip_store()` so it is
+    shared with concurrent subscribers but not stored.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        directory: Optional[str] = None,
+        shared_path: Optional[str] = None,
+    ):
+        self.enabled = settings.response_cache_enabled if enabled is None else enabled
+        self.max_entries = settings.response_cache_max_entries if max_entries is None else max_entries
+        self.ttl = settings.response_cache_ttl if ttl is None else ttl
+        directory = settings.response_cache_dir if directory is None else directory
+        self.directory = Path(directory) if directory else None
+        shared_path = settings.shared_cache_path if shared_path is None else shared_path
+        self.shared_store = SharedCache(shared_path, "response") if shared_path else None
+
+        # key -> (expires_at, chunks)
+        self._entries: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._inflight: dict[str, _Broadcast] = {}
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: list[dict[str, Any]],
+        generation_config: dict[str, Any],
+        tool_catalog_version: Optional[str],
+    ) -> str:
+        """Hash model, exact message contents, generation config and tool catalog."""
+        contents = [[msg["role"], msg["content"]] for msg in messages]
+        payload = json.dumps(
+            [model, contents, generation_config, tool_catalog_version],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def is_deterministic(generation_config: dict[str, Any]) -> bool:
+        """Whether a provider config samples greedily (temperature 0), so a replay is a valid answer."""
+        return (generation_config or {}).get("temperature", 1.0) <= 0
+
+    @staticmethod
+    def skip_store():
+        """Don't store the response the current task is generating (it used tool results)."""
+        broadcast = _producing.get()
+        if broadcast is not None:
+            broadcast.store = False
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[tuple[float, list[str]]]:
+        try:
+            data = json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+        return data["expires_at"], data["chunks"]
+
+    def _write_disk(self, key: str, expires_at: float, chunks: list[str]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self._path(key).with_suffix(".tmp")
+        tmp.write_text(json.dumps({"expires_at": expires_at, "chunks": chunks}))
+        tmp.replace(self._path(key))
+
+    def _remember(self, key: str, expires_at: float, chunks: list[str]):
+        self._entries[key] = (expires_at, chunks)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[list[str]]:
+        """Look a response up in memory, then on disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] >= time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        if self.shared_store is not None:
+            data = await self.shared_store.get(key)
+            if data is not None:
+                entry = json.loads(data)
+                self._remember(key, entry["expires_at"], entry["chunks"])
+                self.shared_hits += 1
+                return entry["chunks"]
+
+        if self.directory is not None:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None and entry[0] >= time.time():
+                self._remember(key, *entry)
+                self.disk_hits += 1
+                return entry[1]
+        return None
+
+    async def put(self, key: str, chunks: list[str]):
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, chunks)
+        if self.shared_store is not None:
+            await self.shared_store.put(key, json.dumps({"expires_at": expires_at, "chunks": chunks}), expires_at)
+        if self.directory is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, expires_at, chunks)
+            except OSError as e:
+                logger.warning("Failed to write response cache entry", extra={"error": str(e)})
+
+    async def stream(
+        self,
+        key: str,
+        generate: Callable[[], AsyncIterator[str]],
+    ) -> AsyncGenerator[str, None]:
+        """Replay a cached response, join an identical in-flight one, or generate it."""
+        cached = await self.get(key)
+        if cached is not None:
+            for chunk in cached:
+                yield chunk
+            return
+
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            self.misses += 1
+            broadcast = self._inflight[key] = _Broadcast()
+            broadcast.task = asyncio.create_task(self._produce(key, broadcast, generate))
+        else:
+            self.shared += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            # Nobody is listening any more: stop generating
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+
+    async def _produce(
+        self,
+        key: str,
+        broadcast: _Broadcast,
+        generate: Callable[[], AsyncIterator[str]],
+    ):
+        _producing.set(broadcast)
+        try:
+            async for chunk in generate():
+                broadcast.publish(chunk)
+        except asyncio.CancelledError:
+            # A plain error for subscribers: re-raising CancelledError in
+            # their tasks would look like they had been cancelled themselves
+            broadcast.finish(SharedGenerationCancelledError("Shared generation was cancelled"))
+            raise
+        except Exception as e:
+            broadcast.finish(e)
+        else:
+            broadcast.finish()
+            if broadcast.store:
+                await self.put(key, broadcast.chunks)
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+        }
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,328 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.metrics import ROUTER_BACKEND_ERRORS, ROUTER_FAILOVERS, ROUTER_HEDGES, register_models
+from app.core.providers import provider_registry
+from app.services.admission import AdmissionRejectedError
+
+logger = get_logger(__name__)
+
+
+# Error rate at which a backend is tried after healthier ones
+DEGRADED_ERROR_RATE = 0.5
+
+_EMPTY = object()
+
+
+class Backend:
+    """A provider + model pair a request can be sent to."""
+
+    __slots__ = ("provider_name", "model", "model_id")
+
+    def __init__(self, provider_name: str, model: str):
+        self.provider_name = provider_name
+        self.model = model
+        # Id used for budgets and limits: 'ollama:llama3.2:3b'; default-provider models stay bare
+        self.model_id = model if provider_name == settings.default_provider else f"{provider_name}:{model}"
+
+    @property
+    def provider(self):
+        return provider_registry.get(self.provider_name)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Backend) and (self.provider_name, self.model) == (other.provider_name, other.model)
+
+    def __hash__(self) -> int:
+        return hash((self.provider_name, self.model))
+
+    def __repr__(self) -> str:
+        return f"{self.provider_name}:{self.model}"
+
+
+class BackendHealth:
+    """Rolling error rate and time-to-first-token of one backend, plus a circuit breaker."""
+
+    __slots__ = ("error_rate", "ttft", "ttfts", "consecutive_failures", "open_until", "requests", "failures")
+
+    def __init__(self, window: int = 200):
+        self.error_rate = 0.0
+        self.ttft: Optional[float] = None
+        self.ttfts: deque[float] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+        # Counters
+        self.requests = 0
+        self.failures = 0
+
+    def first_token(self, seconds: float):
+        self.ttfts.append(seconds)
+        self.ttft = seconds if self.ttft is None else 0.8 * self.ttft + 0.2 * seconds
+
+    def success(self):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 0.8
+
+    def failure(self, threshold: int, cooldown: float):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = 0.8 * self.error_rate + 0.2
+        if self.consecutive_failures >= threshold:
+            # Open: skipped until the cooldown ends, then tried again (one failure re-opens)
+            self.open_until = time.monotonic() + cooldown
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.ttfts:
+            return None
+        ordered = sorted(self.ttfts)
+        return ordered[min(math.ceil(percent / 100 * len(ordered)) - 1, len(ordered) - 1)]
+
+    def score(self) -> float:
+        """Lower is better: typical TTFT inflated by the error rate."""
+        return (self.ttft or 0.0) * (1 + 4 * self.error_rate) + self.error_rate
+
+
+class ModelRouter:
+    """
+    Routes a requested model to one of its backends.
+
+    A model name is either an alias (MODEL_ALIASES: an ordered list of
+    `provider:model` backends) or a single backend. Each backend keeps a
+    rolling health record; open circuits (too many consecutive failures) and
+    degraded backends are tried after healthy ones. A backend that fails
+    before producing its first token is replaced by the next candidate;
+    after the first token the request is committed to it. With hedging on, a
+    backend slower to its first token than its recent TTFT percentile gets a
+    second backend raced against it, and the loser is cancelled.
+    """
+
+    def __init__(
+        self,
+        aliases: Optional[dict[str, list[str]]] = None,
+        failure_threshold: Optional[int] = None,
+        cooldown: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        hedge_min_delay: Optional[float] = None,
+    ):
+        self.aliases = settings.model_alias_map if aliases is None else aliases
+        self.failure_threshold = (
+            settings.router_failure_threshold if failure_threshold is None else failure_threshold
+        )
+        self.cooldown = settings.router_cooldown if cooldown is None else cooldown
+        self.hedge_enabled = settings.router_hedge_enabled if hedge_enabled is None else hedge_enabled
+        self.hedge_percentile = settings.router_hedge_percentile if hedge_percentile is None else hedge_percentile
+        self.hedge_min_samples = (
+            settings.router_hedge_min_samples if hedge_min_samples is None else hedge_min_samples
+        )
+        self.hedge_min_delay = settings.router_hedge_min_delay if hedge_min_delay is None else hedge_min_delay
+
+        self._routes: dict[str, list[Backend]] = {}
+        self._health: dict[Backend, BackendHealth] = {}
+        register_models(*self.aliases, *(target for targets in self.aliases.values() for target in targets))
+
+        # Counters
+        self.failovers = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    @staticmethod
+    def parse_backend(target: str) -> Backend:
+        """'ollama:llama3.2:3b' -> (ollama, llama3.2:3b); names without a known provider prefix use the default."""
+        provider_name, separator, model = target.partition(":")
+        if separator and provider_name in provider_registry:
+            return Backend(provider_name, model)
+        return Backend(settings.default_provider, target)
+
+    def route(self, model: str) -> list[Backend]:
+        """Backends for a model name, in configured preference order."""
+        backends = self._routes.get(model)
+        if backends is None:
+            backends = [self.parse_backend(target) for target in self.aliases.get(model) or [model]]
+            if model in self.aliases:
+                self._routes[model] = backends
+        return backends
+
+    def primary(self, model: str) -> Backend:
+        return self.route(model)[0]
+
+    def health(self, backend: Backend) -> BackendHealth:
+        health = self._health.get(backend)
+        if health is None:
+            health = self._health[backend] = BackendHealth()
+        return health
+
+    def candidates(self, model: str) -> list[Backend]:
+        """Route order with open circuits last and degraded backends after healthy ones."""
+        backends = self.route(model)
+        if len(backends) == 1:
+            return backends
+
+        def rank(item: tuple[int, Backend]) -> tuple[bool, bool, int]:
+            index, backend = item
+            health = self.health(backend)
+            return (not health.available(), health.error_rate >= DEGRADED_ERROR_RATE, index)
+
+        return [backend for _, backend in sorted(enumerate(backends), key=rank)]
+
+    def _failed(self, backend: Backend, stage: str, error: BaseException):
+        self.health(backend).failure(self.failure_threshold, self.cooldown)
+        ROUTER_BACKEND_ERRORS.labels(backend.provider_name, backend.model, stage).inc()
+        logger.warning(
+            "Backend failed",
+            extra={"backend": repr(backend), "stage": stage, "error": str(error) or type(error).__name__}
+        )
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        health = self.health(backend)
+        if len(health.ttfts) < self.hedge_min_samples:
+            return None
+        return max(health.percentile(self.hedge_percentile), self.hedge_min_delay)
+
+    async def _first_chunk(
+        self,
+        backend: Backend,
+        open_stream: Callable[[Backend], Awaitable[AsyncIterator]],
+    ) -> tuple[AsyncIterator, Any]:
+        """Open a backend's stream and wait for its first chunk (`_EMPTY` if it has none)."""
+        stream = await open_stream(backend)
+        started = time.perf_counter()
+        try:
+            first = await anext(stream, _EMPTY)
+        except BaseException:
+            await stream.aclose()
+            raise
+        self.health(backend).first_token(time.perf_counter() - started)
+        return stream, first
+
+    @staticmethod
+    async def _discard(task: asyncio.Task):
+        """Cancel an attempt that lost, closing its stream if it already had one."""
+        task.cancel()
+        try:
+            stream, _ = await task
+        except BaseException:
+            return
+        await stream.aclose()
+
+    async def open(
+        self,
+        model: str,
+        open_stream: Callable[[Backend], Awaitable[AsyncIterator]],
+    ) -> tuple[Backend, AsyncGenerator]:
+        """
+        Start a generation on the best available backend for `model`.
+
+        Args:
+            model: Requested model name or alias
+            open_stream: Async callable returning the provider stream for a
+                backend (it may prepare backend-specific input first)
+
+        Returns:
+            The backend that produced the first chunk, and its stream
+            (first chunk included), health-tracked until it ends
+
+        Raises:
+            Exception: The last backend's error when every candidate failed
+                before its first chunk
+        """
+        pending = deque(self.candidates(model))
+        attempts: dict[asyncio.Task, Backend] = {}
+        hedged: set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+        try:
+            while pending or attempts:
+                if not attempts:
+                    backend = pending.popleft()
+                    attempts[asyncio.ensure_future(self._first_chunk(backend, open_stream))] = backend
+
+                timeout = None
+                if self.hedge_enabled and pending and len(attempts) == 1:
+                    timeout = self._hedge_delay(next(iter(attempts.values())))
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slow to first token: race the next backend against it
+                    backend = pending.popleft()
+                    task = asyncio.ensure_future(self._first_chunk(backend, open_stream))
+                    attempts[task] = backend
+                    hedged.add(task)
+                    self.hedges += 1
+                    ROUTER_HEDGES.labels("started").inc()
+                    continue
+
+                for task in done:
+                    backend = attempts.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if hedged:
+                            won = task in hedged
+                            self.hedges_won += won
+                            ROUTER_HEDGES.labels("won" if won else "lost").inc()
+                        stream, first = task.result()
+                        # It answered, so it is a real model: report it by name from now on
+                        register_models(model, backend.model, backend.model_id)
+                        return backend, self._guard(backend, stream, first)
+                    last_error = error
+                    if not isinstance(error, AdmissionRejectedError):
+                        # A full admission queue says nothing about the backend's health
+                        self._failed(backend, "connect", error)
+                    if pending or attempts:
+                        self.failovers += 1
+                        ROUTER_FAILOVERS.labels(backend.provider_name, backend.model).inc()
+            raise last_error
+        finally:
+            if attempts:
+                await asyncio.gather(*(self._discard(task) for task in attempts))
+
+    async def _guard(self, backend: Backend, stream: AsyncIterator, first: Any = _EMPTY) -> AsyncGenerator:
+        """Pass a backend's stream through, recording how it ended."""
+        try:
+            async with aclosing(stream):
+                if first is not _EMPTY:
+                    yield first
+                async for chunk in stream:
+                    yield chunk
+        except Exception as e:
+            self._failed(backend, "stream", e)
+            raise
+        self.health(backend).success()
+
+    def track(self, backend: Backend, stream: AsyncIterator) -> AsyncGenerator:
+        """Health-track a follow-up stream on an already chosen backend (e.g. later tool-loop steps)."""
+        return self._guard(backend, stream)
+
+    def stats(self) -> dict:
+        return {
+            "aliases": {alias: [repr(b) for b in self.route(alias)] for alias in self.aliases},
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "backends": {
+                repr(backend): {
+                    "available": health.available(),
+                    "error_rate": round(health.error_rate, 3),
+                    "ttft_ms": round(health.ttft * 1000, 1) if health.ttft is not None else None,
+                    "score": round(health.score(), 4),
+                    "requests": health.requests,
+                    "failures": health.failures,
+                }
+                for backend, health in self._health.items()
+            },
+        }
+
+
+# Global model router instance
+model_router = ModelRouter()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough memory footprint of an MCP tool result (text dominates)."""
+    if isinstance(value, list):
+        return sum(_estimate_size(item) for item in value) + 64
+    text = getattr(value, "text", None)
+    if isinstance(text, str):
+        return len(text) + 128
+    data = getattr(value, "data", None)
+    if isinstance(data, (str, bytes)):
+        return len(data) + 128
+    if isinstance(value, (str, bytes)):
+        return len(value) + 64
+    return 256
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache in front of MCP tool execution.
+
+    Only allowlisted (idempotent) tools are cached. Entries are keyed on
+    server, tool and canonicalized arguments, expire after a per-tool TTL and
+    are evicted least-recently-used once the memory cap is reached.
+    Concurrent identical calls share one in-flight execution (singleflight).
+
+    Any other (possibly mutating) tool call drops the cached results of its
+    server, before and after it runs, so a `write_file` followed by a
+    `read_file` reads the new content. Reads in flight across the write are
+    not cached.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        max_bytes: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        allowlist: Optional[list[str]] = None,
+        ttls: Optional[dict[str, float]] = None,
+    ):
+        self.enabled = settings.tool_cache_enabled if enabled is None else enabled
+        self.max_bytes = settings.tool_cache_max_bytes if max_bytes is None else max_bytes
+        self.default_ttl = settings.tool_cache_default_ttl if default_ttl is None else default_ttl
+        self.allowlist = settings.tool_cache_allowlist_list if allowlist is None else allowlist
+        self.ttls = settings.tool_cache_ttl_map if ttls is None else ttls
+
+        # key -> (expires_at, value, size)
+        self._entries: OrderedDict[tuple, tuple[float, Any, int]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        # key -> callers currently awaiting the in-flight execution
+        self._waiters: dict[tuple, int] = {}
+        # server -> invalidation count, to skip caching reads that overlapped a write
+        self._generations: dict[str, int] = {}
+        self._bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _matches(patterns, server_name: str, tool_name: str) -> bool:
+        qualified = f"{server_name}.{tool_name}"
+        return any(
+            fnmatchcase(qualified, pattern) or fnmatchcase(tool_name, pattern)
+            for pattern in patterns
+        )
+
+    def is_cacheable(self, server_name: str, tool_name: str) -> bool:
+        return self.enabled and self._matches(self.allowlist, server_name, tool_name)
+
+    def ttl_for(self, server_name: str, tool_name: str) -> float:
+        for pattern, ttl in self.ttls.items():
+            if self._matches((pattern,), server_name, tool_name):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def make_key(server_name: str, tool_name: str, arguments: dict[str, Any]) -> tuple:
+        canonical = json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+        return (server_name, tool_name, canonical)
+
+    def _get(self, key: tuple) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value, size = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _put(self, key: tuple, value: Any, ttl: float):
+        size = _estimate_size(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._entries[key] = (time.monotonic() + ttl, value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def get_or_execute(
+        self,
+        server_name: str,
+        tool_name: str,
+        arguments: dict[str, Any],
+        execute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Return a cached result, join an identical in-flight call, or execute."""
+        if not self.is_cacheable(server_name, tool_name):
+            if not self.enabled:
+                return await execute()
+            self.invalidate(server_name)
+            try:
+                return await execute()
+            finally:
+                self.invalidate(server_name)
+
+        key = self.make_key(server_name, tool_name, arguments)
+        found, value = self._get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.shared += 1
+            return await self._wait(key, inflight)
+
+        self.misses += 1
+        ttl = self.ttl_for(server_name, tool_name)
+        generation = self._generations.get(server_name, 0)
+        task = asyncio.ensure_future(execute())
+        self._inflight[key] = task
+
+        def _done(finished: asyncio.Future):
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            if (
+                not finished.cancelled()
+                and finished.exception() is None
+                and self._generations.get(server_name, 0) == generation
+            ):
+                self._put(key, finished.result(), ttl)
+
+        task.add_done_callback(_done)
+        return await self._wait(key, task)
+
+    async def _wait(self, key: tuple, task: asyncio.Future) -> Any:
+        """
+        Await a shared execution.
+
+        Shielded so one caller going away doesn't fail the others; once the
+        last caller has gone the execution itself is cancelled.
+        """
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def invalidate(self, server_name: str):
+        """Drop a server's cached results and stop later calls joining its in-flight ones."""
+        self._generations[server_name] = self._generations.get(server_name, 0) + 1
+        for key in [key for key in self._entries if key[0] == server_name]:
+            self._bytes -= self._entries.pop(key)[2]
+            self.invalidations += 1
+        for key in [key for key in self._inflight if key[0] == server_name]:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current footprint."""
+        lookups = self.hits + self.misses + self.shared
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": (self.hits + self.shared) / lookups if lookups else 0.0,
+        }
+
+
+# Global tool result cache instance
+tool_cache = ToolResultCache()
@@ -0,0 +1,98 @@
+from typing import Any, Optional
+
+
+class ToolRegistry:
+    """
+    Index of MCP tools across servers.
+
+    Tools are stored per server and indexed by exposed name for O(1)
+    routing. When several servers provide a tool with the same name, each
+    copy is exposed as `server.tool` (e.g. `postgres.query`) instead of one
+    silently shadowing the other. Qualified names always resolve, even when
+    there is no collision.
+    """
+
+    def __init__(self):
+        self._by_server: dict[str, list[dict[str, Any]]] = {}
+        self._index: dict[str, dict[str, Any]] = {}
+        self._snapshot: tuple[dict[str, Any], ...] = ()
+
+    @staticmethod
+    def qualified_name(server_name: str, tool_name: str) -> str:
+        return f"{server_name}.{tool_name}"
+
+    def set_server_tools(self, server_name: str, tools: list[Any]) -> bool:
+        """
+        Replace one server's tools (from a `tools/list` result).
+
+        Returns:
+            True if that server's tool set changed
+        """
+        entries = [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema,
+                "server": server_name,  # Track which server owns this tool
+                "mcp_name": tool.name,  # Name to call on the server
+            }
+            for tool in tools
+        ]
+
+        previous = self._by_server.get(server_name)
+        if previous is not None and [
+            (t["mcp_name"], t["description"], t["input_schema"]) for t in previous
+        ] == [(t["mcp_name"], t["description"], t["input_schema"]) for t in entries]:
+            return False
+
+        self._by_server[server_name] = entries
+        self._rebuild()
+        return True
+
+    def remove_server(self, server_name: str):
+        """Drop every tool owned by a server."""
+        if self._by_server.pop(server_name, None) is not None:
+            self._rebuild()
+
+    def clear(self):
+        self._by_server.clear()
+        self._rebuild()
+
+    def _rebuild(self):
+        counts: dict[str, int] = {}
+        for entries in self._by_server.values():
+            for entry in entries:
+                counts[entry["mcp_name"]] = counts.get(entry["mcp_name"], 0) + 1
+
+        index: dict[str, dict[str, Any]] = {}
+        exposed: list[dict[str, Any]] = []
+        for server_name, entries in self._by_server.items():
+            for entry in entries:
+                qualified = self.qualified_name(server_name, entry["mcp_name"])
+                if counts[entry["mcp_name"]] > 1:
+                    entry = {**entry, "name": qualified}
+                index[entry["name"]] = entry
+                index[qualified] = entry
+                exposed.append(entry)
+
+        self._index = index
+        self._snapshot = tuple(exposed)
+
+    def resolve(self, tool_name: str) -> Optional[dict[str, Any]]:
+        """Find a tool by exposed or qualified name."""
+        return self._index.get(tool_name)
+
+    def snapshot(self) -> tuple[dict[str, Any], ...]:
+        """
+        Immutable view of all exposed tools.
+
+        The same tuple is returned until the tool set changes, so it can be
+        handed to providers (and used as a cache identity) without copying.
+        """
+        return self._snapshot
+
+    def server_tools(self, server_name: str) -> list[dict[str, Any]]:
+        return self._by_server.get(server_name, [])
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
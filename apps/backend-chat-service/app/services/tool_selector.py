@@ -0,0 +1,277 @@
+import heapq
+import math
+import re
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Any, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.services.context_manager import tool_tokens
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python scoring is the fallback
+    np = None
+
+logger = get_logger(__name__)
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i in is it its me my of on or "
+    "please that the this to was what when which with you your".split()
+)
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Tool names say the most about what a tool does
+NAME_WEIGHT = 3
+
+
+def _stem(word: str) -> str:
+    """Fold the commonest English suffixes so 'files'/'file' and 'reading'/'read' match."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase terms of `text`, splitting snake_case and camelCase, without stopwords."""
+    words = _WORD.findall(_CAMEL.sub(r"\1 \2", text).lower())
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+
+def _tool_terms(tool: dict[str, Any]) -> list[str]:
+    """Terms a tool is indexed under: its name, server, description and parameters."""
+    schema = tool.get("input_schema") or {}
+    parameters = [
+        f"{name} {spec.get('description') or ''}" if isinstance(spec, dict) else name
+        for name, spec in (schema.get("properties") or {}).items()
+    ]
+    return [
+        *tokenize(tool["name"]) * NAME_WEIGHT,
+        *tokenize(tool.get("server") or ""),
+        *tokenize(tool.get("description") or ""),
+        *tokenize(" ".join(parameters)),
+    ]
+
+
+class _Index:
+    """
+    BM25 postings over one tool list.
+
+    Each term maps to a span of two flat arrays (tool index, precomputed
+    BM25 weight), so scoring a query adds up a few spans: with NumPy that
+    is one `bincount` over the query's postings, without it a loop over
+    them.
+    """
+
+    def __init__(self, tools: Sequence[dict[str, Any]]):
+        documents = [Counter(_tool_terms(tool)) for tool in tools]
+        lengths = [sum(terms.values()) for terms in documents]
+        average = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+        postings: dict[str, list[tuple[int, float]]] = {}
+        for index, (terms, length) in enumerate(zip(documents, lengths)):
+            norm = K1 * (1 - B + B * length / average) if average else K1
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append((index, frequency * (K1 + 1) / (frequency + norm)))
+
+        self.size = len(tools)
+        self.spans: dict[str, tuple[int, int]] = {}
+        doc_ids: list[int] = []
+        weights: list[float] = []
+        for term, entries in postings.items():
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.spans[term] = (len(doc_ids), len(doc_ids) + len(entries))
+            for index, weight in entries:
+                doc_ids.append(index)
+                weights.append(idf * weight)
+
+        if np is not None:
+            self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+            self.weights = np.asarray(weights, dtype=np.float32)
+        else:
+            self.doc_ids = doc_ids
+            self.weights = weights
+
+        # Estimated prompt tokens of each tool's declaration
+        self.tokens = [tool_tokens(tool) for tool in tools]
+
+    def scores(self, query: str) -> Sequence[float]:
+        """BM25 score of every tool for `query` (each distinct query term counted once)."""
+        spans = [self.spans[term] for term in dict.fromkeys(tokenize(query)) if term in self.spans]
+        if np is not None:
+            if not spans:
+                return np.zeros(self.size, dtype=np.float32)
+            take = np.concatenate([np.arange(start, end) for start, end in spans])
+            return np.bincount(self.doc_ids[take], weights=self.weights[take], minlength=self.size)
+        scores = [0.0] * self.size
+        for start, end in spans:
+            for position in range(start, end):
+                scores[self.doc_ids[position]] += self.weights[position]
+        return scores
+
+    def top(self, scores: Sequence[float], k: int, exclude: set[int]) -> list[int]:
+        """Indexes of up to `k` best-scoring tools with a positive score."""
+        if np is not None:
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k + len(exclude):
+                keep = np.argpartition(scores[candidates], -(k + len(exclude)))[-(k + len(exclude)):]
+                candidates = candidates[keep]
+            ranked = sorted(candidates.tolist(), key=lambda index: -scores[index])
+        else:
+            ranked = heapq.nlargest(
+                k + len(exclude),
+                (index for index, score in enumerate(scores) if score > 0),
+                key=scores.__getitem__,
+            )
+        return [index for index in ranked if index not in exclude][:k]
+
+
+class ToolSelector:
+    """
+    Picks the tools worth offering the model for a request.
+
+    Every tool declaration is part of the prompt, so a large MCP catalog
+    costs thousands of tokens per request (and time to first token) even
+    when one tool is relevant. The selector keeps a BM25 index over tool
+    names, descriptions and parameters, rebuilt only when the tool list
+    changes, and offers the top `top_k` tools for the latest user message
+    plus the pinned ones, in catalog order. When fewer than `top_k` tools
+    match, the rest of the slots go to other tools of the matching servers
+    (a server's tools tend to be used together). When nothing matches (e.g.
+    a bare "yes, do it") or the catalog is no larger than `min_tools`, the
+    full set is offered.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        top_k: Optional[int] = None,
+        min_tools: Optional[int] = None,
+        pinned: Optional[list[str]] = None,
+    ):
+        self.enabled = settings.tool_selection_enabled if enabled is None else enabled
+        self.top_k = settings.tool_selection_top_k if top_k is None else top_k
+        self.min_tools = settings.tool_selection_min_tools if min_tools is None else min_tools
+        self.pinned = settings.tool_selection_pinned_list if pinned is None else list(pinned)
+        self._tools_ref: Optional[Sequence[dict[str, Any]]] = None
+        self._index: Optional[_Index] = None
+        self._pinned: set[int] = set()
+        self._by_server: dict[Any, list[int]] = {}
+
+        # Counters
+        self.requests = 0
+        self.outcomes = {"selected": 0, "fallback": 0, "all": 0}
+        self.tools_offered = 0
+        self.tokens_saved = 0
+
+    def _index_for(self, tools: Sequence[dict[str, Any]]) -> _Index:
+        # The registry hands out a new snapshot whenever the tool list changes
+        if tools is not self._tools_ref:
+            self._index = _Index(tools)
+            self._tools_ref = tools
+            self._pinned = {
+                index
+                for index, tool in enumerate(tools)
+                if any(
+                    fnmatchcase(tool["name"], pattern)
+                    or fnmatchcase(f"{tool.get('server')}.{tool.get('mcp_name')}", pattern)
+                    for pattern in self.pinned
+                )
+            }
+            self._by_server = {}
+            for index, tool in enumerate(tools):
+                self._by_server.setdefault(tool.get("server"), []).append(index)
+            logger.info(
+                "Built tool selection index",
+                extra={"tools": len(tools), "terms": len(self._index.spans), "numpy": np is not None},
+            )
+        return self._index
+
+    @staticmethod
+    def _query(messages: list[dict[str, Any]]) -> str:
+        for message in reversed(messages):
+            if message["role"] == "user":
+                return message.get("content") or ""
+        return ""
+
+    def select(
+        self,
+        tools: Sequence[dict[str, Any]],
+        messages: list[dict[str, Any]],
+    ) -> tuple[Sequence[dict[str, Any]], dict]:
+        """
+        The tools to offer for a conversation.
+
+        Args:
+            tools: The full catalog (registry snapshot)
+            messages: Conversation so far; the latest user message is the query
+
+        Returns:
+            The tools to offer (the catalog itself unless a subset was
+            selected) and a report with the outcome, tool counts and
+            estimated declaration tokens before and after
+        """
+        report = {"outcome": "all", "tools_before": len(tools), "tools_after": len(tools), "tokens_saved": 0}
+        if not self.enabled or not tools:
+            return tools, report
+        self.requests += 1
+        if len(tools) <= max(self.min_tools, self.top_k):
+            self.outcomes["all"] += 1
+            self.tools_offered += len(tools)
+            return tools, report
+
+        index = self._index_for(tools)
+        top = index.top(index.scores(self._query(messages)), self.top_k, self._pinned)
+        if not top:
+            report["outcome"] = "fallback"
+            self.outcomes["fallback"] += 1
+            self.tools_offered += len(tools)
+            return tools, report
+
+        if len(top) < self.top_k:
+            taken = self._pinned.union(top)
+            for server in dict.fromkeys(tools[i].get("server") for i in list(top)):
+                siblings = [i for i in self._by_server[server] if i not in taken]
+                top.extend(siblings[: self.top_k - len(top)])
+                taken.update(siblings)
+        chosen = sorted(self._pinned.union(top))
+        selected = tuple(tools[i] for i in chosen)
+        report.update(
+            outcome="selected",
+            tools_after=len(selected),
+            tokens_saved=sum(index.tokens) - sum(index.tokens[i] for i in chosen),
+        )
+        self.outcomes["selected"] += 1
+        self.tools_offered += len(selected)
+        self.tokens_saved += report["tokens_saved"]
+        return selected, report
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "top_k": self.top_k,
+            "requests": self.requests,
+            **self.outcomes,
+            "avg_tools_offered": round(self.tools_offered / self.requests, 1) if self.requests else None,
+            "tokens_saved": self.tokens_saved,
+            "indexed_tools": self._index.size if self._index else 0,
+            "numpy": np is not None,
+        }
+
+
+# Global tool selector instance
+tool_selector = ToolSelector()
@@ -0,0 +1,65 @@
+"""
+Batch job mode: run a JSONL file of chat requests without the HTTP server.
+
+Each input line is a chat request (`messages`, `model`, optional `id` and
+`conversation_id`). Results are appended to the output file as JSONL as they
+finish. Rerunning with the same files resumes an interrupted job: requests
+that already have an `ok` result are skipped.
+
+Usage:
+    python batch.py requests.jsonl results.jsonl
+    python batch.py requests.jsonl results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+
+from app.core.logger import get_logger, setup_logging, shutdown_logging
+from app.core.providers import provider_registry
+from app.services.batch import batch_runner
+from app.services.conversation_store import conversation_store
+from app.services.mcp_service import mcp_service
+
+
+logger = get_logger(__name__)
+
+
+async def run(args) -> dict:
+    # Same startup as the server lifespan
+    await provider_registry.start()
+    await conversation_store.start()
+    try:
+        await mcp_service.initialize()
+    except Exception as e:
+        logger.warning(
+            "MCP service initialization failed; continuing without MCP support",
+            extra={"error": str(e)}
+        )
+    try:
+        return await batch_runner.run_file(args.input, args.output, concurrency=args.concurrency)
+    finally:
+        await mcp_service.close()
+        await provider_registry.close()
+        await conversation_store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of chat requests")
+    parser.add_argument("output", help="JSONL results file (appended to; resumes a previous run)")
+    parser.add_argument("--concurrency", type=int, default=None, help="generations at once (default BATCH_CONCURRENCY)")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        counts = asyncio.run(run(args))
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"batch: {e}\n")
+    finally:
+        shutdown_logging()
+    print(json.dumps(counts))
+    raise SystemExit(1 if counts["error"] else 0)
+
+
+if __name__ == "__main__":
+    main()
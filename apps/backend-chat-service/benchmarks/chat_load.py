@@ -0,0 +1,231 @@
+"""
+Load test and latency benchmark for POST /api/chat.
+
+By default the app runs in-process (uvicorn on a background thread, with an
+event-loop lag monitor on the server's loop) and both providers are replaced
+by deterministic fakes, so results reflect the backend itself. Results are
+printed as JSON so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.chat_load --requests 500 --concurrency 50
+    python -m benchmarks.chat_load --mcp fake --tool-call read_file
+    python -m benchmarks.chat_load --url http://localhost:8000 --model ollama:llama3.2:3b
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from benchmarks.stats import summarize_ms
+
+
+class ServerThread(threading.Thread):
+    """Runs the FastAPI app under uvicorn on its own event loop."""
+
+    def __init__(self, app, port: int, lag_interval: float = 0.01):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        )
+        self.lag_interval = lag_interval
+        self.lag_samples: list[float] = []
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        monitor = asyncio.create_task(self._monitor())
+        try:
+            await self.server.serve()
+        finally:
+            monitor.cancel()
+
+    async def _monitor(self):
+        """Sample how late the loop wakes up from a fixed-interval sleep."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(max(0.0, loop.time() - started - self.lag_interval))
+
+    def wait_started(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError("Benchmark server failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=30)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_mcp(mode: str, latency: float):
+    """Point MCP_SERVERS at the fake server (or nothing) before the app is imported."""
+    if mode == "none":
+        os.environ["MCP_SERVERS"] = "[]"
+    elif mode == "fake":
+        os.environ["MCP_SERVERS"] = json.dumps([{
+            "name": "filesystem",
+            "command": sys.executable,
+            "args": ["-m", "benchmarks.fake_mcp_server", "--latency", str(latency)],
+            "env": None,
+        }])
+
+
+async def _one_request(client: httpx.AsyncClient, url: str, body: dict) -> dict:
+    started = time.perf_counter()
+    arrivals: list[float] = []
+    chars = 0
+    try:
+        async with client.stream("POST", url, json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("0:"):
+                    arrivals.append(time.perf_counter())
+                    chars += len(json.loads(line[2:]))
+    except Exception as e:
+        return {"error": repr(e)}
+
+    finished = time.perf_counter()
+    return {
+        "ttft": arrivals[0] - started if arrivals else None,
+        "inter_frame": [b - a for a, b in zip(arrivals, arrivals[1:])],
+        "latency": finished - started,
+        "frames": len(arrivals),
+        "chars": chars,
+    }
+
+
+async def drive(base_url: str, args) -> dict:
+    """Send args.requests chat requests at args.concurrency and aggregate results."""
+    url = f"{base_url}/api/chat"
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    def body(index: int) -> dict:
+        # Distinct prompts unless --same-prompt, so response caching doesn't skew results
+        content = args.prompt if args.same_prompt else f"{args.prompt} #{index}"
+        request = {"messages": [{"role": "user", "content": content}], "model": args.model}
+        if args.flush_ms is not None:
+            request["stream_options"] = {"flush_interval_ms": args.flush_ms}
+        return request
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+        for index in range(args.warmup):
+            await _one_request(client, url, body(-index - 1))
+
+        async def bounded(index: int) -> dict:
+            async with semaphore:
+                return await _one_request(client, url, body(index))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+        duration = time.perf_counter() - started
+
+    ok = [r for r in results if "error" not in r]
+    errors = [r["error"] for r in results if "error" in r]
+    frames = sum(r["frames"] for r in ok)
+    chars = sum(r["chars"] for r in ok)
+    return {
+        "requests": len(results),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "duration_s": round(duration, 3),
+        "throughput": {
+            "requests_per_s": round(len(ok) / duration, 2),
+            "frames_per_s": round(frames / duration, 2),
+            "chars_per_s": round(chars / duration, 2),
+        },
+        "ttft": summarize_ms([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "inter_frame": summarize_ms([gap for r in ok for gap in r["inter_frame"]]),
+        "latency": summarize_ms([r["latency"] for r in ok]),
+    }
+
+
+def main(args):
+    report = {
+        "commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+
+    if args.url:
+        report.update(asyncio.run(drive(args.url.rstrip("/"), args)))
+        report["event_loop_lag"] = None
+    else:
+        _configure_mcp(args.mcp, args.mcp_latency)
+
+        from main import app
+        from app.core.providers import provider_registry
+        from benchmarks.fake_providers import FakeLLM
+
+        fake = FakeLLM(
+            tokens=args.tokens,
+            tokens_per_second=args.token_rate,
+            first_token_delay=args.first_token_delay,
+            tool_call=args.tool_call,
+        )
+        provider_registry.register("gemini", fake)
+        provider_registry.register("ollama", fake)
+
+        server = ServerThread(app, _free_port())
+        server.start()
+        try:
+            server.wait_started()
+            report.update(asyncio.run(drive(f"http://127.0.0.1:{server.server.config.port}", args)))
+            report["event_loop_lag"] = summarize_ms(server.lag_samples)
+        finally:
+            server.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--model", default="gemini-2.0-flash-exp")
+    parser.add_argument("--prompt", default="Hello, benchmark")
+    parser.add_argument("--same-prompt", action="store_true", help="send identical prompts")
+    parser.add_argument("--tokens", type=int, default=50, help="fake provider tokens per response")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake provider tokens/sec")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--flush-ms", type=int, default=None,
+                        help="per-request stream coalescing window (0: one frame per chunk)")
+    parser.add_argument("--tool-call", default=None, help="have the fake model call this tool first")
+    parser.add_argument("--mcp", choices=["none", "fake", "config"], default="none",
+                        help="MCP servers: none, the fake stdio server, or the app's configuration")
+    parser.add_argument("--mcp-latency", type=float, default=0.0)
+    parser.add_argument("--url", default=None, help="benchmark an already running server instead")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+"""
+Client-disconnect scenario for POST /api/chat.
+
+Opens streams against the in-process app with a slow fake provider, reads a
+few chunks (or none, while a tool call is still running) and then drops the
+connection. Reports how many tokens the provider kept generating after the
+clients left and the cancellation metrics the server recorded; with working
+cancellation `tokens_after_disconnect` stays near zero.
+
+Usage:
+    python -m benchmarks.disconnect --streams 20 --read-chunks 5
+    python -m benchmarks.disconnect --tool-call read_file --mcp-latency 5 --read-chunks 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from benchmarks.chat_load import ServerThread, _configure_mcp, _free_port, _git_commit
+
+
+async def _abandon(client: httpx.AsyncClient, url: str, body: dict, read_chunks: int, hold: float):
+    """Read `read_chunks` chunks (or wait `hold` seconds when 0), then disconnect."""
+    async with client.stream("POST", url, json=body) as response:
+        response.raise_for_status()
+        if read_chunks <= 0:
+            await asyncio.sleep(hold)
+            return
+        seen = 0
+        async for line in response.aiter_lines():
+            if line.startswith("0:"):
+                seen += 1
+                if seen >= read_chunks:
+                    return
+
+
+def _metric_total(text: str, name: str) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(name) and not line.startswith("#")
+    )
+
+
+async def drive(base_url: str, fake, args) -> dict:
+    url = f"{base_url}/api/chat"
+
+    def body(index: int) -> dict:
+        return {"messages": [{"role": "user", "content": f"disconnect #{index}"}], "model": args.model}
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _abandon(client, url, body(i), args.read_chunks, args.hold) for i in range(args.streams)
+        ))
+        disconnected_after = time.perf_counter() - started
+        generated_at_disconnect = fake.generated
+
+        # Give the server time to notice; anything generated now is waste
+        await asyncio.sleep(args.settle)
+        metrics = (await client.get(f"{base_url}/metrics")).text
+
+    return {
+        "streams": args.streams,
+        "disconnected_after_s": round(disconnected_after, 3),
+        "tokens_generated": fake.generated,
+        "tokens_after_disconnect": fake.generated - generated_at_disconnect,
+        "tokens_if_uncancelled": args.streams * args.tokens if not args.tool_call else None,
+        "cancelled_streams": _metric_total(metrics, "chat_cancelled_streams_total"),
+        "cancelled_tokens_saved": _metric_total(metrics, "chat_cancelled_tokens_saved_total"),
+        "cancelled_tool_calls": _metric_total(
+            metrics, 'mcp_tool_call_duration_seconds_count{server="filesystem",tool="read_file",status="cancelled"}'
+        ),
+    }
+
+
+def main(args):
+    _configure_mcp(args.mcp if args.tool_call else "none", args.mcp_latency)
+    # Every call must really run so there is something to cancel
+    os.environ["TOOL_CACHE_ENABLED"] = "false"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+    from main import app
+    from app.core.providers import provider_registry
+    from benchmarks.fake_providers import FakeLLM
+
+    fake = FakeLLM(
+        tokens=args.tokens,
+        tokens_per_second=args.token_rate,
+        first_token_delay=args.first_token_delay,
+        tool_call=args.tool_call,
+    )
+    provider_registry.register("gemini", fake)
+    provider_registry.register("ollama", fake)
+
+    server = ServerThread(app, _free_port())
+    server.start()
+    try:
+        server.wait_started()
+        report = asyncio.run(drive(f"http://127.0.0.1:{server.server.config.port}", fake, args))
+    finally:
+        server.stop()
+
+    report = {"commit": _git_commit(), "config": vars(args), **report}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate clients disconnecting mid-stream")
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--read-chunks", type=int, default=5, help="chunks to read before disconnecting (0: none)")
+    parser.add_argument("--hold", type=float, default=0.5, help="seconds to wait before disconnecting with --read-chunks 0")
+    parser.add_argument("--settle", type=float, default=1.0)
+    parser.add_argument("--model", default="gemini-2.0-flash-exp")
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--token-rate", type=float, default=50.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--tool-call", default=None, help="have the fake model call this tool first")
+    parser.add_argument("--mcp", choices=("fake", "config"), default="fake")
+    parser.add_argument("--mcp-latency", type=float, default=5.0)
+    main(parser.parse_args())
@@ -0,0 +1,43 @@
+"""
+Fake MCP stdio server for benchmarks.
+
+Exposes filesystem- and postgres-like tools with a configurable latency so
+MCP session pooling, caching and the tool loop can be measured without npx.
+
+Usage (as an MCP server command):
+    python -m benchmarks.fake_mcp_server --latency 0.01
+"""
+import argparse
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+
+def build_server(latency: float) -> FastMCP:
+    server = FastMCP("fake")
+
+    @server.tool()
+    async def read_file(path: str) -> str:
+        """Read a file (fake)."""
+        await asyncio.sleep(latency)
+        return f"contents of {path}\n" * 20
+
+    @server.tool()
+    async def list_directory(path: str = ".") -> str:
+        """List a directory (fake)."""
+        await asyncio.sleep(latency)
+        return "\n".join(f"[FILE] file{i}.txt" for i in range(20))
+
+    @server.tool()
+    async def query(sql: str) -> str:
+        """Run a read-only SQL query (fake)."""
+        await asyncio.sleep(latency)
+        return '[{"id": 1, "name": "Alice"}, {"id": 2, "name": "Bob"}]'
+
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake MCP stdio server")
+    parser.add_argument("--latency", type=float, default=0.0)
+    build_server(parser.parse_args().latency).run()
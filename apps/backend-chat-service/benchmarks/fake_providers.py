@@ -0,0 +1,65 @@
+"""
+Deterministic fake LLM providers for benchmarks.
+
+They follow the same `generate_stream(messages, model_name, tools)` contract
+as GeminiLLM and OllamaLLM, with configurable first-token delay and token
+rate, so the rest of the chat pipeline can be measured without a model.
+"""
+import asyncio
+import os
+from typing import Any, AsyncGenerator, Optional, Union
+
+from app.models.chat import ToolCall
+
+
+class FakeLLM:
+    """Streams a fixed number of tokens at a fixed rate."""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        tokens: int = 50,
+        tokens_per_second: float = 200.0,
+        first_token_delay: float = 0.05,
+        token_text: str = "lorem ",
+        tool_call: Optional[str] = None,
+    ):
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+        self.token_text = token_text
+        # Name of a tool to call once before answering (exercises the tool loop)
+        self.tool_call = tool_call
+        self.generation_config = {"fake": True, "tokens": tokens}
+        # Tokens actually produced, to check how quickly cancellation stops work
+        self.generated = 0
+
+    async def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        model_name: str,
+        tools: list[dict[str, Any]] = None
+    ) -> AsyncGenerator[Union[str, ToolCall], None]:
+        await asyncio.sleep(self.first_token_delay)
+
+        if self.tool_call and tools and messages[-1]["role"] != "tool":
+            yield ToolCall(name=self.tool_call, arguments={"path": "sample.txt"})
+            return
+
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for index in range(self.tokens):
+            if index and interval:
+                await asyncio.sleep(interval)
+            self.generated += 1
+            yield self.token_text
+
+
+# For servers started as subprocesses (benchmarks.workers):
+# LLM_PROVIDERS=gemini=benchmarks.fake_providers:fake_llm, tuned via FAKE_LLM_* variables
+fake_llm = FakeLLM(
+    tokens=int(os.environ.get("FAKE_LLM_TOKENS", "50")),
+    tokens_per_second=float(os.environ.get("FAKE_LLM_TOKEN_RATE", "200")),
+    first_token_delay=float(os.environ.get("FAKE_LLM_FIRST_TOKEN_DELAY", "0.05")),
+    tool_call=os.environ.get("FAKE_LLM_TOOL_CALL") or None,
+)
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark for parsing Ollama's NDJSON stream.
+
+Replays recorded stream fixtures (benchmarks/fixtures/*.ndjson) through:
+
+- ``lines+json``: what `aiter_lines()` + `json.loads` did (decode to str,
+  split lines, decode every frame into a dict)
+- ``bytes+json``: NDJSONStreamParser with stdlib json
+- ``bytes+orjson``: NDJSONStreamParser with orjson (when installed)
+
+Parsing only (no HTTP, no event loop), so differences are per-frame CPU cost.
+Each method's extracted text is checked against the baseline.
+
+Usage:
+    python -m benchmarks.ndjson_parse --repeat 200
+    python -m benchmarks.ndjson_parse --chunk-size 64
+"""
+import argparse
+import codecs
+import json
+import time
+from pathlib import Path
+
+from app.core.ndjson import NDJSONStreamParser, _json_loads, orjson
+from benchmarks.chat_load import _git_commit
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _chunks(data: bytes, chunk_size: int) -> list[bytes]:
+    """Split like the network would: fixed-size reads, or one frame per read when 0."""
+    if chunk_size <= 0:
+        return [line + b"\n" for line in data.split(b"\n") if line]
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def _text_of(frame: dict) -> str:
+    message = frame.get("message") or {}
+    return message.get("content") or ""
+
+
+def lines_json(chunks: list[bytes]) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    out = []
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                out.append(_text_of(json.loads(line)))
+    if pending.strip():
+        out.append(_text_of(json.loads(pending)))
+    return "".join(out)
+
+
+def bytes_parser(decode):
+    def run(chunks: list[bytes]) -> str:
+        parser = NDJSONStreamParser(decode)
+        out = []
+        for chunk in chunks:
+            for frame in parser.feed(chunk):
+                out.append(_text_of(frame))
+        for frame in parser.flush():
+            out.append(_text_of(frame))
+        return "".join(out)
+    return run
+
+
+def measure(run, chunks: list[bytes], repeat: int) -> float:
+    """Best-of-3 seconds for `repeat` passes over the fixture."""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run(chunks)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(args):
+    methods = {"lines+json": lines_json, "bytes+json": bytes_parser(_json_loads)}
+    if orjson is not None:
+        methods["bytes+orjson"] = bytes_parser(orjson.loads)
+
+    results = {}
+    for path in sorted(FIXTURES.glob("*.ndjson")):
+        data = path.read_bytes()
+        frames = data.count(b"\n")
+        chunks = _chunks(data, args.chunk_size)
+        expected = lines_json(chunks)
+        fixture = {"frames": frames, "bytes": len(data)}
+        baseline = None
+        for name, run in methods.items():
+            assert run(chunks) == expected, f"{name} disagrees with the baseline on {path.name}"
+            seconds = measure(run, chunks, args.repeat)
+            baseline = baseline or seconds
+            fixture[name] = {
+                "us_per_frame": round(seconds / (args.repeat * frames) * 1e6, 3),
+                "mb_per_s": round(len(data) * args.repeat / seconds / 1e6, 1),
+                "speedup": round(baseline / seconds, 2),
+            }
+        results[path.stem] = fixture
+
+    report = {"commit": _git_commit(), "config": vars(args), "orjson": orjson is not None, "fixtures": results}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="passes over each fixture per timing")
+    parser.add_argument("--chunk-size", type=int, default=0, help="bytes per read (0: one frame per read)")
+    main(parser.parse_args())
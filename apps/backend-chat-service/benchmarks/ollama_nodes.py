@@ -0,0 +1,107 @@
+"""
+Multi-node Ollama routing scenario.
+
+Starts several stub Ollama servers, each with different models loaded (a
+cold load costs --cold-load seconds before the first token), and sends a mix
+of requests for those models through one OllamaLLM. Compares routing with
+node polling (model affinity) against the same pool without polling, and
+can stop a node halfway through to exercise ejection.
+
+Usage:
+    python -m benchmarks.ollama_nodes --requests 200 --concurrency 16
+    python -m benchmarks.ollama_nodes --kill-node
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.ollama import OllamaLLM
+from benchmarks.chat_load import _git_commit
+from benchmarks.stats import percentile
+from benchmarks.stub_ollama import StubOllamaServer
+
+MODELS = ["llama3.2:3b", "qwen2.5:7b", "mistral:7b"]
+
+
+def _stubs(args) -> list[StubOllamaServer]:
+    """One node per model with that model loaded, plus a node with everything installed but nothing loaded."""
+    nodes = [
+        StubOllamaServer(tokens=args.tokens, models=MODELS, resident=[model], cold_load_delay=args.cold_load)
+        for model in MODELS
+    ]
+    nodes.append(StubOllamaServer(tokens=args.tokens, models=MODELS, cold_load_delay=args.cold_load))
+    return nodes
+
+
+async def run(args, poll: bool) -> dict:
+    stubs = _stubs(args)
+    for stub in stubs:
+        await stub.start()
+    llm = OllamaLLM(base_urls=[stub.base_url for stub in stubs])
+    if poll:
+        await llm.start()
+        await llm.nodes.refresh(llm.client)
+    else:
+        # Shared client without the poller: placement is unknown, least-outstanding only
+        llm.client = llm._build_client()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    messages = [{"role": "user", "content": "hello"}]
+
+    async def one(index: int) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            ttft = None
+            try:
+                async for _ in llm.generate_stream(messages, MODELS[index % len(MODELS)]):
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+            except Exception as e:
+                return {"error": str(e)}
+            return {"ttft": ttft}
+
+    async def kill_later():
+        await asyncio.sleep(args.kill_after)
+        await stubs[0].close()
+
+    try:
+        killer = asyncio.create_task(kill_later()) if args.kill_node else None
+        results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+        if killer is not None:
+            await killer
+    finally:
+        await llm.close()
+        for stub in stubs:
+            await stub.close()
+
+    ttfts = [r["ttft"] for r in results if r.get("ttft") is not None]
+    return {
+        "errors": sum(1 for r in results if "error" in r),
+        "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1) if ttfts else None,
+        "ttft_p99_ms": round(percentile(ttfts, 99) * 1000, 1) if ttfts else None,
+        "cold_loads": sum(stub.cold_loads for stub in stubs),
+        "requests_per_node": [stub.requests for stub in stubs],
+        "nodes": llm.nodes.stats(),
+    }
+
+
+async def main(args):
+    report = {
+        "commit": _git_commit(),
+        "config": vars(args),
+        "polled": await run(args, poll=True),
+        "unpolled": await run(args, poll=False),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--cold-load", type=float, default=0.5, help="seconds a cold model load adds to TTFT")
+    parser.add_argument("--kill-node", action="store_true", help="stop the first node mid-run")
+    parser.add_argument("--kill-after", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
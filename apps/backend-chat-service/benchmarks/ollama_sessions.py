@@ -0,0 +1,105 @@
+"""
+Multi-turn Ollama conversations across several nodes.
+
+Starts stub Ollama nodes that simulate Ollama's prompt cache (a few slots
+per node; a request only evaluates what its slot doesn't already hold, at
+--prompt-eval-rate tokens/s) and runs --conversations concurrent
+conversations of --turns turns each through one OllamaLLM. Every turn
+resends the whole history, as the chat endpoint does. Compares sticky
+sessions (each conversation tagged with a session key) against the same
+traffic without one: prompt tokens evaluated, TTFT and the savings
+OllamaSessions reported.
+
+Usage:
+    python -m benchmarks.ollama_sessions --conversations 10 --turns 8
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.core.ollama import OllamaLLM
+from app.core.tracing import set_session
+from benchmarks.chat_load import _git_commit
+from benchmarks.stats import percentile
+from benchmarks.stub_ollama import StubOllamaServer
+
+MODEL = "llama3.2:3b"
+
+
+async def run(args, sticky: bool) -> dict:
+    stubs = [
+        StubOllamaServer(
+            tokens=args.tokens,
+            resident=[MODEL],
+            prompt_cache_slots=args.slots,
+            prompt_eval_rate=args.prompt_eval_rate,
+        )
+        for _ in range(args.nodes)
+    ]
+    for stub in stubs:
+        await stub.start()
+    llm = OllamaLLM(base_urls=[stub.base_url for stub in stubs])
+    await llm.start()
+    await llm.nodes.refresh(llm.client)
+    rng = random.Random(0)
+    ttfts: list[float] = []
+
+    async def conversation(index: int):
+        # Tasks copy the context, so the key only tags this conversation's requests
+        set_session(f"bench:{index}" if sticky else None)
+        messages = [{"role": "system", "content": "You are a helpful assistant. " * 20}]
+        for turn in range(args.turns):
+            messages.append({"role": "user", "content": f"Question {index}.{turn}: " + "lorem ipsum " * args.user_words})
+            started = time.perf_counter()
+            reply = []
+            async for chunk in llm.generate_stream(messages, MODEL):
+                if not reply:
+                    ttfts.append(time.perf_counter() - started)
+                reply.append(chunk)
+            messages.append({"role": "assistant", "content": "".join(reply)})
+            await asyncio.sleep(rng.uniform(0, args.think_time))
+
+    try:
+        await asyncio.gather(*(conversation(i) for i in range(args.conversations)))
+    finally:
+        await llm.close()
+        for stub in stubs:
+            await stub.close()
+
+    prompt = sum(stub.prompt_tokens for stub in stubs)
+    evaluated = sum(stub.prompt_tokens_evaluated for stub in stubs)
+    return {
+        "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1),
+        "ttft_p99_ms": round(percentile(ttfts, 99) * 1000, 1),
+        "prompt_tokens": prompt,
+        "prompt_tokens_evaluated": evaluated,
+        "prompt_tokens_cached_pct": round(100 * (1 - evaluated / prompt), 1) if prompt else None,
+        "requests_per_node": [stub.requests for stub in stubs],
+        "keep_alive_sent": sorted({str(value) for stub in stubs for value in stub.keep_alive}),
+        "sessions": llm.sessions.stats(),
+    }
+
+
+async def main(args):
+    report = {
+        "commit": _git_commit(),
+        "config": vars(args),
+        "sticky": await run(args, sticky=True),
+        "unkeyed": await run(args, sticky=False),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=4, help="prompt cache slots per node (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--user-words", type=int, default=60, help="words per user message (x2)")
+    parser.add_argument("--tokens", type=int, default=40, help="reply tokens per turn")
+    parser.add_argument("--prompt-eval-rate", type=float, default=4000.0, help="simulated prompt tokens/s")
+    parser.add_argument("--think-time", type=float, default=0.2, help="max pause between turns (s)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Time-to-first-token benchmark for the Ollama provider.
+
+Compares a short-lived httpx client per request (the provider's behaviour
+outside the app lifespan) against the shared, connection-pooled client.
+
+Usage:
+    python -m benchmarks.ollama_ttft --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.core.ollama import OllamaLLM
+from benchmarks.stats import percentile
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+async def measure(llm: OllamaLLM, requests: int, concurrency: int) -> list[float]:
+    """Return time-to-first-token (seconds) for each request."""
+    semaphore = asyncio.Semaphore(concurrency)
+    messages = [{"role": "user", "content": "hello"}]
+
+    async def one() -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            ttft = None
+            async for _ in llm.generate_stream(messages, "stub-model"):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+            return ttft
+
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+async def main(args):
+    server = StubOllamaServer(tokens=args.tokens, first_token_delay=args.first_token_delay)
+    await server.start()
+    try:
+        results = {}
+
+        per_request = OllamaLLM(base_url=server.base_url)
+        server.connections = 0
+        results["per_request_client"] = summarize(
+            await measure(per_request, args.requests, args.concurrency)
+        )
+        results["per_request_client"]["connections"] = server.connections
+
+        shared = OllamaLLM(base_url=server.base_url)
+        await shared.start()
+        server.connections = 0
+        try:
+            results["shared_client"] = summarize(
+                await measure(shared, args.requests, args.concurrency)
+            )
+            results["shared_client"]["connections"] = server.connections
+        finally:
+            await shared.close()
+
+        print(json.dumps(results, indent=2))
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
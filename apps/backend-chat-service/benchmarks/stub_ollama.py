@@ -0,0 +1,225 @@
+"""
+Minimal stub of Ollama's `/api/chat` streaming endpoint.
+
+Speaks just enough HTTP/1.1 (keep-alive + chunked transfer encoding) to be
+driven by httpx, with no third-party dependencies.
+"""
+import asyncio
+import json
+from typing import Optional
+
+
+class StubOllamaServer:
+    """
+    Serves NDJSON chat streams with a configurable token count and delays.
+
+    Also answers GET /api/ps and /api/tags. A model not yet in `resident`
+    pays `cold_load_delay` before its first token and is resident afterwards,
+    like a real Ollama loading a model into memory.
+
+    With `prompt_cache_slots` set, prompt evaluation is simulated too: each
+    slot remembers the last conversation it processed (prompt and reply), a
+    request takes the free slot sharing the longest message prefix with it
+    and only evaluates the rest, at `prompt_eval_rate` tokens/s (~4
+    characters per token). The stats frame reports the tokens actually
+    evaluated.
+
+    With `error_status` set (e.g. 500), every chat request gets that status,
+    like a node that is up but failing.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tokens: int = 20,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0,
+        models: Optional[list[str]] = None,
+        resident: Optional[list[str]] = None,
+        cold_load_delay: float = 0.0,
+        prompt_cache_slots: int = 0,
+        prompt_eval_rate: float = 2000.0,
+        error_status: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.resident = set(resident or [])
+        # None: any model is installed
+        self.models = None if models is None else set(models) | self.resident
+        self.cold_load_delay = cold_load_delay
+        self.prompt_cache_slots = prompt_cache_slots
+        self.prompt_eval_rate = prompt_eval_rate
+        self.error_status = error_status
+        # model -> slots, least recently used first; a slot is the message list it holds
+        self._slots: dict[str, list[list[tuple]]] = {}
+        self._busy: set[int] = set()
+        self.prompt_tokens = 0
+        self.prompt_tokens_evaluated = 0
+        self.keep_alive: list = []
+        self.connections = 0
+        self.requests = 0
+        self.cold_loads = 0
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            # Drop keep-alive connections too, like a node going down
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    @staticmethod
+    def _message_tokens(message: tuple) -> int:
+        return len(message[1]) // 4 + 1 + 4
+
+    def _evaluate_prompt(self, model: str, messages: list[dict]) -> tuple[int, Optional[list[tuple]]]:
+        """Tokens of `messages` not already in a cache slot, and the slot that now holds them."""
+        prompt = [(msg.get("role"), msg.get("content") or "") for msg in messages]
+        total = sum(self._message_tokens(msg) for msg in prompt)
+        self.prompt_tokens += total
+        if not self.prompt_cache_slots:
+            return 10, None
+
+        def shared(slot: list[tuple]) -> int:
+            count = 0
+            for held, wanted in zip(slot, prompt):
+                if held != wanted:
+                    break
+                count += 1
+            return count
+
+        slots = self._slots.setdefault(model, [])
+        free = [slot for slot in slots if id(slot) not in self._busy]
+        best = max(free, key=shared, default=None)
+        if best is None or not shared(best):
+            if len(slots) < self.prompt_cache_slots:
+                best = []
+            elif free:
+                best = free[0]
+            else:
+                # Every slot busy: nothing cached for this one
+                self.prompt_tokens_evaluated += total
+                return total, None
+        if best in slots:
+            slots.remove(best)
+        cached = sum(self._message_tokens(msg) for msg in prompt[:shared(best)])
+        best[:] = prompt
+        slots.append(best)
+        self._busy.add(id(best))
+        evaluated = total - cached
+        self.prompt_tokens_evaluated += evaluated
+        return evaluated, best
+
+    def _release_slot(self, slot: Optional[list[tuple]]):
+        """Free the slot that served a request; it also holds the generated reply."""
+        if slot is not None:
+            slot.append(("assistant", "".join(f"tok{i} " for i in range(self.tokens))))
+            self._busy.discard(id(slot))
+
+    def frames(self, model: str, prompt_eval_count: int = 10) -> list[bytes]:
+        """NDJSON frames for one response, ending with Ollama's stats frame."""
+        lines = [
+            {"model": model, "message": {"role": "assistant", "content": f"tok{i} "}, "done": False}
+            for i in range(self.tokens)
+        ]
+        lines.append({
+            "model": model,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "total_duration": 1000000,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": int(prompt_eval_count / self.prompt_eval_rate * 1e9),
+            "eval_count": self.tokens,
+            "eval_duration": 900000,
+        })
+        return [json.dumps(line).encode() + b"\n" for line in lines]
+
+    def _listing(self, path: str) -> dict:
+        """/api/ps: loaded models; /api/tags: installed models."""
+        names = self.resident if path == "/api/ps" else (self.models or self.resident)
+        return {"models": [{"name": name, "model": name} for name in sorted(names)]}
+
+    @staticmethod
+    def _write_json(writer: asyncio.StreamWriter, payload: dict, status: bytes = b"200 OK"):
+        body = json.dumps(payload).encode()
+        writer.write(
+            b"HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+            % (status, len(body), body)
+        )
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path = lines[0].split(" ")[:2]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if method == "GET":
+                    self._write_json(writer, self._listing(path))
+                    await writer.drain()
+                    continue
+
+                request = json.loads(body or b"{}")
+                model = request.get("model", "stub")
+                self.requests += 1
+                if self.error_status is not None:
+                    self._write_json(writer, {"error": "internal error"}, b"%d Error" % self.error_status)
+                    await writer.drain()
+                    continue
+                if self.models is not None and model not in self.models:
+                    self._write_json(writer, {"error": f"model '{model}' not found"}, b"404 Not Found")
+                    await writer.drain()
+                    continue
+
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/x-ndjson\r\n"
+                    b"Transfer-Encoding: chunked\r\n\r\n"
+                )
+                await writer.drain()
+
+                delay = self.first_token_delay
+                if model not in self.resident:
+                    self.cold_loads += 1
+                    self.resident.add(model)
+                    delay += self.cold_load_delay
+                self.keep_alive.append(request.get("keep_alive"))
+                messages = request.get("messages") or []
+                evaluated, slot = self._evaluate_prompt(model, messages)
+                if self.prompt_cache_slots:
+                    delay += evaluated / self.prompt_eval_rate
+                await asyncio.sleep(delay)
+                self._release_slot(slot)
+                for frame in self.frames(model, evaluated):
+                    writer.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                    await writer.drain()
+                    if self.token_delay:
+                        await asyncio.sleep(self.token_delay)
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
@@ -0,0 +1,184 @@
+"""
+Tool selection on a large MCP catalog.
+
+Builds a catalog of realistic tools (filesystem, git, postgres, GitHub,
+Slack, calendar, browser, ...) padded with --filler generated tools, then
+runs a set of user messages with a known right tool through ToolSelector.
+Reports recall (the right tool was offered), tools and estimated
+declaration tokens per request with and without selection, the compiled
+Gemini/Ollama-style declaration bytes, index build time and per-request
+selection latency.
+
+Usage:
+    python -m benchmarks.tool_selection --filler 200 --top-k 8
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services import tool_selector as selector_module
+from app.services.tool_selector import ToolSelector
+from benchmarks.chat_load import _git_commit
+from benchmarks.stats import percentile
+
+CATALOG = {
+    "filesystem": {
+        "read_file": "Read the complete contents of a file from the file system",
+        "write_file": "Create a new file or completely overwrite an existing file with new content",
+        "list_directory": "Get a detailed listing of all files and directories in a specified path",
+        "search_files": "Recursively search for files and directories matching a pattern",
+        "move_file": "Move or rename files and directories",
+        "get_file_info": "Retrieve metadata about a file or directory: size, creation time, permissions",
+    },
+    "git": {
+        "git_status": "Shows the working tree status of a git repository",
+        "git_diff": "Shows differences between commits, the index and the working tree",
+        "git_commit": "Records changes to the repository with a commit message",
+        "git_log": "Shows the commit history of the repository",
+        "git_create_branch": "Creates a new branch from an optional base branch",
+    },
+    "postgres": {
+        "query": "Run a read-only SQL query against the database",
+        "list_tables": "List the tables in the database schema",
+        "describe_table": "Show the columns and types of a database table",
+    },
+    "github": {
+        "create_issue": "Create a new issue in a GitHub repository",
+        "list_pull_requests": "List pull requests in a GitHub repository",
+        "merge_pull_request": "Merge a pull request",
+        "search_code": "Search for code across GitHub repositories",
+    },
+    "slack": {
+        "send_message": "Post a message to a Slack channel",
+        "list_channels": "List public channels in the Slack workspace",
+        "get_thread_replies": "Get all replies in a Slack message thread",
+    },
+    "calendar": {
+        "create_event": "Create a calendar event with attendees, start and end time",
+        "list_events": "List upcoming calendar events in a date range",
+    },
+    "browser": {
+        "navigate": "Navigate the browser to a URL",
+        "screenshot": "Take a screenshot of the current web page",
+        "click": "Click an element on the web page",
+    },
+    "weather": {
+        "get_forecast": "Get the weather forecast for a location",
+    },
+}
+
+QUERIES = [
+    ("What's in the README.md file?", "read_file"),
+    ("Show me the contents of config/settings.yaml", "read_file"),
+    ("Save this summary into notes.txt", "write_file"),
+    ("Which files are in the src directory?", "list_directory"),
+    ("Find all python files under tests", "search_files"),
+    ("Rename draft.md to final.md", "move_file"),
+    ("How big is the dataset file?", "get_file_info"),
+    ("Do I have uncommitted changes?", "git_status"),
+    ("What changed since the last commit?", "git_diff"),
+    ("Commit these changes with the message 'fix typo'", "git_commit"),
+    ("Show me the recent commit history", "git_log"),
+    ("Start a new branch called feature/login", "git_create_branch"),
+    ("How many users signed up last week? Query the database", "query"),
+    ("What tables does the database have?", "list_tables"),
+    ("What columns are in the orders table?", "describe_table"),
+    ("Open an issue about the broken login page", "create_issue"),
+    ("Which pull requests are open?", "list_pull_requests"),
+    ("Merge PR 42", "merge_pull_request"),
+    ("Search our code for uses of parse_config", "search_code"),
+    ("Tell the team in #general that the deploy is done", "send_message"),
+    ("What Slack channels are there?", "list_channels"),
+    ("Schedule a meeting with Ana tomorrow at 3pm", "create_event"),
+    ("What's on my calendar next week?", "list_events"),
+    ("Go to example.com and take a screenshot", "screenshot"),
+    ("Will it rain in Lisbon tomorrow?", "get_forecast"),
+]
+
+FILLER_WORDS = (
+    "inventory widget invoice ledger shipment warehouse ticket asset license vendor "
+    "contract payroll expense budget forecast lead campaign coupon subscription tenant "
+    "cluster node volume snapshot backup certificate secret token quota region zone"
+).split()
+FILLER_VERBS = "create update delete list get archive restore export import sync approve".split()
+
+
+def _schema(description: str) -> dict:
+    return {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string", "description": f"Identifier for the {description.split()[-1]}"},
+            "options": {"type": "object", "description": "Additional options"},
+        },
+        "required": ["id"],
+    }
+
+
+def build_catalog(filler: int, seed: int = 0) -> tuple[dict, ...]:
+    rng = random.Random(seed)
+    tools = [
+        {"name": name, "description": description, "input_schema": _schema(description), "server": server, "mcp_name": name}
+        for server, entries in CATALOG.items()
+        for name, description in entries.items()
+    ]
+    for i in range(filler):
+        verb, noun, other = rng.choice(FILLER_VERBS), rng.choice(FILLER_WORDS), rng.choice(FILLER_WORDS)
+        name = f"{verb}_{noun}_{i}"
+        description = f"{verb.capitalize()} a {noun} record linked to a {other} in the back office system"
+        tools.append({
+            "name": name, "description": description, "input_schema": _schema(description),
+            "server": f"erp{i % 10}", "mcp_name": name,
+        })
+    rng.shuffle(tools)
+    return tuple(tools)
+
+
+def main(args):
+    catalog = build_catalog(args.filler)
+    selector = ToolSelector(enabled=True, top_k=args.top_k, min_tools=0, pinned=args.pinned)
+
+    started = time.perf_counter()
+    selector._index_for(catalog)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    full_bytes = len(json.dumps(catalog, separators=(",", ":")))
+    latencies, hits, offered, selected_bytes, saved = [], 0, [], [], []
+    for _ in range(args.repeat):
+        for message, expected in QUERIES:
+            started = time.perf_counter()
+            tools, report = selector.select(catalog, [{"role": "user", "content": message}])
+            latencies.append(time.perf_counter() - started)
+            hits += any(tool["name"] == expected for tool in tools)
+            offered.append(len(tools))
+            selected_bytes.append(len(json.dumps(tools, separators=(",", ":"))))
+            saved.append(report["tokens_saved"])
+
+    total_tokens = sum(selector._index.tokens)
+    requests = len(latencies)
+    report = {
+        "commit": _git_commit(),
+        "config": vars(args),
+        "numpy": selector_module.np is not None,
+        "catalog_tools": len(catalog),
+        "index_build_ms": round(build_ms, 2),
+        "select_p50_us": round(percentile(latencies, 50) * 1e6, 1),
+        "select_p99_us": round(percentile(latencies, 99) * 1e6, 1),
+        "recall": round(hits / requests, 3),
+        "tools_offered_avg": round(sum(offered) / requests, 1),
+        "declaration_tokens_full": total_tokens,
+        "declaration_tokens_selected_avg": round(total_tokens - sum(saved) / requests, 1),
+        "declaration_bytes_full": full_bytes,
+        "declaration_bytes_selected_avg": round(sum(selected_bytes) / requests),
+        "outcomes": selector.outcomes,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filler", type=int, default=200, help="generated tools added to the catalog")
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--pinned", type=lambda value: [p for p in value.split(",") if p], default=[])
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,162 @@
+"""
+Multi-worker throughput scenario.
+
+Starts the app as a real multi-process server (`uvicorn --workers N`, fake
+LLM provider, fake MCP server) for each N in --workers and drives it with
+--clients load generator processes (benchmarks.chat_load --url). Reports
+requests/s per worker count, the speedup over one worker, and how many MCP
+server processes were running: with --broker the workers share one broker's
+servers, without it every worker starts its own.
+
+Throughput can only scale up to the number of free CPU cores (the load
+generators need some too).
+
+Usage:
+    python -m benchmarks.workers --workers 1,2,4 --broker
+    python -m benchmarks.workers --workers 1,4 --tool-call read_file --broker
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from app.services.mcp_broker import spawn_broker, stop_broker
+from benchmarks.chat_load import _free_port, _git_commit
+
+
+def _count_processes(fragment: str) -> Optional[int]:
+    """Processes whose command line contains `fragment` (Linux /proc; None elsewhere)."""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    count = 0
+    for entry in proc.iterdir():
+        if entry.name.isdigit():
+            try:
+                if fragment in (entry / "cmdline").read_bytes().replace(b"\0", b" ").decode(errors="replace"):
+                    count += 1
+            except OSError:
+                continue
+    return count
+
+
+def _wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def _drive(base_url: str, args, directory: str) -> dict:
+    """Run --clients load generators in parallel and add up their results."""
+    per_client = max(args.requests // args.clients, 1)
+    outputs = [os.path.join(directory, f"client{i}.json") for i in range(args.clients)]
+    clients = [
+        subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.chat_load", "--url", base_url,
+                "--requests", str(per_client), "--concurrency", str(max(args.concurrency // args.clients, 1)),
+                "--warmup", "2", "--output", output,
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        for output in outputs
+    ]
+    for client in clients:
+        client.wait()
+    reports = [json.loads(Path(output).read_text()) for output in outputs]
+    duration = max(report["duration_s"] for report in reports)
+    requests = sum(report["requests"] - report["errors"] for report in reports)
+    return {
+        "requests": requests,
+        "errors": sum(report["errors"] for report in reports),
+        "duration_s": duration,
+        "requests_per_s": round(requests / duration, 2),
+        "ttft_p50_ms": max(report["ttft"]["p50_ms"] for report in reports),
+        "latency_p99_ms": max(report["latency"]["p99_ms"] for report in reports),
+    }
+
+
+def run(workers: int, args, directory: str) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    socket_path = os.path.join(directory, "mcp.sock")
+    env = {
+        **os.environ,
+        "WORKERS": str(workers),
+        "LOG_LEVEL": "WARNING",
+        "LLM_PROVIDERS": "gemini=benchmarks.fake_providers:fake_llm",
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKEN_RATE": str(args.token_rate),
+        "FAKE_LLM_TOOL_CALL": args.tool_call or "",
+        "MCP_SERVERS": json.dumps([{
+            "name": "filesystem",
+            "command": sys.executable,
+            "args": ["-m", "benchmarks.fake_mcp_server", "--latency", str(args.mcp_latency)],
+            "env": None,
+        }]),
+        "CONVERSATION_STORE": "sqlite",
+        "CONVERSATION_STORE_PATH": os.path.join(directory, "conversations.db"),
+    }
+    env.pop("MCP_BROKER_SOCKET", None)
+    broker = None
+    if args.broker:
+        env["MCP_BROKER_SOCKET"] = socket_path
+        broker = spawn_broker(socket_path, env)
+
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        env=env,
+    )
+    try:
+        _wait_ready(base_url)
+        result = _drive(base_url, args, directory)
+        result["mcp_server_processes"] = _count_processes("benchmarks.fake_mcp_server")
+    finally:
+        server.terminate()
+        server.wait(30)
+        if broker is not None:
+            stop_broker(broker)
+    return result
+
+
+def main(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in args.workers:
+            results[workers] = run(workers, args, directory)
+    baseline = results[args.workers[0]]["requests_per_s"]
+    for result in results.values():
+        result["speedup"] = round(result["requests_per_s"] / baseline, 2) if baseline else None
+
+    report = {"commit": _git_commit(), "cpus": os.cpu_count(), "config": vars(args), "workers": results}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=60)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--tokens", type=int, default=200, help="fake provider tokens per response")
+    parser.add_argument("--token-rate", type=float, default=2000.0, help="fake provider tokens/sec")
+    parser.add_argument("--tool-call", default=None, help="have the fake model call this tool first")
+    parser.add_argument("--mcp-latency", type=float, default=0.0)
+    parser.add_argument("--broker", action="store_true", help="share one MCP broker between the workers")
+    main(parser.parse_args())
@@ -0,0 +1,33 @@
+"""
+Gunicorn config for running several worker processes (pip install gunicorn):
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Workers are uvicorn workers, WORKERS of them. With MCP_BROKER_SOCKET set the
+arbiter starts one MCP broker before the workers and stops it on exit, so the
+MCP servers run once instead of once per worker.
+"""
+from app.core.config import settings
+from app.services.mcp_broker import spawn_broker, stop_broker
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.workers
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Chat streams are long-lived: give them time to finish on restart
+graceful_timeout = 30
+keepalive = 5
+
+_broker = None
+
+
+def on_starting(server):
+    global _broker
+    if settings.mcp_broker_socket and settings.mcp_broker_spawn:
+        _broker = spawn_broker(settings.mcp_broker_socket)
+        server.log.info("Started MCP broker (pid %s) on %s", _broker.pid, settings.mcp_broker_socket)
+
+
+def on_exit(server):
+    if _broker is not None:
+        stop_broker(_broker)
@@ -26,6 +26,11 @@ CREATE TABLE IF NOT EXISTS conversations (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Chat history: messages that belong to a conversation (see app/services/conversation_store.py)
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS
+    conversation_id INTEGER REFERENCES conversations(id) ON DELETE CASCADE;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS role VARCHAR(20) NOT NULL DEFAULT 'user';
+
 -- Sample data
 INSERT INTO users (name, email) VALUES
     ('Alice Johnson', 'alice@example.com'),
@@ -44,3 +49,4 @@ ON CONFLICT DO NOTHING;
 CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id);
@@ -3,29 +3,50 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
-from app.api.routes import chat
+from app.core.logger import get_logger, setup_logging, shutdown_logging
+from app.api.routes import chat, metrics
+from app.core.providers import provider_registry
+from app.core.startup import import_profile, startup_profile
+from app.core.tracing import TracingMiddleware, span_exporter
+from app.services.conversation_store import conversation_store
 from app.services.mcp_service import mcp_service
 
 
+setup_logging()
+logger = get_logger(__name__)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager for startup and shutdown events.
     """
     # Startup
-    print("🚀 Starting AI Chatbot Backend...")
+    logger.info("Starting AI Chatbot Backend")
+    with startup_profile.phase("providers"):
+        await provider_registry.start()
+    with startup_profile.phase("conversation_store"):
+        await conversation_store.start()
     try:
-        await mcp_service.initialize()
-        print("✅ Backend ready!")
+        with startup_profile.phase("mcp"):
+            await mcp_service.initialize()
+        logger.info("Backend ready")
     except Exception as e:
-        print(f"⚠️  Warning: MCP service initialization failed: {e}")
-        print("   Continuing without MCP support...")
+        logger.warning(
+            "MCP service initialization failed; continuing without MCP support",
+            extra={"error": str(e)}
+        )
+    startup_profile.ready()
     
     yield
     
     # Shutdown
-    print("👋 Shutting down...")
+    logger.info("Shutting down")
     await mcp_service.close()
+    await provider_registry.close()
+    await conversation_store.close()
+    await span_exporter.close()
+    shutdown_logging()
 
 
 # Create FastAPI app
@@ -45,8 +66,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Start a trace and stamp the receive time for every request
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(metrics.router, tags=["metrics"])
 
 
 @app.get("/")
@@ -57,3 +82,34 @@ async def root():
         "version": "0.1.0",
         "docs": "/docs"
     }
+
+
+async def profile_startup() -> dict:
+    """
+    Run the app's startup and shutdown once and report where cold start time
+    goes: module imports (measured in a fresh interpreter) and lifespan phases.
+    """
+    async with lifespan(app):
+        startup = startup_profile.report()
+        startup["providers_loaded"] = provider_registry.loaded()
+    return {"startup": startup, "imports": import_profile("main")}
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    
+    parser = argparse.ArgumentParser(description="AI Chatbot Backend")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print import and startup phase timings as JSON, then exit"
+    )
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        print(json.dumps(asyncio.run(profile_startup()), indent=2))
+    else:
+        import uvicorn
+        uvicorn.run(app, host=settings.host, port=settings.port)
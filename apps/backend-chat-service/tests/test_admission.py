@@ -0,0 +1,165 @@
+import asyncio
+from contextlib import aclosing
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+from app.api.routes.chat import _priority
+from app.core.config import settings
+from app.core.providers import provider_registry
+from app.models.chat import Message
+from app.services import chat_service as chat_service_module
+from app.services.admission import MODEL_LIMIT_CACHE_SIZE, AdmissionScheduler
+from app.services.context_manager import ContextManager
+from app.services.chat_service import chat_service
+from app.services.response_cache import ResponseCache
+from app.services.router import Backend, ModelRouter
+
+
+def _scheduler(**kwargs) -> AdmissionScheduler:
+    options = dict(
+        enabled=True,
+        provider_limits={"gemini": 2},
+        model_limits={},
+        queue_size=8,
+        client_queue_size=8,
+        queue_timeout=5.0,
+    )
+    options.update(kwargs)
+    return AdmissionScheduler(**options)
+
+
+def _request(headers: dict[str, str]) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+class FakeProvider:
+    generation_config = {"temperature": 0}
+
+    def __init__(self, name: str, fail: bool = False, chunks: int = 1, delay: float = 0.0):
+        self.name = name
+        self.fail = fail
+        self.chunks = chunks
+        self.delay = delay
+
+    async def generate_stream(self, messages, model_name, tools=None):
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        for _ in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield f"from {self.name}"
+
+
+@pytest.mark.asyncio
+async def test_client_model_names_do_not_grow_state():
+    scheduler = _scheduler(model_limits={"gemini-pro*": 1})
+    for i in range(MODEL_LIMIT_CACHE_SIZE + 500):
+        ticket = await scheduler.acquire("gemini", f"made-up-{i}")
+        ticket.release()
+
+    assert scheduler._active_models == {}
+    assert len(scheduler._model_limit_cache) == MODEL_LIMIT_CACHE_SIZE
+    # Uncached names are still matched against the limits
+    held = await scheduler.acquire("gemini", "gemini-pro-latest")
+    assert not scheduler._has_capacity("gemini", "gemini-pro-latest")
+    held.release()
+
+
+def test_priority_header_needs_trusted_key(monkeypatch):
+    monkeypatch.setattr(settings, "admission_priority_api_keys", "ops-key")
+
+    assert _priority(_request({"x-priority": "high"})) == "normal"
+    assert _priority(_request({"x-priority": "high", "x-api-key": "someone"})) == "normal"
+    assert _priority(_request({"x-priority": "high", "x-api-key": "ops-key"})) == "high"
+    # Anyone may step back
+    assert _priority(_request({"x-priority": "low"})) == "low"
+
+
+@pytest.mark.asyncio
+async def test_failover_waits_for_a_slot_on_the_other_provider(monkeypatch):
+    monkeypatch.setitem(provider_registry._providers, "fakea", FakeProvider("fakea", fail=True))
+    monkeypatch.setitem(provider_registry._providers, "fakeb", FakeProvider("fakeb"))
+    monkeypatch.setattr(chat_service_module, "model_router", ModelRouter(aliases={"pair": ["fakea:m", "fakeb:m"]}))
+    scheduler = _scheduler(provider_limits={"fakea": 1, "fakeb": 1})
+    monkeypatch.setattr(chat_service_module, "admission", scheduler)
+
+    ticket = await scheduler.acquire("fakea", "fakea:m", client="alice")
+    blocker = await scheduler.acquire("fakeb", "fakeb:m", client="bob")
+
+    async def run() -> str:
+        messages = [{"role": "user", "content": "hi"}]
+        return "".join([chunk async for chunk in chat_service._generate("pair", messages, None, None, ticket)])
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.1)
+    # fakea failed; the failover is queued behind fakeb's limit, not let through
+    assert not task.done()
+    assert scheduler.stats()["waiting"] == {"fakeb": 1}
+
+    blocker.release()
+    assert await asyncio.wait_for(task, timeout=2) == "from fakeb"
+    assert scheduler._active_providers == {"fakea": 0, "fakeb": 0}
+    ticket.release()
+    assert scheduler._active_providers == {"fakea": 0, "fakeb": 0}
+
+
+@pytest.mark.asyncio
+async def test_shared_generation_keeps_its_slot_when_its_starter_leaves(monkeypatch):
+    monkeypatch.setitem(provider_registry._providers, "fakec", FakeProvider("fakec", chunks=20, delay=0.02))
+    monkeypatch.setattr(chat_service_module, "model_router", ModelRouter(aliases={}))
+    monkeypatch.setattr(chat_service_module, "mcp_service", SimpleNamespace(_initialized=True, get_tools=lambda: ()))
+    monkeypatch.setattr(chat_service_module, "response_cache", ResponseCache(enabled=True, shared_path=""))
+    scheduler = _scheduler(provider_limits={"fakec": 2})
+    monkeypatch.setattr(chat_service_module, "admission", scheduler)
+    messages = [Message(role="user", content="same question")]
+
+    def chat(ticket):
+        return chat_service.chat_stream(messages=messages, model="fakec:m", ticket=ticket)
+
+    first = await scheduler.acquire("fakec", "fakec:m", client="alice")
+    second = await scheduler.acquire("fakec", "fakec:m", client="bob")
+    async with aclosing(chat(first)) as starter:
+        await anext(starter)
+        joiner = chat(second)
+        await anext(joiner)
+        # The joiner shares the generation, so its own slot is returned
+        assert scheduler._active_providers["fakec"] == 1
+    first.release()
+
+    # The starter left; the generation still runs for the joiner and stays counted
+    assert scheduler._active_providers["fakec"] == 1
+    async with aclosing(joiner):
+        assert len([chunk async for chunk in joiner]) == 19
+    second.release()
+    assert scheduler._active_providers["fakec"] == 0
+
+
+@pytest.mark.asyncio
+async def test_context_summary_runs_through_the_router(monkeypatch):
+    class SummaryFails(FakeProvider):
+        async def generate_stream(self, messages, model_name, tools=None):
+            if messages[0]["content"].startswith("Summarize"):
+                raise ConnectionError("summary call failed")
+            async for chunk in super().generate_stream(messages, model_name, tools):
+                yield chunk
+
+    monkeypatch.setitem(provider_registry._providers, "faked", SummaryFails("faked"))
+    router = ModelRouter(aliases={})
+    monkeypatch.setattr(chat_service_module, "model_router", router)
+    monkeypatch.setattr(
+        chat_service_module,
+        "context_manager",
+        ContextManager(strategy="summarize_prefix", budgets={}, default_budget=300, reserve_tokens=0)
+    )
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": "x" * 400} for i in range(9)]
+
+    reply = "".join([chunk async for chunk in chat_service._generate("faked:m", messages, None)])
+
+    # The conversation is still answered, and the failed summary counts against the backend
+    assert reply == "from faked"
+    health = router.health(Backend("faked", "m"))
+    assert (health.requests, health.failures) == (2, 1)
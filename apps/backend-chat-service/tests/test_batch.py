@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.providers import provider_registry
+from app.services import batch as batch_module
+from app.services import chat_service as chat_service_module
+from app.services.admission import AdmissionScheduler
+from app.services.batch import BatchRunner
+from app.services.router import ModelRouter
+
+
+class EchoProvider:
+    name = "echo"
+    generation_config = {"temperature": 0.7}
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_stream(self, messages, model_name, tools=None):
+        self.calls += 1
+        yield f"echo: {messages[-1]['content']}"
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = EchoProvider()
+    monkeypatch.setitem(provider_registry._providers, "echo", provider)
+    monkeypatch.setattr(chat_service_module, "model_router", ModelRouter(aliases={}))
+    monkeypatch.setattr(batch_module, "model_router", chat_service_module.model_router)
+    monkeypatch.setattr(chat_service_module, "mcp_service", SimpleNamespace(_initialized=True, get_tools=lambda: ()))
+    monkeypatch.setattr(batch_module, "admission", AdmissionScheduler(enabled=False))
+    return provider
+
+
+def _request(content: str) -> str:
+    return json.dumps({"model": "echo:m", "messages": [{"role": "user", "content": content}]})
+
+
+@pytest.mark.asyncio
+async def test_run_file_resumes_after_interruption(provider, tmp_path):
+    input_path = tmp_path / "requests.jsonl"
+    input_path.write_text("\n".join(_request(f"q{i}") for i in range(3)) + "\n\n")
+    output_path = tmp_path / "results.jsonl"
+    # An earlier run finished q0 and was killed while writing the next line
+    output_path.write_text('{"id": "0", "status": "ok", "model": "echo:m", "content": "echo: q0"}\n{"id": "1", "sta')
+
+    counts = await BatchRunner(concurrency=2).run_file(str(input_path), str(output_path))
+
+    assert counts == {"ok": 2, "error": 0, "skipped": 1}
+    assert provider.calls == 2
+    results = {}
+    for line in output_path.read_text().splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        results[result["id"]] = result["content"]
+    assert results == {"0": "echo: q0", "1": "echo: q1", "2": "echo: q2"}
+
+
+@pytest.mark.asyncio
+async def test_run_file_rejects_invalid_lines(provider, tmp_path):
+    input_path = tmp_path / "requests.jsonl"
+    input_path.write_text(_request("q0") + "\n{\"model\": 1}\n")
+
+    with pytest.raises(ValueError, match="requests.jsonl:2"):
+        await BatchRunner().run_file(str(input_path), str(tmp_path / "results.jsonl"))
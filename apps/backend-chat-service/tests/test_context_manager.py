@@ -0,0 +1,35 @@
+import pytest
+
+from app.services.context_manager import ContextManager, tool_tokens
+
+
+def _tool(name: str) -> dict:
+    return {"name": name, "description": f"Does {name}", "input_schema": {"type": "object"}}
+
+
+def test_tools_tokens_of_varying_subsets():
+    manager = ContextManager(strategy="none", budgets={})
+    catalog = [_tool(f"tool_{i}") for i in range(20)]
+    first, second = tuple(catalog[:5]), tuple(catalog[3:10])
+
+    assert manager.tools_tokens(first) == sum(tool_tokens(tool) for tool in first)
+    assert manager.tools_tokens(second) == sum(tool_tokens(tool) for tool in second)
+    # One estimate per tool, however many subsets are sent
+    assert len(manager._tool_tokens) == 10
+
+
+def test_changed_tool_is_re_estimated():
+    manager = ContextManager(strategy="none", budgets={})
+    before = manager.tools_tokens([_tool("query")])
+    changed = {**_tool("query"), "description": "Run a read-only SQL query " * 20}
+    assert manager.tools_tokens([changed]) > before
+
+
+@pytest.mark.asyncio
+async def test_default_strategy_sends_everything():
+    manager = ContextManager(budgets={}, default_budget=10)
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": "x" * 400} for i in range(10)]
+    compacted, report = await manager.compact(messages, "gemini-2.0-flash")
+    assert manager.strategy == "none"
+    assert compacted == messages
+    assert report["tokens_saved"] == 0
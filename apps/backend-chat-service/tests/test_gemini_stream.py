@@ -0,0 +1,81 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import llm as llm_module
+from app.core.llm import GeminiLLM
+
+STREAMS = 50
+CHUNKS = 10
+CHUNK_DELAY = 0.02
+
+
+class FakeResponse:
+    """Async stream of text chunks shaped like the SDK's, with a delay before each."""
+
+    def __init__(self, label: str):
+        self.label = label
+
+    async def __aiter__(self):
+        for i in range(CHUNKS):
+            await asyncio.sleep(CHUNK_DELAY)
+            part = SimpleNamespace(text=f"{self.label}:{i} ", function_call=None)
+            yield SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class FakeModel:
+    async def generate_content_async(self, contents, generation_config=None, stream=False, tools=None):
+        await asyncio.sleep(CHUNK_DELAY)
+        return FakeResponse(contents[-1]["parts"][0])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams_interleave(monkeypatch):
+    llm = GeminiLLM()
+    monkeypatch.setattr(llm, "_get_model", lambda model_name: FakeModel())
+    events = []
+
+    async def consume(index: int) -> str:
+        chunks = []
+        messages = [{"role": "user", "content": f"s{index}"}]
+        async for chunk in llm.generate_stream(messages, "gemini-fake"):
+            events.append(index)
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(consume(i) for i in range(STREAMS)))
+    elapsed = time.perf_counter() - started
+
+    assert results[7] == "".join(f"s7:{i} " for i in range(CHUNKS))
+    # Every stream got its first chunk before any stream finished
+    first_done = min(len(events) - events[::-1].index(i) - 1 for i in range(STREAMS))
+    assert set(events[:first_done + 1]) == set(range(STREAMS))
+    # Concurrent: about one stream's duration, not fifty
+    one_stream = (CHUNKS + 1) * CHUNK_DELAY
+    assert elapsed < one_stream * 5
+
+
+@pytest.mark.asyncio
+async def test_sdk_import_does_not_block_the_loop(monkeypatch):
+    def slow_import():
+        time.sleep(0.3)
+
+    monkeypatch.setattr(llm_module, "_genai", slow_import)
+    monkeypatch.setattr(llm_module, "_gemini_type_mapping", lambda: {})
+    llm = GeminiLLM()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await llm.start()
+    ticker.cancel()
+    # The loop kept serving other tasks during the import
+    assert ticks >= 10
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from mcp import types
+
+from app.services.mcp_broker import MCPBroker, MCPBrokerError, RemoteMCPService, _encode
+
+TOOL = {
+    "name": "fake.read_file",
+    "description": "Read a file",
+    "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}},
+    "server": "fake",
+    "mcp_name": "read_file",
+}
+
+
+class FakeService:
+    """The parts of MCPService the broker serves."""
+
+    ready = True
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    def on_change(self, callback):
+        pass
+
+    def get_tools(self):
+        return (TOOL,)
+
+    def get_server_states(self):
+        return {"fake": {"state": "ready"}}
+
+    def get_pool_stats(self):
+        return {}
+
+    async def execute_tool(self, tool_name, arguments):
+        if arguments.get("path") == "slow":
+            await self.release.wait()
+        return [types.TextContent(type="text", text=f"contents of {arguments['path']}")]
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 characters; pytest's tmp_path can be longer
+    directory = tempfile.mkdtemp(prefix="broker-")
+    yield os.path.join(directory, "mcp.sock")
+    os.rmdir(directory)
+
+
+async def _wait_for(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.02)
+
+
+async def _read(remote: RemoteMCPService, path: str) -> str:
+    result = await remote.execute_tool(TOOL["name"], {"path": path})
+    return result[0].text
+
+
+@pytest.mark.asyncio
+async def test_worker_reconnects_after_broker_restart(socket_path):
+    broker = MCPBroker(FakeService(), socket_path)
+    await broker.start()
+    remote = RemoteMCPService(socket_path, connect_timeout=5.0)
+    try:
+        await remote.initialize()
+        assert remote.ready
+        assert await _read(remote, "a.txt") == "contents of a.txt"
+
+        # A call in flight when the broker goes away fails instead of hanging
+        in_flight = asyncio.create_task(_read(remote, "slow"))
+        await _wait_for(lambda: remote._pending)
+        await broker.close()
+        with pytest.raises(MCPBrokerError):
+            await asyncio.wait_for(in_flight, timeout=5.0)
+        await _wait_for(lambda: remote._writer is None)
+        with pytest.raises(MCPBrokerError):
+            await _read(remote, "a.txt")
+
+        # The broker comes back: the worker reconnects on its own
+        broker = MCPBroker(FakeService(), socket_path)
+        await broker.start()
+        await _wait_for(lambda: remote.reconnects == 1)
+        assert await _read(remote, "b.txt") == "contents of b.txt"
+        assert remote.get_tools() == (TOOL,)
+    finally:
+        await remote.close()
+        await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_bad_frame_fails_pending_calls(socket_path):
+    async def handle(reader, writer):
+        writer.write(_encode({"event": "status", "tools": [TOOL], "states": {}, "ready": True, "pools": {}}))
+        await reader.readline()
+        # A reply the worker can't match to a call
+        writer.write(_encode({"result": []}))
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_unix_server(handle, socket_path)
+    remote = RemoteMCPService(socket_path, connect_timeout=5.0)
+    try:
+        await remote.initialize()
+        with pytest.raises(MCPBrokerError):
+            await asyncio.wait_for(_read(remote, "a.txt"), timeout=5.0)
+        assert remote._pending == {}
+    finally:
+        await remote.close()
+        server.close()
+        await server.wait_closed()
+        os.unlink(socket_path)
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_closes_the_attempt(socket_path):
+    connections = []
+
+    async def handle(reader, writer):
+        # Accept but never send a status
+        connections.append(writer)
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_unix_server(handle, socket_path)
+    remote = RemoteMCPService(socket_path, connect_timeout=0.2)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await remote._connect(0)
+        assert remote._reader_task is None
+        assert remote._writer is None
+        # The worker hung up on the broker
+        await _wait_for(lambda: connections and connections[0].is_closing())
+    finally:
+        await remote.close()
+        server.close()
+        await server.wait_closed()
+        os.unlink(socket_path)
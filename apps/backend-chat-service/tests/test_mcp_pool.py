@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import textwrap
+from types import SimpleNamespace
+
+import pytest
+from mcp import StdioServerParameters
+
+from app.core.providers import provider_registry
+from app.models.chat import ToolCall
+from app.services import chat_service as chat_service_module
+from app.services.chat_service import chat_service
+from app.services.mcp_pool import MCPSessionPool, PooledSession
+from app.services.router import ModelRouter
+
+SERVER = textwrap.dedent('''
+    import asyncio
+    import os
+    from pathlib import Path
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("crashy")
+    CANCELLED = Path(__file__).with_name("cancelled")
+
+    @server.tool()
+    async def echo(text: str) -> str:
+        """Echo text."""
+        return text
+
+    @server.tool()
+    async def crash() -> str:
+        """Exit the server process."""
+        os._exit(1)
+
+    @server.tool()
+    async def slow() -> str:
+        """Work for a long time; record it if the client cancels."""
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            CANCELLED.touch()
+            raise
+        return "done"
+
+    server.run()
+''')
+
+
+@pytest.fixture
+def params(tmp_path):
+    script = tmp_path / "server.py"
+    script.write_text(SERVER)
+    return StdioServerParameters(command=sys.executable, args=[str(script)])
+
+
+async def _wait_dead(slot: PooledSession, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while slot.alive:
+        assert asyncio.get_running_loop().time() < deadline, "session still alive after the process exited"
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_session_ends_when_process_exits(params):
+    pool = MCPSessionPool("crashy", params, size=1)
+    await pool.start()
+    try:
+        async with pool.lease() as session:
+            call = asyncio.create_task(session.call_tool("crash", {}))
+            await _wait_dead(pool._slots[0])
+            call.cancel()
+
+        # The next lease respawns instead of handing out the dead session
+        async with pool.lease() as session:
+            result = await session.call_tool("echo", {"text": "hi"})
+        assert result.content[0].text == "hi"
+        assert pool.respawns == 1
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_stop_during_startup_does_not_hang_start(params):
+    slot = PooledSession("crashy", params)
+    starting = asyncio.create_task(slot.start())
+    await asyncio.sleep(0)
+    await slot.stop()
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(starting, timeout=5.0)
+
+
+@pytest.mark.asyncio
+async def test_respawn_is_bounded_by_acquire_timeout(tmp_path):
+    script = tmp_path / "hang.py"
+    script.write_text("import time\ntime.sleep(60)\n")
+    pool = MCPSessionPool("hang", StdioServerParameters(command=sys.executable, args=[str(script)]), size=1, acquire_timeout=0.5)
+    # Never started: the first lease has to spawn the session
+    pool._slots.append(PooledSession("hang", pool.params))
+    pool._idle.put_nowait(pool._slots[0])
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            async with pool.lease():
+                pass
+    finally:
+        await pool.close()
+
+
+async def _wait_for_file(path, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not path.exists():
+        assert asyncio.get_running_loop().time() < deadline, "the server never saw the cancellation"
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_is_cancelled_on_the_server(params, tmp_path):
+    pool = MCPSessionPool("crashy", params, size=1)
+    await pool.start()
+    try:
+        call = asyncio.create_task(pool.call_tool("slow", {}))
+        await asyncio.sleep(0.5)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await _wait_for_file(tmp_path / "cancelled")
+
+        # The session is still usable afterwards
+        result = await pool.call_tool("echo", {"text": "hi"})
+        assert result.content[0].text == "hi"
+    finally:
+        await pool.close()
+
+
+class ToolCallingProvider:
+    name = "toolcaller"
+
+    async def generate_stream(self, messages, model_name, tools=None):
+        yield ToolCall(name="slow", arguments={})
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_running_tool_call(params, tmp_path, monkeypatch):
+    pool = MCPSessionPool("crashy", params, size=1)
+    await pool.start()
+    started = asyncio.Event()
+
+    async def execute_tool(tool_name, arguments):
+        started.set()
+        return (await pool.call_tool(tool_name, arguments)).content
+
+    monkeypatch.setattr(chat_service_module, "mcp_service", SimpleNamespace(execute_tool=execute_tool))
+    monkeypatch.setitem(provider_registry._providers, "toolcaller", ToolCallingProvider())
+    monkeypatch.setattr(chat_service_module, "model_router", ModelRouter(aliases={}))
+    try:
+        async def stream():
+            messages = [{"role": "user", "content": "hi"}]
+            async for _ in chat_service._generate("toolcaller:m", messages, None):
+                pass
+
+        # What _ChatStreamingResponse does when the client goes away
+        task = asyncio.create_task(stream())
+        await asyncio.wait_for(started.wait(), timeout=5.0)
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await _wait_for_file(tmp_path / "cancelled")
+    finally:
+        await pool.close()
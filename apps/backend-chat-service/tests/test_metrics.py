@@ -0,0 +1,26 @@
+from app.core import metrics as metrics_module
+from app.core.metrics import MetricsRegistry, register_models
+
+
+def test_unknown_models_share_one_series(monkeypatch):
+    monkeypatch.setattr(metrics_module, "_known_models", set())
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ("provider", "model"))
+    register_models("gemini-2.0-flash")
+
+    counter.labels("gemini", "gemini-2.0-flash").inc()
+    for i in range(100):
+        counter.labels("gemini", f"made-up-{i}").inc()
+    counter.labels("gemini", "").inc()
+
+    rendered = registry.render()
+    assert 'requests_total{provider="gemini",model="gemini-2.0-flash"} 1.0' in rendered
+    assert 'requests_total{provider="gemini",model="other"} 100.0' in rendered
+    assert 'requests_total{provider="gemini",model=""} 1.0' in rendered
+    assert "made-up" not in rendered
+
+
+def test_known_models_are_bounded(monkeypatch):
+    monkeypatch.setattr(metrics_module, "_known_models", set())
+    register_models(*(f"m{i}" for i in range(metrics_module.MAX_MODEL_LABELS + 10)))
+    assert len(metrics_module._known_models) == metrics_module.MAX_MODEL_LABELS
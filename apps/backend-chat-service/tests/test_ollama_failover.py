@@ -0,0 +1,71 @@
+import pytest
+import pytest_asyncio
+
+from app.core.ollama import OllamaLLM
+from benchmarks.stub_ollama import StubOllamaServer
+
+MODEL = "llama3.2:3b"
+
+
+@pytest_asyncio.fixture
+async def nodes():
+    servers = [StubOllamaServer(tokens=3), StubOllamaServer(tokens=3)]
+    for server in servers:
+        await server.start()
+    yield servers
+    for server in servers:
+        await server.close()
+
+
+async def _generate(llm: OllamaLLM) -> str:
+    messages = [{"role": "user", "content": "hi"}]
+    return "".join([chunk async for chunk in llm.generate_stream(messages, MODEL)])
+
+
+def _node(llm: OllamaLLM, server: StubOllamaServer):
+    return next(node for node in llm.nodes.nodes if node.url == server.base_url)
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_server_error(nodes):
+    failing, healthy = nodes
+    failing.error_status = 500
+    # Neither node polled yet: the first request tries them in listed order
+    llm = OllamaLLM(base_urls=[failing.base_url, healthy.base_url])
+
+    assert await _generate(llm) == "tok0 tok1 tok2 "
+    assert (failing.requests, healthy.requests) == (1, 1)
+    assert not _node(llm, failing).healthy
+
+
+@pytest.mark.asyncio
+async def test_fails_over_when_model_is_missing(nodes):
+    missing, healthy = nodes
+    missing.models = {"other:latest"}
+    llm = OllamaLLM(base_urls=[missing.base_url, healthy.base_url])
+
+    assert await _generate(llm) == "tok0 tok1 tok2 "
+    assert (missing.requests, healthy.requests) == (1, 1)
+    # The node is fine, it just doesn't have this model
+    assert _node(llm, missing).healthy
+
+
+@pytest.mark.asyncio
+async def test_fails_over_when_node_is_down(nodes):
+    down, healthy = nodes
+    await down.close()
+    llm = OllamaLLM(base_urls=[down.base_url, healthy.base_url])
+
+    assert await _generate(llm) == "tok0 tok1 tok2 "
+    assert not _node(llm, down).healthy
+
+
+@pytest.mark.asyncio
+async def test_last_node_error_is_reported(nodes):
+    for server in nodes:
+        server.error_status = 503
+    llm = OllamaLLM(base_urls=[server.base_url for server in nodes])
+
+    with pytest.raises(Exception, match="HTTP 503"):
+        await _generate(llm)
+    assert [server.requests for server in nodes] == [1, 1]
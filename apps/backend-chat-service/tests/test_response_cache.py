@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app.core.stream_encoder import StreamEncoder
+from app.services.response_cache import ResponseCache, SharedGenerationCancelledError
+
+
+def _cache() -> ResponseCache:
+    return ResponseCache(enabled=True, max_entries=16, ttl=60.0, directory="", shared_path="")
+
+
+def test_key_keeps_exact_content():
+    config = {"temperature": 0}
+    indented = [{"role": "user", "content": "fix this:\nif x:\n    y()"}]
+    flat = [{"role": "user", "content": "fix this: if x: y()"}]
+    assert ResponseCache.make_key("m", indented, config, None) != ResponseCache.make_key("m", flat, config, None)
+
+
+def test_only_greedy_sampling_is_cached():
+    assert ResponseCache.is_deterministic({"temperature": 0})
+    assert not ResponseCache.is_deterministic({"temperature": 0.7})
+    assert not ResponseCache.is_deterministic({})
+
+
+@pytest.mark.asyncio
+async def test_skip_store_shares_but_does_not_store():
+    cache = _cache()
+
+    async def generate():
+        yield "from a tool"
+        ResponseCache.skip_store()
+
+    chunks = [chunk async for chunk in cache.stream("k", generate)]
+    assert chunks == ["from a tool"]
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_of_cancelled_generation_ends_its_stream():
+    cache = _cache()
+
+    async def generate():
+        yield "partial"
+        await asyncio.sleep(60)
+
+    first = cache.stream("k", generate)
+    assert await first.__anext__() == "partial"
+    broadcast = cache._inflight["k"]
+    # The only subscriber leaves, so the generation is cancelled
+    await first.aclose()
+    await asyncio.wait_for(asyncio.wait({broadcast.task}), timeout=1.0)
+
+    # A subscriber that joined just before gets a plain error, so the
+    # encoder finishes the stream instead of sending keep-alives forever
+    frames = []
+    with pytest.raises(SharedGenerationCancelledError):
+        async for frame in StreamEncoder(flush_interval=0, keepalive_interval=0.05).encode(broadcast.subscribe()):
+            frames.append(frame)
+            assert len(frames) < 10, "stream kept sending keep-alives"
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.services.tool_cache import ToolResultCache
+
+
+class FakeFilesystem:
+    """A server with one file, read and written through cacheable/uncacheable tools."""
+
+    def __init__(self, cache: ToolResultCache, content: str = "old"):
+        self.cache = cache
+        self.content = content
+        self.reads = 0
+
+    async def read(self, delay: float = 0.0) -> str:
+        async def execute():
+            self.reads += 1
+            content = self.content
+            await asyncio.sleep(delay)
+            return content
+        return await self.cache.get_or_execute("filesystem", "read_file", {"path": "a.txt"}, execute)
+
+    async def write(self, content: str, delay: float = 0.0):
+        async def execute():
+            await asyncio.sleep(delay)
+            self.content = content
+            return "ok"
+        return await self.cache.get_or_execute("filesystem", "write_file", {"path": "a.txt", "content": content}, execute)
+
+
+def _cache() -> ToolResultCache:
+    return ToolResultCache(enabled=True, max_bytes=1 << 20, default_ttl=60.0, allowlist=["filesystem.read_file"], ttls={})
+
+
+@pytest.mark.asyncio
+async def test_read_after_write_sees_new_content():
+    cache = _cache()
+    fs = FakeFilesystem(cache)
+    assert await fs.read() == "old"
+    assert await fs.read() == "old"
+    assert fs.reads == 1
+
+    await fs.write("new")
+    assert await fs.read() == "new"
+    assert fs.reads == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_overlapping_write_is_not_cached():
+    cache = _cache()
+    fs = FakeFilesystem(cache)
+    # The read sees the old content, but finishes after the write
+    read = asyncio.create_task(fs.read(delay=0.05))
+    await asyncio.sleep(0)
+    await fs.write("new")
+    assert await read == "old"
+    assert await fs.read() == "new"
+
+
+@pytest.mark.asyncio
+async def test_other_servers_stay_cached():
+    cache = _cache()
+    fs = FakeFilesystem(cache)
+    await fs.read()
+
+    async def execute():
+        return "ok"
+    await cache.get_or_execute("slack", "send_message", {"text": "hi"}, execute)
+    await fs.read()
+    assert fs.reads == 1
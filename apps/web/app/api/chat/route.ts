@@ -13,7 +13,13 @@ export async function POST(req: Request) {
     });
 
     if (!response.ok) {
-      throw new Error(`Backend responded with ${response.status}`);
+      // Pass the status through: the client acts on 404 (unknown conversation)
+      const headers: Record<string, string> = {
+        'Content-Type': response.headers.get('Content-Type') ?? 'application/json',
+      };
+      const retryAfter = response.headers.get('Retry-After');
+      if (retryAfter) headers['Retry-After'] = retryAfter;
+      return new Response(await response.text(), { status: response.status, headers });
     }
 
     // Stream the response back to the frontend
@@ -0,0 +1,29 @@
+export async function POST(req: Request) {
+  try {
+    const body = await req.text();
+
+    // Forward request to Python backend
+    const pythonBackendUrl = process.env.PYTHON_BACKEND_URL || 'http://localhost:8000';
+    const response = await fetch(`${pythonBackendUrl}/api/conversations`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: body || '{}',
+    });
+
+    return new Response(await response.text(), {
+      status: response.status,
+      headers: { 'Content-Type': 'application/json' },
+    });
+  } catch (error) {
+    console.error('Error proxying to Python backend:', error);
+    return new Response(
+      JSON.stringify({ error: 'Failed to connect to backend' }),
+      {
+        status: 500,
+        headers: { 'Content-Type': 'application/json' },
+      }
+    );
+  }
+}
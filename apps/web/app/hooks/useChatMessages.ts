@@ -12,6 +12,24 @@ export function useChatMessages(selectedModel: ModelId) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const lastUserMessageRef = useRef<string>('');
+  // Server-side conversation: once created, only new messages are sent
+  const conversationIdRef = useRef<number | null>(null);
+
+  // Only created before the first message: one created later would lack the
+  // earlier turns, so without it the full history is sent every turn
+  const ensureConversation = useCallback(async (isFirstMessage: boolean) => {
+    if (conversationIdRef.current === null && isFirstMessage) {
+      try {
+        const response = await fetch('/api/conversations', { method: 'POST' });
+        if (response.ok) {
+          conversationIdRef.current = (await response.json()).id;
+        }
+      } catch {
+        // Fall back to sending the full history
+      }
+    }
+    return conversationIdRef.current;
+  }, []);
 
   const sendMessage = useCallback(
     async (content: string, isRetry = false) => {
@@ -43,24 +61,38 @@ export function useChatMessages(selectedModel: ModelId) {
 
       setIsLoading(true);
 
-      try {
-        const response = await fetch('/api/chat', {
+      // Full local history including this message (error bubbles aren't turns)
+      const history = (isRetry ? messages : [...messages, userMessage!])
+        .filter((m) => !m.isError)
+        .map((m) => ({ role: m.role, content: m.content }));
+
+      const postChat = (body: object) =>
+        fetch('/api/chat', {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            messages: isRetry
-              ? messages.map((m) => ({
-                  role: m.role,
-                  content: m.content,
-                }))
-              : [...messages, userMessage!].map((m) => ({
-                  role: m.role,
-                  content: m.content,
-                })),
-            model: selectedModel,
-          }),
+          body: JSON.stringify(body),
         });
 
+      try {
+        const conversationId = await ensureConversation(history.length === 1);
+        let response = await postChat(
+          conversationId !== null
+            ? {
+                // Failed turns are not stored, so a retry resends the same message
+                conversation_id: conversationId,
+                messages: [{ role: 'user', content }],
+                model: selectedModel,
+              }
+            : { messages: history, model: selectedModel }
+        );
+
+        if (response.status === 404 && conversationId !== null) {
+          // The server lost the conversation (e.g. restarted with the memory
+          // store): continue without one, sending the full history
+          conversationIdRef.current = null;
+          response = await postChat({ messages: history, model: selectedModel });
+        }
+
         if (!response.ok) {
           throw new Error('Failed to get response');
         }
@@ -77,31 +109,37 @@ export function useChatMessages(selectedModel: ModelId) {
             { id: assistantId, role: 'assistant', content: '' },
           ]);
 
+          // Frames are `0:<JSON string>\n`; a read can end mid-line, so keep
+          // the partial line for the next one. Lines starting with `:` are keep-alives.
+          let pending = '';
           while (true) {
             const { done, value } = await reader.read();
             if (done) break;
 
-            const chunk = decoder.decode(value);
-            const lines = chunk.split('\n');
+            pending += decoder.decode(value, { stream: true });
+            const lines = pending.split('\n');
+            pending = lines.pop() ?? '';
 
+            let received = false;
             for (const line of lines) {
               if (line.startsWith('0:')) {
-                const text = line.slice(2).replace(/^"(.*)"$/, '$1');
-                assistantMessage += text;
-                
-                // Hide loading indicator as soon as we get first content
-                if (!hasReceivedContent && assistantMessage.length > 0) {
-                  hasReceivedContent = true;
-                  setIsLoading(false);
-                }
-                
-                setMessages((prev) =>
-                  prev.map((m) =>
-                    m.id === assistantId ? { ...m, content: assistantMessage } : m
-                  )
-                );
+                assistantMessage += JSON.parse(line.slice(2));
+                received = true;
               }
             }
+            if (!received) continue;
+
+            // Hide loading indicator as soon as we get first content
+            if (!hasReceivedContent && assistantMessage.length > 0) {
+              hasReceivedContent = true;
+              setIsLoading(false);
+            }
+
+            setMessages((prev) =>
+              prev.map((m) =>
+                m.id === assistantId ? { ...m, content: assistantMessage } : m
+              )
+            );
           }
           
           // Check if the response is an error message
@@ -128,7 +166,7 @@ export function useChatMessages(selectedModel: ModelId) {
         setIsLoading(false);
       }
     },
-    [isLoading, messages, selectedModel]
+    [isLoading, messages, selectedModel, ensureConversation]
   );
 
   const retryLastMessage = useCallback(() => {